@@ -25,7 +25,7 @@ if __name__ == "__main__":
         user_create = UserCreate(email=sys.argv[1], 
                                  username=sys.argv[2],
                                  password=sys.argv[3])
-        with database.get_session() as db:
+        with database.unit_of_work() as db:
             user_crud_interface.validate_creation_schema(db, user_create)
             user = user_crud_interface.create(db, user_create)
             user = user_crud_interface.set_is_superuser(db, user, True)
@@ -22,10 +22,22 @@ def get_settings(request: Request) -> AppSettings:
     """
     return request.app.state.settings
 
-def get_db(settings: Annotated[AppSettings, Depends(get_settings)]) -> Generator[Session, None, None]:
-    """Gets a database session."""
-    db = Database(settings.db.uri, settings.db.echo_all).get_db()
-    yield from db
+def get_database(request: Request) -> Database:
+    """
+    Gets the Database object from the app state, shared by all
+    requests so the engine and its connection pool are reused.
+
+    Args:
+        request (fastapi.Request): Contains the app state, handled by FastAPI.
+    """
+    return request.app.state.database
+
+def get_db(database: Annotated[Database, Depends(get_database)]) -> Generator[Session, None, None]:
+    """
+    Gets a database session scoped to the request. CRUD operations only
+    flush, the whole request is committed once after the route returns.
+    """
+    yield from database.get_db()
 
 def get_tb_client(request: Request) -> RestClientCE:
     """Gets the Thingsboard client"""
@@ -5,7 +5,6 @@ from sqlalchemy.orm import Session
 from tb_rest_client import RestClientCE
 from tb_rest_client.rest import ApiException
 
-from src.schemas.schedule import ScheduleOut
 from src.api.dependencies import get_current_superuser, get_current_user, get_db, get_settings, get_tb_client
 from src.crud.device import device_crud_interface
 from src.crud.schedule import schedule_crud_interface
@@ -154,7 +153,7 @@ def set_device_schedule(current_user: Annotated[User, Depends(get_current_user)]
 
     rpc_command = {
             "method": "updateSchedule",
-            "params": ScheduleOut.from_orm(schedule).json()
+            "params": schedule_crud_interface.get_serialized(schedule).decode()
             }
     try:
         response = thingsboard_client.handle_two_way_device_rpc_request(str(device.thingsboard_id), rpc_command) # pyright: ignore[reportArgumentType]
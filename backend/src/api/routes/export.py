@@ -0,0 +1,48 @@
+from typing import Annotated, Iterator, Literal
+from uuid import UUID
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from src.api.dependencies import get_current_user, get_database
+from src.crud.schedule import schedule_crud_interface
+from src.models.user import User
+from src.utils.database import Database
+from src.utils.export import csv_chunks, ndjson_chunks
+
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv"
+        }
+
+def _stream_schedules(database: Database, owner_id: UUID, format: str) -> Iterator[bytes]:
+    """
+    Streams the export from its own session. Dependencies are closed before
+    a StreamingResponse body is sent, so the request session can't be used.
+    Each chunk is only produced once the previous one has been sent.
+    """
+    with database.get_session() as db:
+        rows = schedule_crud_interface.iter_export_rows_by_owner_id(db, owner_id)
+        if format == "csv":
+            yield from csv_chunks(rows)
+        else:
+            yield from ndjson_chunks(rows)
+
+@router.get("/schedules")
+def export_my_schedules(current_user: Annotated[User, Depends(get_current_user)],
+                        database: Annotated[Database, Depends(get_database)],
+                        format: Literal["ndjson", "csv"] = "ndjson"
+                        ) -> StreamingResponse:
+    """
+    Exports all of the current users schedules and their slots, as
+    newline delimited JSON (one schedule per line) or CSV (one slot per line).
+
+    The export is streamed in chunks straight from a database cursor,
+    so memory use doesn't grow with the size of the account.
+    """
+    filename = f"schedules.{format}"
+    return StreamingResponse(_stream_schedules(database, current_user.id, format),
+                             media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -1,34 +1,66 @@
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from src.api.dependencies import get_current_user, get_db
+from src.api.dependencies import get_current_superuser, get_current_user, get_db, get_settings
 from src.crud.schedule import schedule_crud_interface
 from src.models.user import User
+from src.schemas.misc import CacheStats
 from src.schemas.schedule import ScheduleCreate, ScheduleOut, ScheduleUpdate
+from src.schemas.schedule_slot import ScheduleSlotCreate, normalize_slots
+from src.utils.config import AppSettings
 
 router = APIRouter()
 
+def _check_daily_limit(slots: Optional[List[ScheduleSlotCreate]], settings: AppSettings) -> None:
+    """
+    Rejects slots adding up to more than the configured max_grams_per_day
+    on any day. The schemas check everything else about the slots.
+    """
+    if slots is None:
+        return
+    try:
+        normalize_slots(slots, settings.max_grams_per_day)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=str(e))
+
 @router.post("/", response_model=ScheduleOut)
 def create_schedule_for_user(current_user: Annotated[User, Depends(get_current_user)],
                              db: Annotated[Session, Depends(get_db)],
+                             settings: Annotated[AppSettings, Depends(get_settings)],
                              schedule_create: ScheduleCreate
                              ) -> ScheduleOut:
+    _check_daily_limit(schedule_create.slots, settings)
     schedule = schedule_crud_interface.create_with_owner(db, current_user.id, schedule_create)
     return schedule
 
-@router.get("/")
+@router.get("/", response_model=List[ScheduleOut])
 def get_my_schedules(current_user: Annotated[User, Depends(get_current_user)],
                      db: Annotated[Session, Depends(get_db)]
-                     ) -> List[ScheduleOut]:
-    schedules = schedule_crud_interface.get_many_by_owner_id(db, current_user.id)
-    return [ScheduleOut.model_validate(schedule) for schedule in schedules]
+                     ) -> Response:
+    """
+    Gets a list of all the current users schedules.
 
+    Schedules are served from the schedule cache where possible,
+    so the pre-serialised payloads are returned as is.
+    """
+    payloads = schedule_crud_interface.get_many_serialized_by_owner_id(db, current_user.id)
+    return Response(content=b"[" + b",".join(payloads) + b"]", media_type="application/json")
+
+@router.get("/cache", response_model=CacheStats, dependencies=[Depends(get_current_superuser)])
+def get_schedule_cache_stats() -> CacheStats:
+    """
+    Allows a superuser to view the schedule cache metrics.
+    """
+    return CacheStats(**schedule_crud_interface.cache.stats())
 
 @router.put("/{schedule_id}")
 def update_my_schedule(current_user: Annotated[User, Depends(get_current_user)],
                        db: Annotated[Session, Depends(get_db)],
+                       settings: Annotated[AppSettings, Depends(get_settings)],
                        schedule_update: ScheduleUpdate,
                        schedule_id: UUID
                        ) -> ScheduleOut:
@@ -36,6 +68,7 @@ def update_my_schedule(current_user: Annotated[User, Depends(get_current_user)],
     Allows a user to update a schedule, assuming they are the owner 
     of said schedule.
     """
+    _check_daily_limit(schedule_update.slots, settings)
     schedule = schedule_crud_interface.get_by_id(db, schedule_id)
     if schedule is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
@@ -45,6 +78,10 @@ def update_my_schedule(current_user: Annotated[User, Depends(get_current_user)],
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="User can't do this.")
 
-    schedule = schedule_crud_interface.update(db, schedule, schedule_update)
+    try:
+        schedule = schedule_crud_interface.update(db, schedule, schedule_update)
+    except StaleDataError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Schedule was changed by another request, reload it and try again.")
     return schedule
 
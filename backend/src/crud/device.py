@@ -15,8 +15,7 @@ class CRUDDevice(CRUDBase[Device, DeviceCreate, DeviceUpdate]):
     def set_is_provisioned(self, db: Session, device: Device) -> Device:
         device.provisioned_at = datetime.now(timezone.utc)
         db.add(device)
-        db.commit()
-        db.refresh(device)
+        db.flush()
         return device
 
 device_crud_interface = CRUDDevice(Device)
@@ -1,14 +1,34 @@
-from typing import List
+from typing import Iterator, List, Optional, Type
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session, selectinload
 from src.crud.base import CRUDBase
 from src.models.schedule import Schedule
 from src.models.schedule_slot import ScheduleSlot
-from src.schemas.schedule import ScheduleCreate, ScheduleUpdate
+from src.schemas.schedule import ScheduleCreate, ScheduleOut, ScheduleUpdate
+from src.utils.cache import LRUCache, PayloadCache
 
 
 class CRUDSchedule(CRUDBase[Schedule, ScheduleCreate, ScheduleUpdate]):
+    def __init__(self, model: Type[Schedule], cache: PayloadCache):
+        """
+        Args:
+            model (Type[Schedule]): The Schedule database model.
+            cache (PayloadCache): Cache for serialised ScheduleOut payloads,
+                keyed by schedule ID and version. May be replaced at startup
+                with the backend selected in the configuration.
+        """
+        super().__init__(model)
+        self.cache = cache
+
     def update(self, db: Session, db_obj: Schedule, obj_update: ScheduleUpdate) -> Schedule:
+        """
+        Raises:
+            sqlalchemy.orm.exc.StaleDataError: If the schedule was updated
+                or deleted since it was loaded.
+        """
+        # Bumped first, so the first flush already checks the loaded version is current.
+        db_obj.version += 1
         update_data = obj_update.model_dump(exclude_unset=True, exclude={"slots"})
         for field, value in update_data.items():
             setattr(db_obj, field, value)
@@ -22,26 +42,120 @@ class CRUDSchedule(CRUDBase[Schedule, ScheduleCreate, ScheduleUpdate]):
                 db_obj.slots.append(new_slot)
 
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
+        self.cache.invalidate(str(db_obj.id))
         return db_obj
 
+    def delete(self, db: Session, id: UUID) -> Optional[Schedule]:
+        obj = super().delete(db, id)
+        self.cache.invalidate(str(id))
+        return obj
+
     def get_many_by_owner_id(self, db: Session, owner_id: UUID) -> List[Schedule]:
         return self.get_many(db, self.model.owner_id == owner_id)
 
     def create_with_owner(self, db: Session, owner_id: UUID, obj_in: ScheduleCreate) -> Schedule:
         schedule_data = obj_in.model_dump(exclude={"slots"})
-        db_schedule = self.model(**schedule_data, owner_id=owner_id)
+        # Building the slots through the relationship keeps the collection loaded,
+        # so serialising the response doesn't need to SELECT the slots back.
+        db_slots = [ScheduleSlot(**slot.model_dump()) for slot in obj_in.slots]
+        db_schedule = self.model(**schedule_data, owner_id=owner_id, slots=db_slots)
         db.add(db_schedule)
         db.flush()
+        self.cache.invalidate(str(db_schedule.id))
+        return db_schedule
 
-        for slot in obj_in.slots:
-            db_slot = ScheduleSlot(**slot.model_dump(), schedule_id=db_schedule.id)
-            db.add(db_slot)
+    def get_serialized(self, schedule: Schedule) -> bytes:
+        """
+        Gets the ScheduleOut JSON payload for a schedule, serialising
+        and caching it if the current version isn't cached yet.
 
-        db.commit()
-        db.refresh(db_schedule)
-        return db_schedule
+        Args:
+            schedule (Schedule): Schedule to serialise.
+
+        Returns:
+            bytes: UTF-8 encoded ScheduleOut JSON.
+        """
+        payload = self.cache.get(str(schedule.id), schedule.version)
+        if payload is None:
+            payload = self._serialize_and_cache(schedule)
+        return payload
+
+    def get_many_serialized_by_owner_id(self, db: Session, owner_id: UUID, limit: int = 100) -> List[bytes]:
+        """
+        Gets the ScheduleOut JSON payloads for all schedules with the given owner.
+
+        Only the IDs and versions are queried up front, schedules missing
+        from the cache are then loaded along with their slots in one query.
+
+        Args:
+            db (Session): Database session to interact with.
+            owner_id (UUID): Owner of the schedules.
+            limit (int): Maximum number of schedules to return. Defaults to 100.
+
+        Returns:
+            List[bytes]: UTF-8 encoded ScheduleOut JSON, one per schedule.
+        """
+        versions = (
+                db.query(self.model.id, self.model.version)
+                .filter(self.model.owner_id == owner_id)
+                .limit(limit)
+                .all()
+                )
+
+        payloads: List[Optional[bytes]] = [self.cache.get(str(id), version) for id, version in versions]
+        missing_ids = [id for (id, _), payload in zip(versions, payloads) if payload is None]
+        if missing_ids:
+            schedules = (
+                    db.query(self.model)
+                    .options(selectinload(self.model.slots))
+                    .filter(self.model.id.in_(missing_ids))
+                    .all()
+                    )
+            loaded = {schedule.id: self._serialize_and_cache(schedule) for schedule in schedules}
+            payloads = [payload if payload is not None else loaded.get(id)
+                        for (id, _), payload in zip(versions, payloads)]
+
+        return [payload for payload in payloads if payload is not None]
+
+    def iter_export_rows_by_owner_id(self, db: Session, owner_id: UUID, batch_size: int = 500) -> Iterator[Row]:
+        """
+        Streams every schedule with the given owner joined to its slots, one
+        row per slot (or one row with empty slot columns for a schedule without
+        slots), ordered by schedule so the rows for a schedule are consecutive.
+
+        Rows are fetched in batches through a server-side cursor (yield_per)
+        and are plain column tuples, so nothing accumulates in the identity map
+        and memory stays flat regardless of how many schedules the owner has.
+
+        Args:
+            db (Session): Database session to interact with, must stay open
+                while the rows are being consumed.
+            owner_id (UUID): Owner of the schedules.
+            batch_size (int): Number of rows fetched per round trip. Defaults to 500.
+
+        Yields:
+            Row: (schedule_id, name, description, version, day_of_week, time_of_day, amount)
+        """
+        statement = (
+                select(self.model.id.label("schedule_id"),
+                       self.model.name,
+                       self.model.description,
+                       self.model.version,
+                       ScheduleSlot.day_of_week,
+                       ScheduleSlot.time_of_day,
+                       ScheduleSlot.amount)
+                .outerjoin(ScheduleSlot, ScheduleSlot.schedule_id == self.model.id)
+                .where(self.model.owner_id == owner_id)
+                .order_by(self.model.id, ScheduleSlot.day_of_week, ScheduleSlot.time_of_day)
+                .execution_options(yield_per=batch_size)
+                )
+        yield from db.execute(statement)
 
-schedule_crud_interface = CRUDSchedule(Schedule)
+    def _serialize_and_cache(self, schedule: Schedule) -> bytes:
+        """Serialises a schedule as ScheduleOut JSON and caches it under its current version."""
+        payload = ScheduleOut.model_validate(schedule).model_dump_json().encode()
+        self.cache.set(str(schedule.id), schedule.version, payload)
+        return payload
 
+schedule_crud_interface = CRUDSchedule(Schedule, LRUCache())
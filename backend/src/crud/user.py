@@ -22,8 +22,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
                       username=obj_in.username,
                       password_hash=get_password_hash(obj_in.password))
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
         return db_obj
 
     def update(self, db: Session, db_obj: User, obj_update: UserUpdate) -> User:
@@ -45,8 +44,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             setattr(db_obj, field, value)
 
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        db.flush()
         return db_obj
 
     def authenticate(self, db: Session, username: str, password: str) -> Optional[User]:
@@ -94,8 +92,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         """
         user.is_superuser = is_superuser
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        db.flush()
         return user
     
     def validate_creation_schema(self, db: Session, creation_schema: UserCreate) -> None:
@@ -3,10 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from src.api.routes.auth import router as auth_router
 from src.api.routes.device import router as device_router
+from src.api.routes.export import router as export_router
 from src.api.routes.schedule import router as schedule_router
 from src.api.routes.user import router as user_router
+from src.crud.schedule import schedule_crud_interface
+from src.utils.cache import create_cache
 from src.utils.config import get_config
 from src.utils.database import Database
+from src.utils.startup import get_startup_coordinator
 from src.utils.thingsboard.thingsboard_handler import ThingsboardHandler
 
 
@@ -28,15 +32,29 @@ app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(user_router, prefix="/user", tags=["user"])
 app.include_router(device_router, prefix="/device", tags=["device"])
 app.include_router(schedule_router, prefix="/schedule", tags=["schedule"])
+app.include_router(export_router, prefix="/export", tags=["export"])
 
 @app.on_event("startup")
 def startup_event():
+    """
+    Runs in every worker process. Schema creation and the Thingsboard
+    login are serialised between workers by the StartupCoordinator, so
+    only the first worker creates tables and logs in, the rest reuse its work.
+    """
     app.state.settings = get_config(ENV_FILE, ENV_FILE_ENCODING)
+    coordinator = get_startup_coordinator(app.state.settings.db.uri)
+
+    app.state.database = Database(app.state.settings.db.uri, app.state.settings.db.echo_all)
+    with coordinator.exclusive("schema"):
+        app.state.database.initialize_tables()
+
     app.state.thingsboard_handler = ThingsboardHandler(app.state.settings.thingsboard.host,
                                                        app.state.settings.thingsboard.username,
-                                                       app.state.settings.thingsboard.password)
-    Database(app.state.settings.db.uri, app.state.settings.db.echo_all)\
-            .initialize_tables()
+                                                       app.state.settings.thingsboard.password,
+                                                       coordinator)
+
+    schedule_crud_interface.cache = create_cache(app.state.settings.cache.backend,
+                                                 app.state.settings.cache.path)
 
 @app.get("/")
 def default_route():
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import UUID, ForeignKey, String
+from sqlalchemy import UUID, ForeignKey, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.models.base import BaseDatabaseModel
 from src.models.user import User
@@ -10,9 +10,17 @@ class Schedule(BaseDatabaseModel):
     owner_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey(User.id), index=True)
     name: Mapped[str] = mapped_column(String(64), nullable=True)
     description: Mapped[str] = mapped_column(String(255), nullable=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)  # Bumped on every update, keys the schedule cache
     
     owner = relationship("User", back_populates="schedules")
-    slots = relationship("ScheduleSlot", back_populates="schedule", cascade="all, delete-orphan", passive_deletes=True)
+    slots = relationship("ScheduleSlot", back_populates="schedule", cascade="all, delete-orphan", passive_deletes=True,
+                         order_by="(ScheduleSlot.day_of_week, ScheduleSlot.time_of_day)")
+
+    # Every UPDATE checks the version it read is still current, so of two concurrent updates
+    # the second fails with StaleDataError instead of caching a different payload under the
+    # same version. The version is bumped by CRUDSchedule.update, as slot only changes
+    # wouldn't otherwise update the row.
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
 from .schedule_slot import ScheduleSlot
 
@@ -9,3 +9,13 @@ class Success(BaseModel):
     message: str
     success: bool = True
 
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_entries: int
+    max_bytes: int
@@ -1,8 +1,8 @@
 from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
-from src.schemas.schedule_slot import ScheduleSlotCreate, ScheduleSlotOut
+from src.schemas.schedule_slot import ScheduleSlotCreate, ScheduleSlotOut, normalize_slots
 
 
 class ScheduleBase(BaseModel):
@@ -12,10 +12,20 @@ class ScheduleCreate(ScheduleBase):
     description: str = Field(..., max_length=255)
     slots: List[ScheduleSlotCreate] = Field(..., min_length=1)
 
+    @validator('slots')
+    def validate_slots(cls, v):
+        return normalize_slots(v)
+
 class ScheduleUpdate(BaseModel):
     name: Optional[str] = Field(None, max_length=64)
     slots: Optional[List[ScheduleSlotCreate]] = None
 
+    @validator('slots')
+    def validate_slots(cls, v):
+        if v is None:
+            return v
+        return normalize_slots(v)
+
 class ScheduleOut(ScheduleBase):
     id: UUID
     description: str = Field(..., max_length=255)
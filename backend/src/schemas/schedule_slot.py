@@ -1,8 +1,10 @@
 from datetime import time
-from typing import Optional
+from itertools import groupby
+from typing import List, Optional, TypeVar
 from pydantic import BaseModel, Field, validator
 
 
+
 class ScheduleSlotBase(BaseModel):
     day_of_week: int = Field(...)
     time_of_day: time
@@ -20,6 +22,62 @@ class ScheduleSlotBase(BaseModel):
             raise ValueError("Day of week must be between 0 and 6")
         return v
 
+    @validator('time_of_day')
+    def validate_time_of_day(cls, v):
+        # Feeds run at the device's local time, and a time without a date
+        # can't be converted from another offset, e.g. across daylight saving.
+        if v.tzinfo is not None:
+            raise ValueError("Time of day must not have a UTC offset, feeds run at the device's local time.")
+        # Devices schedule feeds to the minute, so finer times would only
+        # let two slots collide on the device while looking distinct here.
+        return v.replace(second=0, microsecond=0)
+
+SlotT = TypeVar("SlotT", bound=ScheduleSlotBase)
+
+def normalize_slots(slots: List[SlotT], max_grams_per_day: Optional[int] = None) -> List[SlotT]:
+    """
+    Sorts slots into their canonical (day_of_week, time_of_day) order,
+    dropping exact duplicates, in O(n log n).
+
+    Slots on the same day and minute with different amounts are rejected
+    rather than merged, as neither amount is clearly the one meant. The
+    Pi's ScheduleConfig applies the same rule to the schedules it receives.
+
+    Args:
+        slots (List[ScheduleSlotBase]): Slots as submitted.
+        max_grams_per_day (int, optional): Most a day's slots may add up to,
+            see AppSettings.max_grams_per_day. Not checked if None.
+
+    Returns:
+        List[ScheduleSlotBase]: The minimal, sorted list of slots.
+
+    Raises:
+        ValueError: If two slots share a day and time but not an amount,
+            or a day's slots add up to more than max_grams_per_day.
+    """
+    ordered = sorted(slots, key=lambda slot: (slot.day_of_week, slot.time_of_day))
+    normalized: List[SlotT] = []
+
+    for day_of_week, day_slots in groupby(ordered, key=lambda slot: slot.day_of_week):
+        day_total = 0
+        previous: Optional[SlotT] = None
+        for slot in day_slots:
+            if previous is not None and previous.time_of_day == slot.time_of_day:
+                if previous.amount != slot.amount:
+                    raise ValueError(f"Conflicting amounts for day {day_of_week} at "
+                                     f"{slot.time_of_day.strftime('%H:%M')}.")
+                continue  # Exact duplicate
+
+            day_total += slot.amount
+            normalized.append(slot)
+            previous = slot
+
+        if max_grams_per_day is not None and day_total > max_grams_per_day:
+            raise ValueError(f"Day {day_of_week} dispenses {day_total}g, "
+                             f"the limit is {max_grams_per_day}g per day.")
+
+    return normalized
+
 class ScheduleSlotCreate(ScheduleSlotBase):
     ...
 
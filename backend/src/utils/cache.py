@@ -0,0 +1,273 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+
+class LRUCache:
+    """
+    In-process LRU cache of serialised payloads, keyed by an item key
+    and the version of the item that produced the payload.
+
+    A lookup with an outdated version counts as a miss, so callers don't
+    need to invalidate on every write for correctness, invalidating just
+    frees the memory early. Entries are evicted least recently used first
+    once either the entry or the byte cap is exceeded.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): Maximum number of entries held at once.
+                Defaults to 1024.
+            max_bytes (int): Maximum total size of the cached payloads, in bytes.
+                Defaults to 8 MiB.
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, Tuple[int, bytes]] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        """
+        Gets the payload cached for the given key and version.
+
+        Returns:
+            Optional[bytes]: The cached payload, or None if missing or stale.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: str, version: int, payload: bytes) -> None:
+        """
+        Caches a payload for the given key and version, replacing any
+        previous version and evicting older entries to stay within the caps.
+        Payloads larger than the byte cap are not cached.
+        """
+        if len(payload) > self._max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (version, payload)
+            self._size_bytes += len(payload)
+
+            while len(self._entries) > self._max_entries or self._size_bytes > self._max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted)
+                self._evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        """Removes any cached payload for the given key."""
+        with self._lock:
+            if self._remove(key):
+                self._invalidations += 1
+
+    def clear(self) -> None:
+        """Removes all cached payloads, keeping the metrics."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Hit, miss, eviction and invalidation counters,
+                along with the current and maximum size of the cache.
+        """
+        with self._lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "invalidations": self._invalidations,
+                    "entries": len(self._entries),
+                    "size_bytes": self._size_bytes,
+                    "max_entries": self._max_entries,
+                    "max_bytes": self._max_bytes
+                    }
+
+    def _remove(self, key: str) -> bool:
+        """Removes an entry, the lock must be held by the caller."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._size_bytes -= len(entry[1])
+        return True
+
+class SQLiteCache:
+    """
+    Cache of serialised payloads shared between processes, backed by a
+    local SQLite file in WAL mode with memory-mapped reads.
+
+    Offers the same interface as LRUCache, so every uvicorn worker
+    pointed at the same file sees the same entries and invalidations.
+    Hit, miss, eviction and invalidation counters are per process,
+    entries and size are shared.
+    """
+    # Recency is only written back when an entry was last used longer ago
+    # than this, so cache hits don't turn into a write per read.
+    _TOUCH_INTERVAL_SECONDS = 1.0
+    _MMAP_SIZE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: str, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            path (str): Path to the SQLite file, shared by all workers.
+            max_entries (int): Maximum number of entries held at once.
+                Defaults to 1024.
+            max_bytes (int): Maximum total size of the cached payloads, in bytes.
+                Defaults to 8 MiB.
+        """
+        self._path = path
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+        self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, payload BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self._connection().execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_last_used ON cache_entries (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection to the cache file, opening it if needed."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={self._MMAP_SIZE_BYTES}")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        """
+        Gets the payload cached for the given key and version.
+
+        Returns:
+            Optional[bytes]: The cached payload, or None if missing or stale.
+        """
+        row = self._connection().execute(
+                "SELECT version, payload, last_used FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != version:
+            self._count("_misses")
+            return None
+
+        now = time.time()
+        if now - row[2] > self._TOUCH_INTERVAL_SECONDS:
+            self._connection().execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (now, key))
+        self._count("_hits")
+        return row[1]
+
+    def set(self, key: str, version: int, payload: bytes) -> None:
+        """
+        Caches a payload for the given key and version, replacing any
+        previous version and evicting older entries to stay within the caps.
+        Payloads larger than the byte cap are not cached.
+        """
+        if len(payload) > self._max_bytes:
+            return
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, version, payload, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, version, payload, len(payload), time.time()))
+            entries, size_bytes = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+
+            evicted = 0
+            while entries > self._max_entries or size_bytes > self._max_bytes:
+                oldest = connection.execute(
+                        "SELECT key, size FROM cache_entries ORDER BY last_used LIMIT 1").fetchone()
+                connection.execute("DELETE FROM cache_entries WHERE key = ?", (oldest[0],))
+                entries -= 1
+                size_bytes -= oldest[1]
+                evicted += 1
+
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        if evicted:
+            self._count("_evictions", evicted)
+
+    def invalidate(self, key: str) -> None:
+        """Removes any cached payload for the given key."""
+        cursor = self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        if cursor.rowcount:
+            self._count("_invalidations")
+
+    def clear(self) -> None:
+        """Removes all cached payloads, keeping the metrics."""
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Hit, miss, eviction and invalidation counters,
+                along with the current and maximum size of the cache.
+        """
+        entries, size_bytes = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        with self._stats_lock:
+            return {
+                    "hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "invalidations": self._invalidations,
+                    "entries": entries,
+                    "size_bytes": size_bytes,
+                    "max_entries": self._max_entries,
+                    "max_bytes": self._max_bytes
+                    }
+
+PayloadCache = Union[LRUCache, SQLiteCache]
+
+def create_cache(backend: str, path: str) -> PayloadCache:
+    """
+    Creates the cache backend selected in the configuration.
+
+    Args:
+        backend (str): "memory" for a per-process LRUCache, or "sqlite"
+            for a SQLiteCache shared between workers.
+        path (str): Path to the SQLite file, only used by the "sqlite" backend.
+
+    Returns:
+        PayloadCache: The cache instance.
+
+    Raises:
+        ValueError: If the backend is not recognised.
+    """
+    if backend == "memory":
+        return LRUCache()
+    if backend == "sqlite":
+        return SQLiteCache(path)
+    raise ValueError(f"Unknown cache backend '{backend}'.")
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel, ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,10 +22,17 @@ class ThingsboardSettings(BaseModel):
     password: str
     provisioning: ThingsboardProvisioningSettings
 
+class CacheSettings(BaseModel):
+    backend: Literal["memory", "sqlite"] = "memory"  # "sqlite" shares the cache between workers
+    path: str = "./cache.db"
+
 class AppSettings(BaseSettings):
     db: DatabaseSettings
     jwt: JWTSettings
     thingsboard: ThingsboardSettings
+    cache: CacheSettings = CacheSettings()
+    # Most food a schedule may dispense across a single day, in grams.
+    max_grams_per_day: int = 500
 
     model_config = SettingsConfigDict(
             env_file=".env",
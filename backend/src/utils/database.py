@@ -1,7 +1,9 @@
-from typing import Any, Dict, Generator
-from sqlalchemy import Engine, create_engine
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterator
+from sqlalchemy import Engine, create_engine, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
+from src.utils.migrations import upgrade_tables
 
 Base = declarative_base()
 
@@ -14,9 +16,12 @@ class Database:
                 Defaults to False.
         """
         self._engine = self._create_engine(database_uri, echo)
+        # expire_on_commit=False keeps loaded attributes usable after the
+        # unit of work commits, so responses don't need refresh queries.
         self._session_factory = sessionmaker(
                 autocommit=False,
                 autoflush=False,
+                expire_on_commit=False,
                 bind=self._engine)
 
     def _create_engine(self, database_uri: str, echo: bool) -> Engine:
@@ -34,15 +39,35 @@ class Database:
         engine = create_engine(database_uri, echo=echo, connect_args=connect_args)
         return engine
 
-    def get_db(self) -> Generator[Session, None, None]:
+    @contextmanager
+    def unit_of_work(self) -> Iterator[Session]:
         """
+        Opens a session for a single unit of work. CRUD operations
+        within it only flush, the work is committed once when the
+        context exits cleanly and rolled back if an exception is raised.
+
         Yields:
             sqlalchemy.orm.Session: A database session, bound to the engine.
-                Automatically closed when the context exits.
         """
         db = self._session_factory()
-        try: yield db
-        finally: db.close()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_db(self) -> Generator[Session, None, None]:
+        """
+        Yields:
+            sqlalchemy.orm.Session: A database session, bound to the engine.
+                Committed once and closed when the context exits,
+                see unit_of_work.
+        """
+        with self.unit_of_work() as db:
+            yield db
 
     def get_session(self) -> Session:
         """
@@ -53,7 +78,25 @@ class Database:
         """
         return self._session_factory()
 
-    def initialize_tables(self):
-        """Creates all tables defined in the Base metadata"""
-        Base.metadata.create_all(bind=self._engine)
+    def initialize_tables(self) -> bool:
+        """
+        Creates any tables defined in the Base metadata that don't exist yet,
+        and upgrades the existing ones, see migrations.upgrade_tables. The
+        existing tables are listed in a single query first, so this is
+        cheap once the schema has been created.
+
+        Returns:
+            bool: True if any tables were created.
+        """
+        existing_tables = set(inspect(self._engine).get_table_names())
+        with self._engine.begin() as connection:
+            upgrade_tables(connection, existing_tables)
+
+        missing_tables = [table for table in Base.metadata.sorted_tables
+                          if table.name not in existing_tables]
+        if not missing_tables:
+            return False
+
+        Base.metadata.create_all(bind=self._engine, tables=missing_tables)
+        return True
 
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Row
+
+
+CSV_COLUMNS = ["schedule_id", "name", "description", "version", "day_of_week", "time_of_day", "amount"]
+
+def _slot_from_row(row: Row) -> Optional[Dict[str, Any]]:
+    """Returns the slot held in an export row, or None for a schedule without slots."""
+    if row.day_of_week is None:
+        return None
+    return {
+            "day_of_week": row.day_of_week,
+            "time_of_day": row.time_of_day.isoformat(),
+            "amount": row.amount
+            }
+
+def ndjson_chunks(rows: Iterable[Row], lines_per_chunk: int = 100) -> Iterator[bytes]:
+    """
+    Encodes export rows as newline delimited JSON, one schedule with its
+    slots per line. Rows must be ordered by schedule, only the schedule
+    currently being assembled is held in memory.
+
+    Args:
+        rows (Iterable[Row]): Rows from CRUDSchedule.iter_export_rows_by_owner_id.
+        lines_per_chunk (int): Number of lines joined into each yielded chunk,
+            so the response isn't sent one small write at a time. Defaults to 100.
+
+    Yields:
+        bytes: UTF-8 encoded chunks of complete lines.
+    """
+    lines: List[str] = []
+    current: Optional[Dict[str, Any]] = None
+
+    for row in rows:
+        if current is None or current["id"] != str(row.schedule_id):
+            if current is not None:
+                lines.append(json.dumps(current))
+                if len(lines) >= lines_per_chunk:
+                    yield ("\n".join(lines) + "\n").encode()
+                    lines.clear()
+
+            current = {
+                    "id": str(row.schedule_id),
+                    "name": row.name,
+                    "description": row.description,
+                    "version": row.version,
+                    "slots": []
+                    }
+
+        slot = _slot_from_row(row)
+        if slot is not None:
+            current["slots"].append(slot)
+
+    if current is not None:
+        lines.append(json.dumps(current))
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+def csv_chunks(rows: Iterable[Row], rows_per_chunk: int = 500) -> Iterator[bytes]:
+    """
+    Encodes export rows as CSV with a header, one slot per line.
+    Schedules without slots are written with empty slot columns.
+
+    Args:
+        rows (Iterable[Row]): Rows from CRUDSchedule.iter_export_rows_by_owner_id.
+        rows_per_chunk (int): Number of rows written into each yielded chunk.
+            Defaults to 500.
+
+    Yields:
+        bytes: UTF-8 encoded chunks of complete CSV lines.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    buffered_rows = 0
+
+    for row in rows:
+        slot = _slot_from_row(row) or {"day_of_week": "", "time_of_day": "", "amount": ""}
+        writer.writerow([row.schedule_id, row.name, row.description, row.version,
+                         slot["day_of_week"], slot["time_of_day"], slot["amount"]])
+        buffered_rows += 1
+
+        if buffered_rows >= rows_per_chunk:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            buffered_rows = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
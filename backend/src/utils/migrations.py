@@ -0,0 +1,84 @@
+from typing import Callable, Collection, Dict, List
+from sqlalchemy import Connection, inspect, text
+
+# An upgrade step brings one existing table up to date with its model,
+# returning True if it changed anything. Steps check the schema before
+# changing it, so they can run on every startup.
+UpgradeStep = Callable[[Connection], bool]
+
+def add_schedule_version(connection: Connection) -> bool:
+    """
+    Adds schedules.version, Schedule's version_id_col. Existing schedules
+    start at version 1, as new ones do.
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns("schedules")}
+    if "version" in columns:
+        return False
+
+    connection.execute(text("ALTER TABLE schedules ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+    return True
+
+def add_schedule_slot_time_constraint(connection: Connection) -> bool:
+    """
+    Makes each schedule's slot times unique, as ScheduleSlot's uq_schedule_slots_time
+    does for new databases. Duplicate slots saved before are deleted first,
+    keeping the earliest created of each, and their schedules' versions are
+    bumped so no cached payload still lists them.
+
+    Added as a unique index, which SQLite can add to an existing table and
+    which enforces the same rule.
+    """
+    slot_time_columns = ["schedule_id", "day_of_week", "time_of_day"]
+    inspector = inspect(connection)
+    unique_column_sets = ([constraint["column_names"] for constraint in inspector.get_unique_constraints("schedule_slots")]
+                          + [index["column_names"] for index in inspector.get_indexes("schedule_slots") if index["unique"]])
+    if slot_time_columns in unique_column_sets:
+        return False
+
+    slots = connection.execute(text("SELECT id, schedule_id, day_of_week, time_of_day FROM schedule_slots "
+                                    "ORDER BY schedule_id, day_of_week, time_of_day, created_at, id"))
+    duplicate_ids = []
+    changed_schedule_ids = set()
+    previous_key = None
+    for slot_id, schedule_id, day_of_week, time_of_day in slots:
+        key = (schedule_id, day_of_week, time_of_day)
+        if key == previous_key:
+            duplicate_ids.append({"id": slot_id})
+            changed_schedule_ids.add(schedule_id)
+        previous_key = key
+
+    if duplicate_ids:
+        connection.execute(text("DELETE FROM schedule_slots WHERE id = :id"), duplicate_ids)
+        connection.execute(text("UPDATE schedules SET version = version + 1 WHERE id = :id"),
+                           [{"id": schedule_id} for schedule_id in changed_schedule_ids])
+    connection.execute(text("CREATE UNIQUE INDEX uq_schedule_slots_time "
+                            "ON schedule_slots (schedule_id, day_of_week, time_of_day)"))
+    return True
+
+# Upgrade steps for each table, in the order they were added.
+UPGRADE_STEPS: Dict[str, List[UpgradeStep]] = {
+        "schedules": [add_schedule_version],
+        "schedule_slots": [add_schedule_slot_time_constraint],
+        }
+
+def upgrade_tables(connection: Connection, existing_tables: Collection[str]) -> bool:
+    """
+    Runs the upgrade steps of existing tables, created by an earlier version
+    of the app. create_all only creates missing tables, so columns and
+    constraints added to a model since are added here.
+
+    Args:
+        connection (sqlalchemy.Connection): Connection to run the steps on,
+            within a transaction.
+        existing_tables (Collection[str]): Tables that already existed.
+
+    Returns:
+        bool: True if any table was changed.
+    """
+    upgraded = False
+    for table_name, steps in UPGRADE_STEPS.items():
+        if table_name not in existing_tables:
+            continue  # Created from the current model.
+        for step in steps:
+            upgraded |= step(connection)
+    return upgraded
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class StartupCoordinator:
+    """
+    Serialises startup work between uvicorn worker processes using
+    advisory file locks, so work such as creating the database schema
+    or logging into Thingsboard runs one worker at a time.
+
+    Each named section gets its own lock file within lock_dir.
+    """
+    def __init__(self, lock_dir: str, namespace: str):
+        """
+        Args:
+            lock_dir (str): Directory to hold the lock files, shared by all workers.
+            namespace (str): Identifies this deployment, so several apps on one
+                host don't share locks. Hashed into the lock file names.
+        """
+        self._lock_dir = lock_dir
+        self._namespace = hashlib.sha1(namespace.encode()).hexdigest()[:12]
+        os.makedirs(self._lock_dir, exist_ok=True)
+
+    def path_for(self, name: str, suffix: str = ".lock") -> str:
+        """
+        Returns:
+            str: Path of a per-deployment file within lock_dir, e.g. a lock file.
+        """
+        return os.path.join(self._lock_dir, f"kittybyte-{self._namespace}-{name}{suffix}")
+
+    @contextmanager
+    def exclusive(self, name: str) -> Iterator[None]:
+        """
+        Holds the named lock for the duration of the context, blocking
+        until any other worker holding it has finished.
+
+        Args:
+            name (str): Name of the startup section, e.g. "schema".
+        """
+        fd = os.open(self.path_for(name), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                self._lock_windows(fd)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _lock_windows(fd: int) -> None:
+        """msvcrt.locking gives up after ~10 seconds, so keep retrying until acquired."""
+        while True:
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+def get_startup_coordinator(database_uri: str) -> StartupCoordinator:
+    """
+    Creates a StartupCoordinator with its locks in the system temporary
+    directory, namespaced by the database the app is serving.
+
+    Args:
+        database_uri (str): URI of the app database.
+
+    Returns:
+        StartupCoordinator: Coordinator shared by all workers of this app.
+    """
+    return StartupCoordinator(tempfile.gettempdir(), database_uri)
@@ -1,16 +1,61 @@
+import json
+import os
+import time
+from typing import Optional
 from fastapi import HTTPException, status
 from tb_rest_client.rest_client_ce import RestClientCE
 
+from src.utils.startup import StartupCoordinator
+
 
 class ThingsboardHandler:
-    def __init__(self, base_url: str, username: str, password: str):
+    # Shared tokens are only reused if they stay valid for at least this long.
+    _MIN_TOKEN_LIFETIME_SECONDS = 60
+
+    def __init__(self,
+                 base_url: str,
+                 username: str,
+                 password: str,
+                 coordinator: Optional[StartupCoordinator] = None):
+        """
+        Args:
+            base_url (str): Thingsboard host.
+            username (str): Thingsboard tenant username.
+            password (str): Thingsboard tenant password.
+            coordinator (StartupCoordinator, optional): When given, workers log in
+                one at a time and share the session, the first worker logs in and
+                the rest reuse its token instead of each logging in separately.
+        """
         self.client = RestClientCE(base_url=base_url)
-        self.client.login(username, password)
+        if coordinator is None:
+            self.client.login(username, password)
+        else:
+            with coordinator.exclusive("thingsboard"):
+                self._shared_login(coordinator.path_for("thingsboard", ".token"), username, password)
         self.client.start()
-    
+
+    def _shared_login(self, token_path: str, username: str, password: str):
+        """
+        Logs in using the token saved by another worker if it is still valid,
+        otherwise logs in with the credentials and saves the token for the others.
+        Must be called while holding the coordinator lock.
+        """
+        try:
+            with open(token_path, "r") as file:
+                token_info = json.load(file)
+            if token_info.get("exp", 0) - time.time() > self._MIN_TOKEN_LIFETIME_SECONDS:
+                self.client.token_login(token_info["token"], token_info.get("refreshToken"))
+                return
+        except (OSError, ValueError, KeyError):
+            ...  # No usable shared token, log in below.
+
+        self.client.login(username, password)
+        fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.client.token_info, file)
+
     def get_client(self) -> RestClientCE:
         if not self.client.is_alive():
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                                 detail="Thingsboard Service Unavailable")
         return self.client
-
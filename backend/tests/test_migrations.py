@@ -0,0 +1,118 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from src.models.user import User  # Imported first, the models import each other from it.
+from src.models.schedule import Schedule
+from src.models.schedule_slot import ScheduleSlot
+from src.utils.database import Database
+
+# The tables as created before the upgrade steps' columns and constraints existed.
+OLD_SCHEMA = [
+        """CREATE TABLE schedules (
+            id CHAR(32) NOT NULL PRIMARY KEY,
+            owner_id CHAR(32),
+            name VARCHAR(64),
+            description VARCHAR(255),
+            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+            updated_at DATETIME)""",
+        """CREATE TABLE schedule_slots (
+            id CHAR(32) NOT NULL PRIMARY KEY,
+            schedule_id CHAR(32) NOT NULL REFERENCES schedules (id),
+            day_of_week INTEGER NOT NULL,
+            time_of_day TIME NOT NULL,
+            amount INTEGER NOT NULL,
+            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+            updated_at DATETIME)""",
+        ]
+
+
+@pytest.fixture
+def database_uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'upgrade.db'}"
+
+@pytest.fixture
+def schedule_id(database_uri):
+    """An old database holding one schedule, with a duplicate slot and two conflicting ones."""
+    schedule_id = uuid.uuid4()
+    slots = [(1, "08:00:00.000000", 20, "2024-01-01 00:00:00"),
+             (1, "08:00:00.000000", 20, "2024-01-02 00:00:00"),
+             (2, "18:30:00.000000", 30, "2024-01-01 00:00:00"),
+             (2, "18:30:00.000000", 90, "2024-01-02 00:00:00"),
+             (3, "12:00:00.000000", 40, "2024-01-01 00:00:00")]
+    engine = create_engine(database_uri)
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO schedules (id, name) VALUES (:id, 'breakfast')"), {"id": schedule_id.hex})
+        connection.execute(text("INSERT INTO schedule_slots (id, schedule_id, day_of_week, time_of_day, amount, created_at) "
+                                "VALUES (:id, :schedule_id, :day_of_week, :time_of_day, :amount, :created_at)"),
+                           [{"id": uuid.uuid4().hex, "schedule_id": schedule_id.hex, "day_of_week": day_of_week,
+                             "time_of_day": time_of_day, "amount": amount, "created_at": created_at}
+                            for day_of_week, time_of_day, amount, created_at in slots])
+    engine.dispose()
+    return schedule_id
+
+def load(db, schedule_id: uuid.UUID) -> Schedule:
+    return db.scalars(select(Schedule).where(Schedule.id == schedule_id)).one()
+
+
+def test_adds_the_schedule_version(database_uri, schedule_id):
+    database = Database(database_uri)
+    database.initialize_tables()
+
+    with database.get_session() as db:
+        # Starts at 1, then bumped as duplicate slots are removed, see below.
+        assert load(db, schedule_id).version == 2
+
+def test_upgraded_schedules_reject_stale_updates(database_uri, schedule_id):
+    database = Database(database_uri)
+    database.initialize_tables()
+
+    with database.get_session() as first, database.get_session() as second:
+        schedules = [load(db, schedule_id) for db in (first, second)]
+        for db, schedule in zip((first, second), schedules):
+            schedule.version += 1
+            schedule.name = "dinner"
+        first.commit()
+        with pytest.raises(StaleDataError):
+            second.commit()
+
+def test_upgrading_twice_changes_nothing(database_uri, schedule_id):
+    database = Database(database_uri)
+    database.initialize_tables()
+
+    with database.get_session() as db:
+        version = load(db, schedule_id).version
+
+    assert database.initialize_tables() is False
+    assert [column["name"] for column in inspect(create_engine(database_uri)).get_columns("schedules")].count("version") == 1
+    with database.get_session() as db:
+        assert load(db, schedule_id).version == version
+        assert len(load(db, schedule_id).slots) == 3
+
+def test_removes_duplicate_slots_keeping_the_earliest(database_uri, schedule_id):
+    database = Database(database_uri)
+    database.initialize_tables()
+
+    with database.get_session() as db:
+        schedule = load(db, schedule_id)
+        assert [(slot.day_of_week, slot.time_of_day.strftime("%H:%M"), slot.amount) for slot in schedule.slots] == \
+                [(1, "08:00", 20), (2, "18:30", 30), (3, "12:00", 40)]
+        # Bumped, so a payload cached with the duplicates isn't served.
+        assert schedule.version == 2
+
+def test_enforces_unique_slot_times(database_uri, schedule_id):
+    database = Database(database_uri)
+    database.initialize_tables()
+
+    with database.get_session() as db:
+        schedule = load(db, schedule_id)
+        existing = schedule.slots[0]
+        db.add(ScheduleSlot(schedule_id=schedule_id, day_of_week=existing.day_of_week,
+                            time_of_day=existing.time_of_day, amount=10))
+        with pytest.raises(IntegrityError):
+            db.flush()
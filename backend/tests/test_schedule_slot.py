@@ -0,0 +1,60 @@
+from datetime import time
+
+import pytest
+from pydantic import ValidationError
+
+from src.schemas.schedule_slot import ScheduleSlotCreate, normalize_slots
+
+
+def slot(day_of_week: int, time_of_day: str, amount: int) -> ScheduleSlotCreate:
+    return ScheduleSlotCreate(day_of_week=day_of_week, time_of_day=time_of_day, amount=amount)
+
+def keys(slots):
+    return [(s.day_of_week, s.time_of_day, s.amount) for s in slots]
+
+
+def test_sorts_by_day_then_time():
+    slots = [slot(2, "08:00", 10), slot(0, "18:30", 20), slot(0, "07:15", 30)]
+
+    assert keys(normalize_slots(slots)) == [(0, time(7, 15), 30), (0, time(18, 30), 20), (2, time(8), 10)]
+
+def test_drops_exact_duplicates():
+    slots = [slot(1, "08:00", 10), slot(1, "08:00", 10), slot(1, "09:00", 10)]
+
+    assert keys(normalize_slots(slots)) == [(1, time(8), 10), (1, time(9), 10)]
+
+def test_same_time_on_different_days_is_not_a_duplicate():
+    slots = [slot(1, "08:00", 10), slot(2, "08:00", 20)]
+
+    assert len(normalize_slots(slots)) == 2
+
+def test_rejects_conflicting_amounts():
+    with pytest.raises(ValueError, match="Conflicting amounts for day 3 at 08:00"):
+        normalize_slots([slot(3, "08:00", 10), slot(3, "08:00", 20)])
+
+def test_times_in_the_same_minute_collide():
+    with pytest.raises(ValueError, match="Conflicting"):
+        normalize_slots([slot(3, "08:00:05", 10), slot(3, "08:00:59", 20)])
+
+def test_allows_a_day_up_to_the_limit():
+    slots = [slot(0, "08:00", 250), slot(0, "18:00", 250), slot(1, "08:00", 500)]
+
+    assert len(normalize_slots(slots, max_grams_per_day=500)) == 3
+
+def test_rejects_a_day_over_the_limit():
+    slots = [slot(0, "08:00", 250), slot(4, "08:00", 250), slot(4, "18:00", 251)]
+
+    with pytest.raises(ValueError, match="Day 4 dispenses 501g, the limit is 500g per day"):
+        normalize_slots(slots, max_grams_per_day=500)
+
+def test_duplicates_count_once_towards_the_limit():
+    slots = [slot(0, "08:00", 300), slot(0, "08:00", 300)]
+
+    assert len(normalize_slots(slots, max_grams_per_day=300)) == 1
+
+def test_limit_not_checked_without_one():
+    assert len(normalize_slots([slot(0, "08:00", 10_000)])) == 1
+
+def test_rejects_times_with_a_utc_offset():
+    with pytest.raises(ValidationError, match="UTC offset"):
+        slot(0, "08:00+02:00", 10)
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+
+THINGSBOARD_USERNAME = "tenant@thingsboard.org"
+THINGSBOARD_PASSWORD = "tenant"
+NUMBER_OF_WORKERS = 4
+
+
+class ThingsboardLoginHandler(BaseHTTPRequestHandler):
+    """
+    Answers Thingsboard's login and token refresh endpoints, counting
+    each request, which is all the app does with Thingsboard at startup.
+    """
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path not in ("/api/auth/login", "/api/auth/token"):
+            self.send_error(404)
+            return
+
+        with self.server.lock:  # pyright: ignore[reportAttributeAccessIssue]
+            self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1  # pyright: ignore[reportAttributeAccessIssue]
+        token = jwt.encode({"sub": THINGSBOARD_USERNAME, "exp": int(time.time()) + 3600}, "secret", algorithm="HS256")
+        body = f'{{"token": "{token}", "refreshToken": "refresh-{token}"}}'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        ...  # Keep the test output quiet.
+
+def boot_worker(barrier, results) -> None:
+    """
+    Runs the app's startup handlers the way a uvicorn worker would, then
+    checks that cache invalidations made by another worker are visible
+    in this one.
+    """
+    from src.main import app
+    from src.crud.schedule import schedule_crud_interface
+    from src.utils.database import Database
+
+    # Record whether this worker's startup created the schema.
+    created_tables = []
+    initialize_tables = Database.initialize_tables
+    def recording_initialize_tables(self) -> bool:
+        created = initialize_tables(self)
+        created_tables.append(created)
+        return created
+    Database.initialize_tables = recording_initialize_tables
+
+    barrier.wait()  # Release all workers at once to maximise contention.
+    asyncio.run(app.router.startup())
+    app.state.thingsboard_handler.client.stop()
+    logged_in = bool(app.state.thingsboard_handler.client.get_token())
+
+    cache = schedule_crud_interface.cache
+    cache.set(f"worker-{os.getpid()}", 1, b"payload")
+    barrier.wait()
+
+    # Every worker invalidates its own entry, after which nobody should see any.
+    cache.invalidate(f"worker-{os.getpid()}")
+    barrier.wait()
+    results.put((any(created_tables), logged_in, cache.stats()["entries"]))
+
+
+@pytest.fixture
+def thingsboard():
+    """A local stand-in for the Thingsboard login."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThingsboardLoginHandler)
+    server.lock = threading.Lock()  # pyright: ignore[reportAttributeAccessIssue]
+    server.requests = {}  # pyright: ignore[reportAttributeAccessIssue]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def worker_environment(tmp_path, thingsboard, monkeypatch):
+    """
+    Configures the app through the environment, as a deployment would,
+    against a database, cache and lock directory in tmp_path.
+    """
+    environment = {
+            "DB_URI": f"sqlite:///{tmp_path / 'boot.db'}",
+            "JWT_SECRET": "boot-workers",
+            "THINGSBOARD_HOST": f"http://127.0.0.1:{thingsboard.server_address[1]}",
+            "THINGSBOARD_USERNAME": THINGSBOARD_USERNAME,
+            "THINGSBOARD_PASSWORD": THINGSBOARD_PASSWORD,
+            "THINGSBOARD_PROVISIONING_KEY": "key",
+            "THINGSBOARD_PROVISIONING_SECRET": "secret",
+            "CACHE_BACKEND": "sqlite",
+            "CACHE_PATH": str(tmp_path / "cache.db"),
+            # The StartupCoordinator keeps its locks, and the shared token, in the temporary directory.
+            "TMPDIR": str(tmp_path),
+            }
+    for name, value in environment.items():
+        monkeypatch.setenv(name, value)
+
+
+def test_workers_share_startup(thingsboard, worker_environment):
+    # Spawned, like uvicorn's workers, so each imports the app from scratch.
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(NUMBER_OF_WORKERS)
+    results = context.Queue()
+    workers = [context.Process(target=boot_worker, args=(barrier, results)) for _ in range(NUMBER_OF_WORKERS)]
+    for worker in workers:
+        worker.start()
+    try:
+        outcomes = [results.get(timeout=120) for _ in workers]
+    finally:
+        for worker in workers:
+            worker.join(timeout=60)
+            if worker.is_alive():
+                worker.kill()
+
+    assert [worker.exitcode for worker in workers] == [0] * NUMBER_OF_WORKERS
+    schema_created, logged_in, remaining_entries = zip(*outcomes)
+    assert sum(schema_created) == 1, "Expected the schema to be created exactly once."
+    assert all(logged_in)
+    assert thingsboard.requests.get("/api/auth/login", 0) == 1, "Expected one Thingsboard login, reused by every worker."
+    assert set(remaining_entries) == {0}, "Workers saw stale shared cache entries."
@@ -1,12 +1,17 @@
 #include "src/communication/Protocol.h"
 #include "src/communication/Commands.h"
+#include "src/communication/Transfer.h"
 #include "src/actuators/BuzzerController.h"
+#include "src/actuators/DispenserController.h"
 #define BUZZER_PIN 6
+#define DISPENSER_MOTOR_PIN 9
 
 void setup() {
-  Serial.begin(115200);
+  Protocol::begin();
   BuzzerController::init(BUZZER_PIN);
-  while (!Serial);
+  DispenserController::init(DISPENSER_MOTOR_PIN);
+  // Tell the Pi we're ready, so it doesn't need to guess how long booting takes.
+  Commands::send_hello(0);
 }
 
 void loop() {
@@ -18,6 +23,10 @@ void loop() {
     }
   }
 
+  Protocol::update();
+  Transfer::update();
+
   // Update all controllers.
   BuzzerController::update();
+  DispenserController::update();
 }
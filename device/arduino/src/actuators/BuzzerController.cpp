@@ -1,6 +1,7 @@
 #include "BuzzerController.h"
 #include "../communication/Commands.h"
 #include "../communication/Protocol.h"
+#include "../communication/Transfer.h"
 
 namespace BuzzerController {
   namespace {
@@ -21,6 +22,9 @@ namespace BuzzerController {
 
     CurrentMelody active_melody;
     byte active_packet_id;
+    // Notes of a streamed melody still to be played, and whether one is sounding.
+    uint16_t streamed_notes_remaining = 0;
+    bool streamed_note_playing = false;
 
     // Functions to handle each state, called each cycle by update(), based on current state.
     void handle_simple_buzz_state() {
@@ -47,6 +51,56 @@ namespace BuzzerController {
         }
       }
     }
+
+    void handle_streaming_melody_state() {
+      if (!Transfer::is_active(active_packet_id)) {
+        // The transfer was abandoned, and has already reported it.
+        noTone(buzzer_pin);
+        current_state = BuzzerState::IDLE;
+        return;
+      }
+
+      // The tempo comes first in the stream...
+      if (active_melody.note_duration == 0) {
+        uint16_t tempo;
+        if (!Transfer::read_uint16(tempo)) {
+          return;
+        }
+        if (tempo == 0) {
+          current_state = BuzzerState::IDLE;
+          Transfer::fail(Commands::ERROR_INVALID_PAYLOAD);
+          return;
+        }
+        active_melody.note_duration = 60000 / tempo;
+      }
+
+      if (streamed_note_playing && millis() <= task_end_time) {
+        return;
+      }
+
+      if (streamed_notes_remaining == 0) {
+        noTone(buzzer_pin);
+        current_state = BuzzerState::IDLE;
+        Transfer::finish();
+        Protocol::send_response(active_packet_id, Commands::NOTIFY_TASK_COMPLETE, nullptr, 0);
+        return;
+      }
+
+      uint16_t frequency;
+      if (!Transfer::read_uint16(frequency)) {
+        // The next note hasn't arrived yet, rest until it does.
+        if (streamed_note_playing) {
+          noTone(buzzer_pin);
+          streamed_note_playing = false;
+        }
+        return;
+      }
+
+      tone(buzzer_pin, frequency);
+      task_end_time = millis() + active_melody.note_duration;
+      streamed_note_playing = true;
+      streamed_notes_remaining--;
+    }
   }
 
   void init(byte buzzer_pin_to_set) {
@@ -68,6 +122,9 @@ namespace BuzzerController {
       case BuzzerState::PLAYING_MELODY:
         handle_playing_melody_state();
         break;
+      case BuzzerState::STREAMING_MELODY:
+        handle_streaming_melody_state();
+        break;
       default:
         break;
     }
@@ -104,4 +161,17 @@ namespace BuzzerController {
 
     return true;
   }
+
+  bool start_streamed_melody(const byte packet_id, const uint16_t note_count) {
+    if (current_state != BuzzerState::IDLE || buzzer_pin == (byte)-1) {
+      return false;
+    }
+
+    active_packet_id = packet_id;
+    active_melody.note_duration = 0;  // Until the tempo arrives
+    streamed_notes_remaining = note_count;
+    streamed_note_playing = false;
+    current_state = BuzzerState::STREAMING_MELODY;
+    return true;
+  }
 }
@@ -5,7 +5,8 @@ namespace BuzzerController {
   enum class BuzzerState {
     IDLE,
     SIMPLE_DURATION,
-    PLAYING_MELODY
+    PLAYING_MELODY,
+    STREAMING_MELODY
   };
   
   // Call once from setup()
@@ -20,6 +21,10 @@ namespace BuzzerController {
   // Sets the state to indicate the start of a melody
   bool start_melody(const byte packet_id, const uint16_t tempo, const uint16_t* frequencies, const byte frequencies_l);
 
+  // Sets the state to indicate the start of a melody streamed with Transfer,
+  // notes are read from the stream as they're played.
+  bool start_streamed_melody(const byte packet_id, const uint16_t note_count);
+
   // Returns the state - good for checking if IDLE, and therefore ready to recieve commands
   BuzzerState get_current_state();
 }
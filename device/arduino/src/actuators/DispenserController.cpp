@@ -0,0 +1,86 @@
+#include "DispenserController.h"
+#include "../communication/Commands.h"
+#include "../communication/Protocol.h"
+
+namespace DispenserController {
+  namespace {
+    // How long the auger takes to move a gram of food, measured for the current hopper.
+    // There's no scale, so the amount delivered is estimated from the motor's running time.
+    const unsigned long MS_PER_GRAM = 50;
+    // Most often NOTIFY_PROGRESS is sent while dispensing.
+    const unsigned long PROGRESS_INTERVAL_MS = 500;
+
+    byte motor_pin = -1;
+    DispenserState current_state = DispenserState::IDLE;
+    byte active_packet_id;
+    uint16_t target_grams = 0;
+    uint16_t reported_grams = 0;
+    unsigned long started_at = 0;
+    unsigned long last_progress_at = 0;
+
+    /** Sends the grams delivered so far, followed by the target, as the payload of response_id. */
+    void send_amount(byte response_id, uint16_t delivered_grams) {
+      // --- PAYLOAD STRUCTURE ---
+      // byte 0-1 : grams delivered (uint16_t, Big-Endian)
+      // byte 2-3 : grams requested (uint16_t, Big-Endian)
+      byte payload[] = {
+        (byte)(delivered_grams >> 8),
+        (byte)(delivered_grams),
+        (byte)(target_grams >> 8),
+        (byte)(target_grams)
+      };
+      Protocol::send_response(active_packet_id, response_id, payload, sizeof(payload));
+    }
+
+    void handle_dispensing_state() {
+      unsigned long now = millis();
+      unsigned long delivered = (now - started_at) / MS_PER_GRAM;
+
+      if (delivered >= target_grams) {
+        digitalWrite(motor_pin, LOW);
+        current_state = DispenserState::IDLE;
+        send_amount(Commands::NOTIFY_TASK_COMPLETE, target_grams);
+        return;
+      }
+
+      if (delivered != reported_grams && now - last_progress_at >= PROGRESS_INTERVAL_MS) {
+        reported_grams = delivered;
+        last_progress_at = now;
+        send_amount(Commands::NOTIFY_PROGRESS, reported_grams);
+      }
+    }
+  }
+
+  void init(byte motor_pin_to_set) {
+    motor_pin = motor_pin_to_set;
+    pinMode(motor_pin, OUTPUT);
+    digitalWrite(motor_pin, LOW);
+    current_state = DispenserState::IDLE;
+  }
+
+  void update() {
+    if (current_state == DispenserState::IDLE || motor_pin == (byte)-1) {
+      return;
+    }
+    handle_dispensing_state();
+  }
+
+  bool start_dispense(const byte packet_id, const uint16_t grams) {
+    if (current_state != DispenserState::IDLE || motor_pin == (byte)-1) {
+      return false;
+    }
+
+    active_packet_id = packet_id;
+    target_grams = grams;
+    reported_grams = 0;
+    started_at = millis();
+    last_progress_at = started_at;
+    current_state = DispenserState::DISPENSING;
+    digitalWrite(motor_pin, HIGH);
+    return true;
+  }
+
+  DispenserState get_current_state() {
+    return current_state;
+  }
+}
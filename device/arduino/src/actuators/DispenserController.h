@@ -0,0 +1,24 @@
+#pragma once
+#include <Arduino.h>
+
+namespace DispenserController {
+  enum class DispenserState {
+    IDLE,
+    DISPENSING
+  };
+
+  // Most food one DISPENSE may ask for, about 25 seconds of motor time.
+  const uint16_t MAX_DISPENSE_GRAMS = 500;
+
+  // Call once from setup()
+  void init(byte motor_pin_to_set);
+
+  // Call each main loop, stops the motor once the amount is delivered and reports progress.
+  void update();
+
+  // Starts the motor to dispense grams of food, returns false if already dispensing.
+  bool start_dispense(const byte packet_id, const uint16_t grams);
+
+  // Returns the state - good for checking if IDLE, and therefore ready to recieve commands
+  DispenserState get_current_state();
+}
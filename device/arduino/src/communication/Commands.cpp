@@ -1,10 +1,36 @@
 #include "Commands.h"
 #include "Protocol.h"
+#include "Transfer.h"
 #include "../actuators/BuzzerController.h"
+#include "../actuators/DispenserController.h"
 #include <Arduino.h>
 
 namespace Commands {
   namespace {
+    // While a batch runs, the first response of each command is kept for the
+    // batch result instead of being sent.
+    bool in_batch = false;
+    byte batch_status = 0;
+
+    /** Sends a command's immediate response, or keeps it for the batch result. */
+    void reply(byte packet_id, byte response_id, const byte* payload, byte payload_length) {
+      if (in_batch) {
+        batch_status = response_id;
+        return;
+      }
+      Protocol::send_response(packet_id, response_id, payload, payload_length);
+    }
+
+    /** Commands whose responses don't fit in a batch result. */
+    bool can_batch(byte command_id) {
+      switch (command_id) {
+        case HELLO: case SET_BAUD: case STREAM_BEGIN: case STREAM_CHUNK: case BATCH:
+          return false;
+        default:
+          return true;
+      }
+    }
+
     /**
      * Reads a uint16_t value from a byte array in Big-Endian format.
      * (!) UNSAFE: Does not handle bound checks.
@@ -13,23 +39,90 @@ namespace Commands {
     uint16_t read_uint16_big_endian(const byte* buffer, byte index) {
       return (uint16_t)(buffer[index] << 8 | buffer[index + 1]);
     }
+
+    /**
+     * Reads a uint32_t value from a byte array in Big-Endian format.
+     * (!) UNSAFE: Does not handle bound checks.
+     */
+    uint32_t read_uint32_big_endian(const byte* buffer, byte index) {
+      return (uint32_t)read_uint16_big_endian(buffer, index) << 16 | read_uint16_big_endian(buffer, index + 2);
+    }
   }
 
   void handle_command(const Protocol::ReceivedPacket& packet) {
     switch (packet.command_id) {
+      case HELLO:
+        handle_hello(packet);
+        break;
+      case SET_BAUD:
+        handle_set_baud(packet);
+        break;
       case BUZZER_SIMPLE:
         handle_buzzer_simple(packet);
         break;
       case BUZZER_MELODY:
         handle_buzzer_melody(packet);
         break;
+      case STREAM_BEGIN:
+        handle_stream_begin(packet);
+        break;
+      case STREAM_CHUNK:
+        Transfer::handle_chunk(packet);
+        break;
+      case BATCH:
+        handle_batch(packet);
+        break;
+      case DISPENSE:
+        handle_dispense(packet);
+        break;
       default:
         byte error_payload[] = { packet.command_id };
-        Protocol::send_response(packet.packet_id, ERROR_UNKNOWN_COMMAND, error_payload, sizeof(error_payload));
+        reply(packet.packet_id, ERROR_UNKNOWN_COMMAND, error_payload, sizeof(error_payload));
         break;
     }
   }
 
+  void send_hello(byte packet_id) {
+    // --- PAYLOAD STRUCTURE ---
+    // byte 0    : protocol version
+    // byte 1-2  : firmware version, major then minor
+    // byte 3-6  : max baud rate (uint32_t, Big-Endian)
+    byte payload[] = {
+      PROTOCOL_VERSION,
+      FIRMWARE_VERSION_MAJOR,
+      FIRMWARE_VERSION_MINOR,
+      (byte)(Protocol::MAX_BAUD_RATE >> 24),
+      (byte)(Protocol::MAX_BAUD_RATE >> 16),
+      (byte)(Protocol::MAX_BAUD_RATE >> 8),
+      (byte)(Protocol::MAX_BAUD_RATE)
+    };
+    Protocol::send_response(packet_id, NOTIFY_HELLO, payload, sizeof(payload));
+  }
+
+  void handle_hello(const Protocol::ReceivedPacket& packet) {
+    send_hello(packet.packet_id);
+  }
+
+  void handle_set_baud(const Protocol::ReceivedPacket& packet) {
+    // --- PAYLOAD STRUCTURE ---
+    // byte 0-3 : baud rate (uint32_t, Big-Endian)
+    const byte EXPECTED_LENGTH = 4;
+    if (packet.payload_length != EXPECTED_LENGTH) {
+      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    uint32_t baud_rate = read_uint32_big_endian(packet.payload, 0);
+    if (!Protocol::is_supported_baud_rate(baud_rate)) {
+      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    // Completes before switching, change_baud_rate flushes this out at the old rate.
+    Protocol::send_response(packet.packet_id, NOTIFY_TASK_COMPLETE, nullptr, 0);
+    Protocol::change_baud_rate(baud_rate);
+  }
+
   void handle_buzzer_simple(const Protocol::ReceivedPacket& packet) {
     // --- PAYLOAD STRUCTURE ---
     // byte 0-1 : frequency (uint16_t, Big-Endian)
@@ -37,7 +130,7 @@ namespace Commands {
     
     const byte EXPECTED_LENGTH = 4;
     if (packet.payload_length != EXPECTED_LENGTH) {
-      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
       return;
     }
 
@@ -46,16 +139,16 @@ namespace Commands {
     uint16_t duration_ms = read_uint16_big_endian(packet.payload, 2);
 
     if (frequency == 0 || duration_ms == 0) {
-      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
       return;
     }
     
     if (!BuzzerController::start_simple_buzz(packet.packet_id, frequency, duration_ms)) {
-      Protocol::send_response(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
+      reply(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
       return;
     }
 
-    Protocol::send_response(packet.packet_id, NOTIFY_COMMAND_RECEIVED, nullptr, 0);
+    reply(packet.packet_id, NOTIFY_COMMAND_RECEIVED, nullptr, 0);
   }
 
   void handle_buzzer_melody(const Protocol::ReceivedPacket& packet) {
@@ -68,7 +161,7 @@ namespace Commands {
     // Packet must contain first three bytes to parse length...
     const byte MIN_EXPECTED_LENGTH = 3;
     if (packet.payload_length < MIN_EXPECTED_LENGTH) {
-      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
       return;
     }
 
@@ -83,7 +176,7 @@ namespace Commands {
     if (packet.payload_length != expected_total_length ||
         notes_array_length == 0 ||
         tempo == 0) {
-      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
       return;
     }
 
@@ -96,11 +189,125 @@ namespace Commands {
 
     // Start the melody, returns false if pin isn't initiated or buzzer is busy...
     if (!BuzzerController::start_melody(packet.packet_id, tempo, melody_notes, notes_array_length)) {
-      Protocol::send_response(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
+      reply(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
       return;
     }
 
+    reply(packet.packet_id, NOTIFY_COMMAND_RECEIVED, nullptr, 0);
+  }
+
+  void handle_dispense(const Protocol::ReceivedPacket& packet) {
+    // --- PAYLOAD STRUCTURE ---
+    // byte 0-1 : grams to dispense (uint16_t, Big-Endian)
+    const byte EXPECTED_LENGTH = 2;
+    if (packet.payload_length != EXPECTED_LENGTH) {
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    uint16_t grams = read_uint16_big_endian(packet.payload, 0);
+    if (grams == 0 || grams > DispenserController::MAX_DISPENSE_GRAMS) {
+      reply(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    // Progress and completion are sent by DispenserController::update() as the motor runs.
+    if (!DispenserController::start_dispense(packet.packet_id, grams)) {
+      reply(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
+      return;
+    }
+
+    reply(packet.packet_id, NOTIFY_COMMAND_RECEIVED, nullptr, 0);
+  }
+
+  void handle_stream_begin(const Protocol::ReceivedPacket& packet) {
+    // --- PAYLOAD STRUCTURE ---
+    // byte 0   : command_id of the streamed command
+    // byte 1-2 : total_length of the stream (uint16_t, Big-Endian)
+    const byte EXPECTED_LENGTH = 3;
+    if (packet.payload_length != EXPECTED_LENGTH) {
+      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    byte command_id = packet.payload[0];
+    uint16_t total_length = read_uint16_big_endian(packet.payload, 1);
+
+    switch (command_id) {
+      case BUZZER_MELODY: {
+        // --- STREAM STRUCTURE ---
+        // byte 0-1 : tempo (uint16_t, Big-Endian)
+        // byte 2.. : notes (uint16_t, Big-Endian), until the end of the stream
+        // At least one note, and whole notes only...
+        if (total_length < 4 || total_length % 2 != 0) {
+          Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+          return;
+        }
+        if (Transfer::is_active() ||
+            !BuzzerController::start_streamed_melody(packet.packet_id, (total_length - 2) / 2)) {
+          Protocol::send_response(packet.packet_id, ERROR_RESOURCE_BUSY, nullptr, 0);
+          return;
+        }
+        break;
+      }
+      default:
+        byte error_payload[] = { command_id };
+        Protocol::send_response(packet.packet_id, ERROR_UNKNOWN_COMMAND, error_payload, sizeof(error_payload));
+        return;
+    }
+
     Protocol::send_response(packet.packet_id, NOTIFY_COMMAND_RECEIVED, nullptr, 0);
+    Transfer::begin(packet.packet_id, total_length);  // Acknowledges, so the Pi starts sending
   }
-}
 
+  void handle_batch(const Protocol::ReceivedPacket& packet) {
+    // --- PAYLOAD STRUCTURE ---
+    // Repeated for each command:
+    // byte 0   : packet_id of the command
+    // byte 1   : command_id
+    // byte 2   : payload_length
+    // byte 3.. : payload
+    const byte ENTRY_HEADER_LENGTH = 3;
+    const byte MAX_BATCH_COMMANDS = Protocol::MAX_PAYLOAD_SIZE / ENTRY_HEADER_LENGTH;
+
+    // Check the whole batch before starting anything, so a malformed one runs nothing...
+    byte command_count = 0;
+    uint16_t index = 0;  // Can pass the end, if the last length is wrong
+    while (index < packet.payload_length) {
+      if (packet.payload_length - index < ENTRY_HEADER_LENGTH || !can_batch(packet.payload[index + 1])) {
+        Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+        return;
+      }
+      index += ENTRY_HEADER_LENGTH + packet.payload[index + 2];
+      command_count++;
+    }
+    if (index != packet.payload_length || command_count == 0) {
+      Protocol::send_response(packet.packet_id, ERROR_INVALID_PAYLOAD, nullptr, 0);
+      return;
+    }
+
+    // Run each command as if it arrived on its own, keeping its response...
+    byte results[MAX_BATCH_COMMANDS];
+    Protocol::ReceivedPacket command;
+    index = 0;
+    in_batch = true;
+    for (byte i = 0; i < command_count; ++i) {
+      command.reset();
+      command.packet_id = packet.payload[index];
+      command.command_id = packet.payload[index + 1];
+      command.payload_length = packet.payload[index + 2];
+      memcpy(command.payload, &packet.payload[index + ENTRY_HEADER_LENGTH], command.payload_length);
+      command.is_valid = true;
+
+      batch_status = ERROR_TASK_FAILED;  // In case a handler doesn't respond
+      handle_command(command);
+      results[i] = batch_status;
+      index += ENTRY_HEADER_LENGTH + command.payload_length;
+    }
+    in_batch = false;
+
+    // --- RESULT STRUCTURE ---
+    // byte i : response_id for the i-th command
+    Protocol::send_response(packet.packet_id, NOTIFY_BATCH_RESULT, results, command_count);
+  }
+}
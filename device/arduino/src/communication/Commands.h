@@ -3,18 +3,39 @@
 #include "Protocol.h"
 
 namespace Commands {
+  // Reported in NOTIFY_HELLO, bump PROTOCOL_VERSION on incompatible packet changes.
+  const byte PROTOCOL_VERSION = 1;
+  const byte FIRMWARE_VERSION_MAJOR = 1;
+  const byte FIRMWARE_VERSION_MINOR = 2;
+
   // Command IDs, sent from the Pi
+  const byte HELLO = 0x01;
+  const byte SET_BAUD = 0x02;
   const byte BUZZER_SIMPLE = 0x10;
   const byte BUZZER_MELODY = 0x11;
+  const byte STREAM_BEGIN = 0x20;
+  const byte STREAM_CHUNK = 0x21;
+  const byte BATCH = 0x30;
+  const byte DISPENSE = 0x40;
   // Response IDs, sent to the Pi 
   const byte NOTIFY_COMMAND_RECEIVED = 0xA0;
   const byte NOTIFY_TASK_COMPLETE = 0xA1;
+  const byte NOTIFY_CHUNK_ACK = 0xA2;
+  const byte NOTIFY_BATCH_RESULT = 0xA3;
+  const byte NOTIFY_PROGRESS = 0xA4;
+  const byte NOTIFY_HELLO = 0xB0;
   const byte ERROR_UNKNOWN_COMMAND = 0xE0;
   const byte ERROR_INVALID_PAYLOAD = 0xE1;
   const byte ERROR_RESOURCE_BUSY = 0xE2;
   const byte ERROR_TASK_FAILED = 0xE3;
   
   void handle_command(const Protocol::ReceivedPacket& packet);
+  void send_hello(byte packet_id);
+  void handle_hello(const Protocol::ReceivedPacket& packet);
+  void handle_set_baud(const Protocol::ReceivedPacket& packet);
   void handle_buzzer_simple(const Protocol::ReceivedPacket& packet);
   void handle_buzzer_melody(const Protocol::ReceivedPacket& packet);
+  void handle_stream_begin(const Protocol::ReceivedPacket& packet);
+  void handle_batch(const Protocol::ReceivedPacket& packet);
+  void handle_dispense(const Protocol::ReceivedPacket& packet);
 }
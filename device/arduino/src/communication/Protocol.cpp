@@ -17,6 +17,44 @@ namespace Protocol {
   static byte expected_payload_length = 0;
   static byte payload_buffer[Protocol::MAX_PAYLOAD_SIZE];
   static byte bytes_recieved = 0;
+  // Set while a baud rate change waits for the Pi to confirm it.
+  static bool awaiting_baud_confirm = false;
+  static unsigned long baud_changed_at = 0;
+
+  void begin() {
+    Serial.begin(BASE_BAUD_RATE);
+    while (!Serial);
+  }
+
+  void update() {
+    if (awaiting_baud_confirm && millis() - baud_changed_at >= BAUD_CONFIRM_TIMEOUT_MS) {
+      // The Pi never spoke at the new rate, go back to the rate it will retry at.
+      change_baud_rate(BASE_BAUD_RATE);
+    }
+  }
+
+  bool is_supported_baud_rate(unsigned long baud_rate) {
+    switch (baud_rate) {
+      case 9600: case 19200: case 38400: case 57600: case 115200:
+        return baud_rate <= MAX_BAUD_RATE;
+      default:
+        return false;
+    }
+  }
+
+  bool change_baud_rate(unsigned long baud_rate) {
+    if (!is_supported_baud_rate(baud_rate)) {
+      return false;
+    }
+
+    Serial.flush();  // Let the response to the Pi go out at the old rate.
+    Serial.end();
+    Serial.begin(baud_rate);
+    current_state = ParseState::WAITING_FOR_START;
+    awaiting_baud_confirm = baud_rate != BASE_BAUD_RATE;
+    baud_changed_at = millis();
+    return true;
+  }
 
   bool check_for_packet(ReceivedPacket& packet) {
     packet.reset();
@@ -87,6 +125,7 @@ namespace Protocol {
             packet.payload_length = expected_payload_length;
             memcpy(packet.payload, payload_buffer, expected_payload_length);
             packet.is_valid = true;
+            awaiting_baud_confirm = false;  // The Pi is talking at this rate.
 
             current_state = ParseState::WAITING_FOR_START;
             return true;
@@ -7,6 +7,12 @@ namespace Protocol {
   const byte START_BYTE = 0xAA;
   const byte MAX_BUFFER_SIZE = 64;
   const byte MAX_PAYLOAD_SIZE = MAX_BUFFER_SIZE - 5; // 4 = 1 START_BYTE + 1 COMMAND_ID + 1 PACKET ID + 1 PAYLOAD_LENGTH + 1 CHECKSUM 
+
+  // The link always starts at BASE_BAUD_RATE, the Pi may then raise it up to MAX_BAUD_RATE.
+  const unsigned long BASE_BAUD_RATE = 9600;
+  const unsigned long MAX_BAUD_RATE = 115200;
+  // A new baud rate must be confirmed by a valid packet within this time, or the link reverts.
+  const unsigned long BAUD_CONFIRM_TIMEOUT_MS = 1000;
   
   /** Structure representing a packet as recieved by the protocol */
   struct ReceivedPacket {
@@ -24,6 +30,17 @@ namespace Protocol {
     }
   };
 
+  // Call once from setup(), opens the serial port at BASE_BAUD_RATE.
+  void begin();
+
+  // Call each main loop, reverts an unconfirmed baud rate change.
+  void update();
+
+  bool is_supported_baud_rate(unsigned long baud_rate);
+
+  // Switches to a new baud rate once pending output is sent. Returns false if unsupported.
+  bool change_baud_rate(unsigned long baud_rate);
+
   bool check_for_packet(ReceivedPacket& packet);
   byte calculate_checksum(const byte* data, byte length);
   bool send_response(byte packet_id, byte response_id, const byte* payload, byte payload_length);
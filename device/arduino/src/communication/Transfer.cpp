@@ -0,0 +1,156 @@
+#include "Transfer.h"
+#include "Commands.h"
+#include "Protocol.h"
+#include <Arduino.h>
+
+namespace Transfer {
+  namespace {
+    byte buffer[BUFFER_SIZE];
+    byte read_index = 0;
+    uint16_t buffered = 0;
+
+    bool active = false;
+    byte active_packet_id = 0;
+    uint16_t bytes_remaining = 0;  // Still to be received
+    byte next_sequence = 0;
+    unsigned long last_chunk_at = 0;
+    // Set when the Pi was told there isn't room for another chunk, so it waits to hear there is.
+    bool window_update_pending = false;
+
+    uint16_t free_space() {
+      return BUFFER_SIZE - buffered;
+    }
+
+    // Space needed before the Pi can send its next chunk.
+    uint16_t space_for_next_chunk() {
+      return bytes_remaining < MAX_CHUNK_DATA_SIZE ? bytes_remaining : MAX_CHUNK_DATA_SIZE;
+    }
+
+    void send_ack() {
+      // --- PAYLOAD STRUCTURE ---
+      // byte 0   : next expected sequence number
+      // byte 1-2 : free buffer space (uint16_t, Big-Endian)
+      uint16_t free_bytes = free_space();
+      byte payload[] = { next_sequence, (byte)(free_bytes >> 8), (byte)free_bytes };
+      Protocol::send_response(active_packet_id, Commands::NOTIFY_CHUNK_ACK, payload, sizeof(payload));
+      window_update_pending = bytes_remaining > 0 && free_bytes < space_for_next_chunk();
+    }
+
+    void reset() {
+      active = false;
+      read_index = 0;
+      buffered = 0;
+      bytes_remaining = 0;
+      next_sequence = 0;
+      window_update_pending = false;
+    }
+  }
+
+  bool begin(byte packet_id, uint16_t total_length) {
+    if (active) {
+      return false;
+    }
+
+    reset();
+    active = true;
+    active_packet_id = packet_id;
+    bytes_remaining = total_length;
+    last_chunk_at = millis();
+    send_ack();  // Tells the Pi how much it can send.
+    return true;
+  }
+
+  void handle_chunk(const Protocol::ReceivedPacket& packet) {
+    // --- PAYLOAD STRUCTURE ---
+    // byte 0  : sequence number, modulo 256
+    // byte 1.. : data
+    if (!active || packet.packet_id != active_packet_id) {
+      // Not ours, e.g. the stream was abandoned, tell the Pi to stop.
+      Protocol::send_response(packet.packet_id, Commands::ERROR_TASK_FAILED, nullptr, 0);
+      return;
+    }
+    if (packet.payload_length < 2) {
+      fail(Commands::ERROR_INVALID_PAYLOAD);
+      return;
+    }
+    // Out of order chunks follow a lost one, and duplicates a lost ack, drop them and repeat
+    // where we are so the Pi goes back. Checked first, a duplicate's length is already counted.
+    if (packet.payload[0] != next_sequence) {
+      send_ack();
+      return;
+    }
+
+    byte data_length = packet.payload_length - 1;
+    if (data_length > bytes_remaining) {
+      fail(Commands::ERROR_INVALID_PAYLOAD);
+      return;
+    }
+    if (data_length > free_space()) {
+      send_ack();
+      return;
+    }
+
+    byte write_index = (read_index + buffered) % BUFFER_SIZE;
+    for (byte i = 0; i < data_length; ++i) {
+      buffer[write_index] = packet.payload[1 + i];
+      write_index = (write_index + 1) % BUFFER_SIZE;
+    }
+    buffered += data_length;
+    bytes_remaining -= data_length;
+    next_sequence++;
+    last_chunk_at = millis();
+    send_ack();
+  }
+
+  void update() {
+    if (!active || bytes_remaining == 0) {
+      return;
+    }
+
+    if (free_space() < space_for_next_chunk()) {
+      // The Pi is waiting on us, not stalled.
+      last_chunk_at = millis();
+      return;
+    }
+    if (window_update_pending) {
+      send_ack();
+      return;
+    }
+    if (millis() - last_chunk_at >= STALL_TIMEOUT_MS) {
+      fail(Commands::ERROR_TASK_FAILED);
+    }
+  }
+
+  bool is_active() {
+    return active;
+  }
+
+  bool is_active(byte packet_id) {
+    return active && active_packet_id == packet_id;
+  }
+
+  uint16_t available() {
+    return buffered;
+  }
+
+  bool read_uint16(uint16_t& value) {
+    if (buffered < 2) {
+      return false;
+    }
+    value = (uint16_t)buffer[read_index] << 8 | buffer[(read_index + 1) % BUFFER_SIZE];
+    read_index = (read_index + 2) % BUFFER_SIZE;
+    buffered -= 2;
+    return true;
+  }
+
+  void finish() {
+    reset();
+  }
+
+  void fail(byte error_response_id) {
+    if (active) {
+      Protocol::send_response(active_packet_id, error_response_id, nullptr, 0);
+    }
+    reset();
+  }
+}
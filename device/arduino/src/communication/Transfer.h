@@ -0,0 +1,38 @@
+#pragma once
+#include <Arduino.h>
+#include "Protocol.h"
+
+// Receives payloads too large for one packet, sent as a stream of chunks.
+// The command consumes the data from a ring buffer as it arrives, so it can
+// start before the transfer finishes. Only one stream is open at a time.
+namespace Transfer {
+  const byte BUFFER_SIZE = 128;
+  const byte MAX_CHUNK_DATA_SIZE = Protocol::MAX_PAYLOAD_SIZE - 1;  // Less the sequence byte
+  // A stream with room for more data that receives no chunk for this long is abandoned.
+  const unsigned long STALL_TIMEOUT_MS = 2000;
+
+  // Opens a stream of total_length bytes, for the command sent with packet_id.
+  // Returns false if a stream is already open.
+  bool begin(byte packet_id, uint16_t total_length);
+
+  // Handles a STREAM_CHUNK, storing it if it's the next in sequence and fits.
+  void handle_chunk(const Protocol::ReceivedPacket& packet);
+
+  // Call each main loop, sends window updates and abandons stalled streams.
+  void update();
+
+  bool is_active();
+  bool is_active(byte packet_id);
+
+  // Bytes received but not yet read.
+  uint16_t available();
+
+  // Reads a uint16_t (Big-Endian), returns false if it hasn't arrived yet.
+  bool read_uint16(uint16_t& value);
+
+  // Closes the stream once the command has read all it needs.
+  void finish();
+
+  // Closes the stream, reporting error_response_id for it to the Pi.
+  void fail(byte error_response_id);
+}
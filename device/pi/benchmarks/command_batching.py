@@ -0,0 +1,75 @@
+"""
+Compares sending commands one packet each against one CMD_BATCH packet,
+counting the bytes and packets each way and the round trips before every
+command is acknowledged.
+
+Each group is sent through ArduinoService to EchoArduino, which accepts
+every command like an idle board would: R_NOTIFY_COMMAND_RECEIVED for a
+single command, one R_NOTIFY_BATCH_RESULT for a batch, then
+R_NOTIFY_TASK_COMPLETE for every command. Times are what the bytes would
+take at 9600 baud, a pty sends them instantly.
+
+Usage:
+python command_batching.py
+"""
+from concurrent.futures import wait
+
+from virtual_arduino import EchoArduino, EmulatorStats
+
+from communication import arduino_protocol
+from communication.arduino_service import ArduinoService
+from communication.commands.buzzer_commands import MelodyCommand, SimpleBuzzCommand
+
+BITS_PER_BYTE = 10  # 8N1, a start and stop bit around each byte
+BAUD_RATE = 9600
+
+GROUPS = {
+    "beep + melody": [SimpleBuzzCommand(2000, 100), MelodyCommand(240, [523, 659, 784])],
+    "3 beeps": [SimpleBuzzCommand(1000 + 500 * i, 80) for i in range(3)],
+    "6 beeps": [SimpleBuzzCommand(1000 + 250 * i, 50) for i in range(6)],
+}
+
+def milliseconds_on_wire(byte_count: int) -> float:
+    return byte_count * BITS_PER_BYTE / BAUD_RATE * 1000
+
+def run():
+    arduino = EchoArduino()
+    service = ArduinoService(arduino.start(), timeout=0.1)
+    if not service.connect():
+        raise SystemExit("Could not connect to the virtual Arduino.")
+
+    print(f"{'group':<15} {'mode':<8} {'bytes sent':>10} {'ack bytes':>9} {'packets':>8} {'round trips':>11} {'ms @ 9600':>9}")
+    try:
+        for name, commands in GROUPS.items():
+            results = {}
+            for mode in ("single", "batch"):
+                arduino.stats = EmulatorStats()
+                if mode == "single":
+                    futures = [service.send_command(command.get_command_id(), command.get_payload()) for command in commands]
+                else:
+                    futures = service.send_batch([(command.get_command_id(), command.get_payload()) for command in commands])
+                done, not_done = wait(futures, timeout=5)
+                if not_done or any(future.exception() for future in done):
+                    raise SystemExit(f"{name} ({mode}) didn't complete.")
+
+                # Only what it takes for every command to be acknowledged, the completions are the same either way.
+                stats = arduino.stats
+                completions = len(commands)
+                completion_bytes = sum(arduino_protocol.HEADER_SIZE + 1 + len(command.get_payload()) for command in commands)
+                ack_bytes = stats.bytes_sent - completion_bytes
+                acknowledgements = (stats.responses.get(arduino_protocol.R_NOTIFY_COMMAND_RECEIVED, 0)
+                                    + stats.responses.get(arduino_protocol.R_NOTIFY_BATCH_RESULT, 0))
+                results[mode] = (stats.bytes_received, ack_bytes)
+                print(f"{name:<15} {mode:<8} {stats.bytes_received:>10} {ack_bytes:>9} "
+                      f"{stats.packets_received + stats.packets_sent - completions:>8} "
+                      f"{acknowledgements:>11} "
+                      f"{milliseconds_on_wire(stats.bytes_received + ack_bytes):>9.1f}")
+
+            single, batch = sum(results["single"]), sum(results["batch"])
+            print(f"{'':<15} {'saved':<8} {single - batch:>20} bytes ({(single - batch) / single:.0%})")
+    finally:
+        service.disconnect()
+        arduino.stop()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,186 @@
+"""
+Compares the per-byte parser ArduinoService used to have against
+arduino_protocol.FrameScanner.
+
+Both are fed the same stream through a fake serial port, the old parser
+reading one byte per call as process_incoming_data did and the scanner
+reading everything waiting in one call.
+
+Usage:
+python frame_scanner.py
+"""
+import io
+import logging
+import os
+import random
+import sys
+import time
+from enum import Enum, auto
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from communication import arduino_protocol
+from communication.arduino_protocol import FrameScanner, Packet, encode_packet
+
+
+class FakeSerial:
+    """Serves a byte stream in fixed size arrivals, like a serial port polled by the main loop."""
+    def __init__(self, data: bytes, arrival_size: int):
+        self._stream = io.BytesIO(data)
+        self._remaining = len(data)
+        self._arrival_size = arrival_size
+        self._waiting = 0
+
+    def arrive(self) -> bool:
+        self._waiting = min(self._arrival_size, self._remaining)
+        return self._waiting > 0
+
+    @property
+    def in_waiting(self) -> int:
+        return self._waiting
+
+    def read(self, size: int = 1) -> bytes:
+        size = min(size, self._waiting)
+        self._waiting -= size
+        self._remaining -= size
+        return self._stream.read(size)
+
+# --- The parser as it was before the FrameScanner ---
+class ParseState(Enum):
+    WAITING_FOR_START = auto()
+    READING_PACKET_ID = auto()
+    READING_RESPONSE_ID = auto()
+    READING_LENGTH = auto()
+    READING_PAYLOAD = auto()
+    VALIDATING_CHECKSUM = auto()
+
+class LegacyParser:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._parse_state = ParseState.WAITING_FOR_START
+        self._current_packet_id = None
+        self._current_response_id = None
+        self._expected_payload_length = 0
+        self._payload_buffer = bytearray()
+        self._bytes_recieved_count = 0
+        self._packet_buffer = bytearray()
+
+    def parse_byte(self, byte: int) -> Optional[Dict[str, Any]]:
+        self._packet_buffer.append(byte)
+        if self._parse_state == ParseState.WAITING_FOR_START:
+            if byte == arduino_protocol.START_BYTE:
+                self._parse_state = ParseState.READING_PACKET_ID
+                self._packet_buffer.clear()
+                self._packet_buffer.append(byte)
+            else:
+                self._packet_buffer.clear()
+        elif self._parse_state == ParseState.READING_PACKET_ID:
+            self._current_packet_id = byte
+            self._parse_state = ParseState.READING_RESPONSE_ID
+        elif self._parse_state == ParseState.READING_RESPONSE_ID:
+            self._current_response_id = byte
+            self._parse_state = ParseState.READING_LENGTH
+        elif self._parse_state == ParseState.READING_LENGTH:
+            self._expected_payload_length = byte
+            if self._expected_payload_length > arduino_protocol.MAX_PAYLOAD_SIZE:
+                self._reset()
+            else:
+                self._bytes_recieved_count = 0
+                self._payload_buffer.clear()
+                if self._expected_payload_length == 0:
+                    self._parse_state = ParseState.VALIDATING_CHECKSUM
+                else:
+                    self._parse_state = ParseState.READING_PAYLOAD
+        elif self._parse_state == ParseState.READING_PAYLOAD:
+            self._payload_buffer.append(byte)
+            self._bytes_recieved_count += 1
+            if self._bytes_recieved_count == self._expected_payload_length:
+                self._parse_state = ParseState.VALIDATING_CHECKSUM
+        elif self._parse_state == ParseState.VALIDATING_CHECKSUM:
+            received_checksum = byte
+            calculated_checksum = arduino_protocol.calculate_checksum(bytes(self._packet_buffer[0:-1]))
+            parsed_packet = {
+                    "packet_id": self._current_packet_id,
+                    "response_id": self._current_response_id,
+                    "payload_length": self._expected_payload_length,
+                    "payload": bytes(self._payload_buffer),
+                    "received_checksum": received_checksum,
+                    "calculated_checksum": calculated_checksum,
+                    "raw_bytes": bytes(self._packet_buffer).hex()
+                    }
+            self._reset()
+            if received_checksum == calculated_checksum:
+                return parsed_packet
+        return None
+
+# --- Drivers ---
+def run_legacy(port: FakeSerial) -> List[Dict[str, Any]]:
+    parser = LegacyParser()
+    packets = []
+    while port.arrive():
+        for _ in range(port.in_waiting):
+            byte = port.read(1)
+            packet = parser.parse_byte(byte[0])
+            if packet:
+                packets.append(packet)
+    return packets
+
+def run_scanner(port: FakeSerial) -> List[Packet]:
+    scanner = FrameScanner()
+    packets = []
+    while port.arrive():
+        packets.extend(scanner.feed(port.read(port.in_waiting)))
+    return packets
+
+def build_stream(packet_count: int, garbage_ratio: float, seed: int = 1) -> bytes:
+    """
+    Builds a stream of typical responses, acknowledgements, completions
+    and the odd error with a payload, with random garbage between packets.
+    """
+    rng = random.Random(seed)
+    stream = bytearray()
+    for packet_id in range(packet_count):
+        response_id, payload = rng.choice([
+            (arduino_protocol.R_NOTIFY_COMMAND_RECEIVED, b""),
+            (arduino_protocol.R_NOTIFY_TASK_COMPLETE, b""),
+            (arduino_protocol.R_ERROR_UNKNOWN_COMMAND, b"\x42"),
+            (arduino_protocol.R_NOTIFY_TASK_COMPLETE, bytes(rng.randrange(256) for _ in range(16)))
+            ])
+        if rng.random() < garbage_ratio:
+            stream += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8)))
+        stream += encode_packet(packet_id % 256, response_id, payload)
+    return bytes(stream)
+
+def benchmark(name: str, run: Callable[[FakeSerial], List[Any]],
+              stream: bytes, arrival_size: int, repeats: int = 5) -> List[Any]:
+    best = float("inf")
+    packets: List[Any] = []
+    for _ in range(repeats):
+        port = FakeSerial(stream, arrival_size)
+        started = time.perf_counter()
+        packets = run(port)
+        best = min(best, time.perf_counter() - started)
+    print(f"  {name:<8} {len(packets):>7} packets  {best * 1e3:8.1f} ms  "
+          f"{len(stream) / best / 1e6:6.2f} MB/s  {best / max(len(packets), 1) * 1e6:6.2f} us/packet")
+    return packets
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)  # Garbage would otherwise log every discarded packet.
+    scenarios = [
+            # 9600 baud is ~960 bytes/s, so ~10 bytes arrive per 10ms main loop tick.
+            ("realistic: 9600 baud, 10 byte arrivals, clean", build_stream(20_000, 0.0), 10),
+            ("realistic: 9600 baud, 10 byte arrivals, 5% garbage", build_stream(20_000, 0.05), 10),
+            ("stress: 4KiB arrivals, clean", build_stream(100_000, 0.0), 4096),
+            ("stress: 4KiB arrivals, 20% garbage", build_stream(100_000, 0.2), 4096),
+            ]
+    for title, stream, arrival_size in scenarios:
+        print(f"{title} ({len(stream)} bytes)")
+        legacy_packets = benchmark("legacy", run_legacy, stream, arrival_size)
+        scanned_packets = benchmark("scanner", run_scanner, stream, arrival_size)
+        legacy_fields = [(packet["packet_id"], packet["response_id"], packet["payload"]) for packet in legacy_packets]
+        scanned_fields = [(packet.packet_id, packet.response_id, bytes(packet.payload)) for packet in scanned_packets]
+        if "clean" in title and legacy_fields != scanned_fields:
+            raise SystemExit("The parsers disagree on a clean stream.")
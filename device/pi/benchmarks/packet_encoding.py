@@ -0,0 +1,65 @@
+"""
+Measures packets encoded per second by the encoder ArduinoService used
+to have, encode_packet and PacketEncoder, for a small payload (a simple
+buzz) and the largest payload the protocol allows.
+
+Usage:
+python packet_encoding.py
+"""
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from communication import arduino_protocol
+from communication.arduino_protocol import PacketEncoder, calculate_checksum, encode_packet
+
+logger = logging.getLogger("legacy")
+
+# --- The encoder as it was before PacketEncoder ---
+def legacy_checksum(data_bytes: bytes) -> int:
+    checksum = 0
+    for byte in data_bytes:
+        checksum ^= byte
+    return checksum
+
+def legacy_encode_packet(packet_id: int, command_id: int, payload: bytes = b'') -> bytes:
+    if len(payload) > arduino_protocol.MAX_PAYLOAD_SIZE:
+        raise ValueError("Payload too large")
+    header = bytes([arduino_protocol.START_BYTE, packet_id, command_id, len(payload)])
+    data_for_checksum = header + payload
+    checksum = legacy_checksum(data_for_checksum)
+    full_packet = data_for_checksum + bytes([checksum])
+    logger.debug(f"Encoded packet (ID: {packet_id}, CMD: {command_id}, PAY_L: {len(payload)}, CHECKSUM: {checksum}): {full_packet.hex()}")
+    return full_packet
+
+def packets_per_second(fn, number: int = 200_000) -> float:
+    return number / min(timeit.repeat(fn, number=number, repeat=5))
+
+if __name__ == "__main__":
+    encoder = PacketEncoder()
+    payloads = {
+            "4 byte payload": bytes.fromhex("0bb803e8"),
+            f"{arduino_protocol.MAX_PAYLOAD_SIZE} byte payload": bytes(range(arduino_protocol.MAX_PAYLOAD_SIZE))
+            }
+
+    for name, payload in payloads.items():
+        expected = legacy_encode_packet(7, arduino_protocol.CMD_BUZZER_MELODY, payload)
+        assert encode_packet(7, arduino_protocol.CMD_BUZZER_MELODY, payload) == expected
+        assert bytes(encoder.encode(7, arduino_protocol.CMD_BUZZER_MELODY, payload)) == expected
+        payload_checksum = calculate_checksum(payload)
+
+        print(name)
+        results = {
+                "legacy encode_packet": lambda: legacy_encode_packet(7, 0x11, payload),
+                "encode_packet": lambda: encode_packet(7, 0x11, payload),
+                "PacketEncoder": lambda: encoder.encode(7, 0x11, payload),
+                "PacketEncoder, known checksum": lambda: encoder.encode(7, 0x11, payload, payload_checksum),
+                }
+        baseline = None
+        for label, fn in results.items():
+            rate = packets_per_second(fn)
+            baseline = baseline or rate
+            print(f"  {label:<30} {rate / 1e6:6.2f} M packets/s  x{rate / baseline:.2f}")
@@ -0,0 +1,101 @@
+"""
+Drives thousands of overlapping commands through ArduinoService against
+the virtual Arduino, and checks every response reached the command it was
+for.
+
+EchoArduino echoes each command's payload back in its
+R_NOTIFY_TASK_COMPLETE, after a random delay. Most commands finish within
+tens of milliseconds, a few take seconds like a long melody, so packet IDs
+are held for very different lengths of time.
+
+Usage:
+python packet_id_stress.py [number_of_commands] [--legacy]
+
+--legacy cycles through packet IDs without tracking which are in use,
+as ArduinoService used to, to show responses being misrouted.
+"""
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+from virtual_arduino import EchoArduino
+
+from communication import arduino_protocol
+from communication.arduino_service import ArduinoService
+
+SUBMITTING_THREADS = 8
+COMMAND_TIMEOUT_SECONDS = 30
+
+class CyclingIds:
+    """The old itertools.cycle packet IDs, with the allocator interface."""
+    def __init__(self):
+        self._ids = itertools.cycle(range(256))
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            return next(self._ids)
+
+    def release(self, packet_id):
+        ...
+
+def completion_delay(rng: random.Random) -> float:
+    if rng.random() < 0.05:
+        return rng.uniform(0.5, 2.0)  # A long running task, e.g. a melody
+    return rng.uniform(0.0, 0.02)
+
+def run(number_of_commands: int, legacy: bool) -> int:
+    rng = random.Random(1)
+    arduino = EchoArduino(lambda: completion_delay(rng))
+    service = ArduinoService(arduino.start(), timeout=0.1)
+    if not service.connect():
+        raise SystemExit("Could not connect to the virtual Arduino.")
+    if legacy:
+        service._packet_ids = CyclingIds()
+
+    futures = {}
+    futures_lock = threading.Lock()
+    counter = itertools.count()
+
+    def submit_commands():
+        while True:
+            index = next(counter)
+            if index >= number_of_commands:
+                return
+            payload = index.to_bytes(4, "big")
+            future = service.send_command(arduino_protocol.CMD_BUZZER_SIMPLE, payload, timeout=COMMAND_TIMEOUT_SECONDS)
+            with futures_lock:
+                futures[future] = payload
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=submit_commands) for _ in range(SUBMITTING_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wait(list(futures), timeout=COMMAND_TIMEOUT_SECONDS + 5)
+    elapsed = time.perf_counter() - started
+
+    misrouted = sum(1 for future, payload in futures.items()
+                    if future.done() and future.exception() is None and future.result() != payload)
+    failed = sum(1 for future in futures if not future.done() or future.exception() is not None)
+    service.disconnect()
+    arduino.stop()
+
+    print(f"{'legacy' if legacy else 'allocator'}: {len(futures)} commands in {elapsed:.1f}s, "
+          f"{arduino.commands_received} received by the virtual Arduino, "
+          f"{misrouted} misrouted responses, {failed} failed or timed out.")
+    return misrouted + failed
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)  # Misrouted runs would log every orphaned response.
+    args = [arg for arg in sys.argv[1:] if arg != "--legacy"]
+    if args and not args[0].isdigit():
+        raise SystemExit(__doc__)
+    problems = run(int(args[0]) if args else 5000, legacy="--legacy" in sys.argv)
+    if problems and "--legacy" not in sys.argv:
+        raise SystemExit("Responses were lost or misrouted.")
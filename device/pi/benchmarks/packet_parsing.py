@@ -0,0 +1,129 @@
+"""
+Compares the memory and time it takes to parse received packets, between
+the FrameScanner that returned a dict per packet, with copies of the
+payload and a hex string of the packet, and the current one returning
+Packet records that view the received bytes.
+
+Memory is measured with tracemalloc while the parsed packets are held, as
+they are while queued for the dispatch thread. Times are measured without
+tracemalloc, which slows allocation down.
+
+Usage:
+python packet_parsing.py
+"""
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from communication import arduino_protocol
+from communication.arduino_protocol import FrameScanner, encode_packet
+
+logger = logging.getLogger("legacy")
+
+# --- The scanner as it was before Packet ---
+class LegacyFrameScanner:
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        buffer = self._buffer
+        buffer += data
+        packets: List[Dict[str, Any]] = []
+        buffer_length = len(buffer)
+        position = 0
+
+        with memoryview(buffer) as view:
+            while True:
+                start = buffer.find(arduino_protocol.START_BYTE, position)
+                if start < 0:
+                    position = buffer_length
+                    break
+                if buffer_length - start < arduino_protocol.HEADER_SIZE:
+                    position = start
+                    break
+
+                payload_length = buffer[start + 3]
+                if payload_length > arduino_protocol.MAX_PAYLOAD_SIZE:
+                    position = start + 1
+                    continue
+
+                end = start + arduino_protocol.HEADER_SIZE + payload_length + 1
+                if end > buffer_length:
+                    position = start
+                    break
+
+                received_checksum = buffer[end - 1]
+                calculated_checksum = arduino_protocol.calculate_checksum(view[start:end - 1])
+                if received_checksum != calculated_checksum:
+                    position = start + 1
+                    continue
+
+                packet = {
+                        "packet_id": buffer[start + 1],
+                        "response_id": buffer[start + 2],
+                        "payload_length": payload_length,
+                        "payload": bytes(view[start + arduino_protocol.HEADER_SIZE:end - 1]),
+                        "received_checksum": received_checksum,
+                        "calculated_checksum": calculated_checksum,
+                        "raw_bytes": buffer[start:end].hex()
+                        }
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Successfully parsed valid packet from Arduino: {packet}")
+                packets.append(packet)
+                position = end
+
+        del buffer[:position]
+        return packets
+
+def build_chunks(packet_count: int, chunk_size: int, seed: int = 1) -> List[bytes]:
+    """Typical responses, mostly acknowledgements and completions, split into serial reads."""
+    rng = random.Random(seed)
+    stream = bytearray()
+    for packet_id in range(packet_count):
+        response_id, payload = rng.choice([
+            (arduino_protocol.R_NOTIFY_COMMAND_RECEIVED, b""),
+            (arduino_protocol.R_NOTIFY_TASK_COMPLETE, b""),
+            (arduino_protocol.R_NOTIFY_CHUNK_ACK, arduino_protocol.CHUNK_ACK_PAYLOAD.pack(3, 64)),
+            (arduino_protocol.R_NOTIFY_TASK_COMPLETE, bytes(rng.randrange(256) for _ in range(16)))
+            ])
+        stream += encode_packet(packet_id % 256, response_id, payload)
+    return [bytes(stream[i:i + chunk_size]) for i in range(0, len(stream), chunk_size)]
+
+def parse_all(scanner_type: Callable[[], Any], chunks: List[bytes]) -> list:
+    scanner = scanner_type()
+    packets = []
+    for chunk in chunks:
+        packets.extend(scanner.feed(chunk))
+    return packets
+
+def measure(name: str, scanner_type: Callable[[], Any], chunks: List[bytes], chunk_size: int):
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        packets = parse_all(scanner_type, chunks)
+        best = min(best, time.perf_counter() - started)
+    count = len(packets)
+    del packets
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    packets = parse_all(scanner_type, chunks)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del packets
+
+    print(f"  {name:<8} {chunk_size:>5} byte reads  {best / count * 1e6:6.2f} us/packet  "
+          f"{(held - before) / count:6.0f} bytes/packet held  {(peak - before) / 1024:8.0f} KiB peak")
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)  # Debug logging off, as in production.
+    for chunk_size in (10, 4096):
+        chunks = build_chunks(50_000, chunk_size)
+        measure("legacy", LegacyFrameScanner, chunks, chunk_size)
+        measure("packet", FrameScanner, chunks, chunk_size)
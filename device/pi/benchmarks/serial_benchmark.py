@@ -0,0 +1,167 @@
+"""
+Benchmarks ArduinoService against the virtual Arduino, no board needed.
+
+- throughput: commands per second, sent from several threads.
+- latency: round trip of one command at a time, to R_NOTIFY_COMMAND_RECEIVED
+  and to R_NOTIFY_TASK_COMPLETE.
+- recovery: commands sent over a link that drops and corrupts bytes, how many
+  still complete and how quickly sending recovers once the link is clean.
+
+Usage:
+python serial_benchmark.py [throughput] [latency] [recovery]
+Runs all three when none are given.
+"""
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import wait
+from typing import List, Tuple
+
+from virtual_arduino import LinkConditions, VirtualArduino
+
+from communication.arduino_service import ArduinoService, ArduinoTimeoutError
+from communication.command_scheduler import CommandScheduler
+from communication.commands.buzzer_commands import MelodyCommand, SimpleBuzzCommand
+
+SUBMITTING_THREADS = 4
+UNKNOWN_COMMAND = 0x7F  # Answered at once with R_ERROR_UNKNOWN_COMMAND, a bare round trip
+
+def connect(conditions: LinkConditions, max_baud_rate: int = 115200) -> Tuple[VirtualArduino, ArduinoService]:
+    arduino = VirtualArduino(conditions)
+    service = ArduinoService(arduino.start(), timeout=0.05, max_baud_rate=max_baud_rate)
+    if not service.connect():
+        arduino.stop()
+        raise SystemExit("Could not connect to the virtual Arduino.")
+    return arduino, service
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+LINKS = [
+    ("pty, unthrottled", LinkConditions(time_scale=0), 115200),
+    ("115200 baud", LinkConditions(time_scale=0, simulate_baud=True), 115200),
+    ("9600 baud", LinkConditions(time_scale=0, simulate_baud=True), 9600),
+    ("115200 + 5ms latency", LinkConditions(time_scale=0, simulate_baud=True, latency=0.005, jitter=0.005), 115200),
+]
+
+def throughput():
+    print("\n--- Throughput")
+    print(f"{'link':<22} {'round trips/s':>13} {'scheduled buzzes/s':>18}")
+    for name, conditions, max_baud_rate in LINKS:
+        arduino, service = connect(conditions, max_baud_rate)
+        try:
+            # Bare round trips, every command is answered at once with an error.
+            count = 2000 if max_baud_rate > 9600 else 300
+            remaining = iter(range(count))
+            lock = threading.Lock()
+            futures = []
+
+            def submit():
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    future = service.send_command(UNKNOWN_COMMAND, timeout=30)
+                    with lock:
+                        futures.append(future)
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=submit) for _ in range(SUBMITTING_THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wait(futures, timeout=60)
+            round_trips = count / (time.perf_counter() - started)
+
+            # Real commands through the scheduler, one buzzer task at a time.
+            scheduler = CommandScheduler(service)
+            count = 500 if max_baud_rate > 9600 else 100
+            started = time.perf_counter()
+            wait([scheduler.submit(SimpleBuzzCommand(440 + i, 1), timeout=30) for i in range(count)], timeout=60)
+            buzzes = count / (time.perf_counter() - started)
+            print(f"{name:<22} {round_trips:>13.0f} {buzzes:>18.0f}")
+        finally:
+            service.disconnect()
+            arduino.stop()
+
+def latency():
+    print("\n--- Round trip latency, ms (p50 / p95 / p99)")
+    print(f"{'link':<22} {'to RECEIVED':>22} {'to COMPLETE':>22}")
+    for name, conditions, max_baud_rate in LINKS:
+        arduino, service = connect(conditions, max_baud_rate)
+        received: List[float] = []
+        completed: List[float] = []
+        try:
+            for i in range(300 if max_baud_rate > 9600 else 100):
+                command = SimpleBuzzCommand(440 + i, 1)
+                started = time.perf_counter()
+                future = service.send_command(command.get_command_id(), command.get_payload(), timeout=5)
+                future.add_progress_callback(lambda *_, started=started: received.append(time.perf_counter() - started))
+                future.result()
+                completed.append(time.perf_counter() - started)
+        finally:
+            service.disconnect()
+            arduino.stop()
+
+        def summary(values: List[float]) -> str:
+            return " / ".join(f"{percentile(values, fraction) * 1000:.2f}" for fraction in (0.5, 0.95, 0.99))
+        print(f"{name:<22} {summary(received):>22} {summary(completed):>22}")
+
+def recovery():
+    print("\n--- Recovery, 300 commands per link, 0.5s timeout")
+    print(f"{'faults per byte':<22} {'completed':>9} {'timed out':>9} {'errors':>6} {'checksum fails':>14} "
+          f"{'recovered in ms':>15} {'600 note stream s':>17}")
+    for rate in (0.0005, 0.002, 0.01, 0.03):
+        conditions = LinkConditions(time_scale=0, simulate_baud=True, drop_rate=rate, corrupt_rate=rate, seed=7)
+        arduino, service = connect(LinkConditions(time_scale=0, simulate_baud=True))
+        arduino.conditions = conditions  # Faults start after the handshake.
+        scheduler = CommandScheduler(service)
+        outcomes = {"completed": 0, "timed out": 0, "errors": 0}
+        try:
+            for i in range(300):
+                try:
+                    scheduler.submit(SimpleBuzzCommand(440 + i, 1), timeout=0.5).result(timeout=5)
+                    outcomes["completed"] += 1
+                except ArduinoTimeoutError:
+                    outcomes["timed out"] += 1
+                except Exception:
+                    outcomes["errors"] += 1
+
+            # A long melody, streamed, resends whatever is lost.
+            started = time.perf_counter()
+            try:
+                scheduler.submit(MelodyCommand(60000, [440] * 600), timeout=30).result(timeout=35)
+                stream_seconds = f"{time.perf_counter() - started:.2f}"
+            except Exception as e:
+                stream_seconds = type(e).__name__
+
+            # Clean the link, and time until a command gets through again.
+            arduino.conditions = LinkConditions(time_scale=0, simulate_baud=True)
+            started = time.perf_counter()
+            while True:
+                try:
+                    scheduler.submit(SimpleBuzzCommand(440, 1), timeout=0.5).result(timeout=5)
+                    break
+                except Exception:
+                    continue
+            recovered = (time.perf_counter() - started) * 1000
+        finally:
+            service.disconnect()
+            arduino.stop()
+
+        print(f"{rate:<22} {outcomes['completed']:>9} {outcomes['timed out']:>9} {outcomes['errors']:>6} "
+              f"{arduino.stats.checksum_errors:>14} {recovered:>15.1f} {stream_seconds:>17}")
+
+BENCHMARKS = {"throughput": throughput, "latency": latency, "recovery": recovery}
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.ERROR)  # Lost packets are expected, and would log every one.
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise SystemExit(__doc__)
+        BENCHMARKS[name]()
@@ -0,0 +1,129 @@
+"""
+Runs a mix of commands through CommandScheduler and ArduinoService against
+a misbehaving virtual Arduino for a long time, reporting as it goes, then
+checks nothing leaked: packet IDs, pending commands, threads and memory.
+Memory is measured from the first report, once caches have warmed up.
+
+The link adds latency and jitter, drops and corrupts the odd byte, and the
+buzzer has busy periods. Commands are simple buzzes, short melodies,
+streamed melodies and batches. Batches go around the scheduler, so their
+buzzes are often refused as busy, that's an answer too.
+
+Usage:
+python serial_soak.py [seconds]
+Defaults to 60 seconds.
+"""
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import Future
+
+from virtual_arduino import LinkConditions, VirtualArduino
+
+from communication.arduino_service import ArduinoService
+from communication.command_scheduler import CommandScheduler
+from communication.commands.buzzer_commands import MelodyCommand, SimpleBuzzCommand
+
+REPORT_INTERVAL_SECONDS = 10
+SUBMITTING_THREADS = 3
+COMMAND_TIMEOUT_SECONDS = 2.0
+SOAK_CONDITIONS = LinkConditions(latency=0.001, jitter=0.002,
+                                 drop_rate=0.0002, corrupt_rate=0.0002,
+                                 busy_interval=5.0, busy_duration=0.2,
+                                 time_scale=0.01, simulate_baud=True, seed=11)
+
+def run(duration: float) -> bool:
+    arduino = VirtualArduino(LinkConditions(time_scale=SOAK_CONDITIONS.time_scale, simulate_baud=True))
+    service = ArduinoService(arduino.start(), timeout=0.05)
+    if not service.connect():
+        raise SystemExit("Could not connect to the virtual Arduino.")
+    arduino.conditions = SOAK_CONDITIONS  # Faults start after the handshake.
+    scheduler = CommandScheduler(service)
+    baseline_threads = threading.active_count()
+    tracemalloc.start()
+    baseline_memory = None
+
+    outcomes: Counter = Counter()
+    outcomes_lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def record(kind: str, future: Future):
+        error = future.exception()
+        with outcomes_lock:
+            outcomes[f"{kind} {'ok' if error is None else type(error).__name__}"] += 1
+
+    def submit_commands(seed: int):
+        rng = random.Random(seed)
+        while time.monotonic() < stop_at:
+            choice = rng.random()
+            if choice < 0.1:
+                kind = "batch"
+                commands = [SimpleBuzzCommand(rng.randint(200, 4000), rng.randint(1, 100)) for _ in range(2)]
+                futures = service.send_batch([(command.get_command_id(), command.get_payload()) for command in commands],
+                                             timeout=COMMAND_TIMEOUT_SECONDS)
+                for future in futures:
+                    future.add_done_callback(lambda future: record(kind, future))
+                futures[-1].exception()
+                continue
+            if choice < 0.15:
+                kind, command = "stream", MelodyCommand(6000, [rng.randint(200, 4000) for _ in range(rng.randint(40, 300))])
+                timeout = 30.0
+            elif choice < 0.45:
+                kind, command = "melody", MelodyCommand(6000, [rng.randint(200, 4000) for _ in range(rng.randint(1, 28))])
+                timeout = COMMAND_TIMEOUT_SECONDS
+            else:
+                kind, command = "buzz", SimpleBuzzCommand(rng.randint(200, 4000), rng.randint(1, 200))
+                timeout = COMMAND_TIMEOUT_SECONDS
+            future = scheduler.submit(command, timeout=timeout)
+            future.add_done_callback(lambda future, kind=kind: record(kind, future))
+            future.exception()  # Wait, so each thread has one command at a time.
+
+    threads = [threading.Thread(target=submit_commands, args=(seed,), daemon=True) for seed in range(SUBMITTING_THREADS)]
+    for thread in threads:
+        thread.start()
+
+    def report():
+        with outcomes_lock:
+            summary = ", ".join(f"{name}: {count}" for name, count in sorted(outcomes.items()))
+        print(f"[{time.monotonic() - started:5.0f}s] {summary} | packet IDs in use: {service._packet_ids.in_use_count()}, "
+              f"checksum fails: {arduino.stats.checksum_errors}, memory: {tracemalloc.get_traced_memory()[0] / 1024:.0f} KiB")
+
+    started = time.monotonic()
+    next_report = started + REPORT_INTERVAL_SECONDS
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.1)
+        if time.monotonic() >= next_report:
+            report()
+            next_report += REPORT_INTERVAL_SECONDS
+            if baseline_memory is None:
+                baseline_memory = tracemalloc.get_traced_memory()[0]
+
+    time.sleep(COMMAND_TIMEOUT_SECONDS)  # Let stragglers finish or time out.
+    report()
+
+    leaks = {
+        "packet IDs in use": service._packet_ids.in_use_count(),
+        "pending commands": len(service._pending_commands),
+        "queued commands": scheduler.pending_count(),
+        "extra threads": max(0, threading.active_count() - baseline_threads),
+        "memory growth KiB": round((tracemalloc.get_traced_memory()[0] - (baseline_memory or 0)) / 1024),
+    }
+    tracemalloc.stop()
+    service.disconnect()
+    arduino.stop()
+
+    print(f"Emulator: {arduino.stats}")
+    print(f"After the soak: {leaks}")
+    # Some memory growth is expected, e.g. logging and struct caches, but not per command.
+    return all(value == 0 for name, value in leaks.items() if name != "memory growth KiB")
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.ERROR)  # Faults are expected, and would log every one.
+    if len(sys.argv) > 1 and not sys.argv[1].replace(".", "", 1).isdigit():
+        raise SystemExit(__doc__)
+    if not run(float(sys.argv[1]) if len(sys.argv) > 1 else 60):
+        raise SystemExit("Resources leaked during the soak.")
@@ -0,0 +1,653 @@
+"""
+A virtual Arduino, running the firmware's protocol on a pseudo terminal so
+ArduinoService can be exercised without a board.
+
+It follows Protocol.cpp, Commands.cpp, Transfer.cpp, BuzzerController.cpp and
+DispenserController.cpp: the same packet parser (a checksum failure drops the
+packet, it doesn't resync), the same commands, validation, responses, buzzer
+states and dispenser progress. The
+link can be made worse with LinkConditions: latency, periods where the
+buzzer is busy, corrupted and dropped bytes, and the time bytes take at the
+current baud rate.
+
+Usage, from another script in this folder:
+    arduino = VirtualArduino(LinkConditions(latency=0.002, drop_rate=0.001))
+    service = ArduinoService(arduino.start())
+    ...
+    arduino.stop()
+"""
+import heapq
+import itertools
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from communication import arduino_protocol
+
+FIRMWARE_VERSION = (1, 2)
+MAX_BAUD_RATE = 115200
+BAUD_CONFIRM_TIMEOUT_SECONDS = 1.0
+MAX_MELODY_NOTES = 30  # BuzzerController's melody buffer
+TRANSFER_BUFFER_SIZE = 128
+STALL_TIMEOUT_SECONDS = 2.0
+MAX_DISPENSE_GRAMS = 500
+DISPENSE_SECONDS_PER_GRAM = 0.05  # DispenserController's MS_PER_GRAM
+DISPENSE_PROGRESS_INTERVAL_SECONDS = 0.5
+BITS_PER_BYTE = 10  # 8N1
+READ_POLL_SECONDS = 0.05
+
+@dataclass
+class LinkConditions:
+    """How badly the virtual Arduino and its link behave, all off by default."""
+    latency: float = 0.0  # Seconds before each received packet is handled
+    jitter: float = 0.0  # Up to this many extra seconds of latency, at random
+    drop_rate: float = 0.0  # Chance each byte, either way, is lost
+    corrupt_rate: float = 0.0  # Chance each byte, either way, has a bit flipped
+    busy_interval: float = 0.0  # Every this many seconds...
+    busy_duration: float = 0.0  # ...the buzzer reports busy for this long
+    time_scale: float = 1.0  # Multiplies buzzer and dispenser durations, 0 finishes them instantly
+    simulate_baud: bool = False  # Pace bytes at the current baud rate
+    seed: int = 0
+
+@dataclass
+class EmulatorStats:
+    """What the virtual Arduino has seen and sent."""
+    bytes_received: int = 0
+    bytes_sent: int = 0
+    packets_received: int = 0
+    packets_sent: int = 0
+    checksum_errors: int = 0
+    bytes_dropped: int = 0
+    bytes_corrupted: int = 0
+    busy_rejections: int = 0
+    responses: Dict[int, int] = field(default_factory=dict)  # Count of each response ID sent
+
+class _ParseState(Enum):
+    WAITING_FOR_START = 0
+    READING_PACKET_ID = 1
+    READING_COMMAND_ID = 2
+    READING_LENGTH = 3
+    READING_PAYLOAD = 4
+    VALIDATING_CHECKSUM = 5
+
+class _BuzzerState(Enum):
+    IDLE = 0
+    SIMPLE_DURATION = 1
+    PLAYING_MELODY = 2
+    STREAMING_MELODY = 3
+
+class _FirmwareParser:
+    """Protocol::check_for_packet, byte for byte."""
+    def __init__(self):
+        self.state = _ParseState.WAITING_FOR_START
+        self.packet_id = 0
+        self.command_id = 0
+        self.length = 0
+        self.payload = bytearray()
+
+    def feed(self, data: bytes) -> Tuple[List[Tuple[int, int, bytes]], int]:
+        """Returns the valid packets completed by data, and the number of checksum failures."""
+        packets = []
+        checksum_errors = 0
+        for byte in data:
+            if self.state == _ParseState.WAITING_FOR_START:
+                if byte == arduino_protocol.START_BYTE:
+                    self.state = _ParseState.READING_PACKET_ID
+            elif self.state == _ParseState.READING_PACKET_ID:
+                self.packet_id = byte
+                self.state = _ParseState.READING_COMMAND_ID
+            elif self.state == _ParseState.READING_COMMAND_ID:
+                self.command_id = byte
+                self.state = _ParseState.READING_LENGTH
+            elif self.state == _ParseState.READING_LENGTH:
+                if byte > arduino_protocol.MAX_PAYLOAD_SIZE:
+                    self.state = _ParseState.WAITING_FOR_START
+                else:
+                    self.length = byte
+                    self.payload = bytearray()
+                    self.state = _ParseState.VALIDATING_CHECKSUM if byte == 0 else _ParseState.READING_PAYLOAD
+            elif self.state == _ParseState.READING_PAYLOAD:
+                self.payload.append(byte)
+                if len(self.payload) == self.length:
+                    self.state = _ParseState.VALIDATING_CHECKSUM
+            else:
+                expected = arduino_protocol.calculate_checksum(
+                    arduino_protocol.HEADER.pack(arduino_protocol.START_BYTE, self.packet_id, self.command_id, self.length)
+                    + self.payload)
+                if byte == expected:
+                    packets.append((self.packet_id, self.command_id, bytes(self.payload)))
+                else:
+                    checksum_errors += 1
+                self.state = _ParseState.WAITING_FOR_START
+        return packets, checksum_errors
+
+class VirtualArduino:
+    """
+    Emulates the firmware on the slave side of a pseudo terminal.
+
+    Firmware state is only touched from one thread, which handles received
+    packets and timers in time order, as the firmware's loop() would.
+    Subclasses can override handle_command to answer differently.
+    """
+    def __init__(self, conditions: Optional[LinkConditions] = None, send_boot_hello: bool = True):
+        """
+        Args:
+            conditions (LinkConditions, optional): Faults to apply, none by default.
+            send_boot_hello (bool): Send NOTIFY_HELLO on start, as the firmware
+                does after booting.
+        """
+        self.conditions = conditions or LinkConditions()
+        self.stats = EmulatorStats()
+        self._send_boot_hello = send_boot_hello
+        self._rng = random.Random(self.conditions.seed)
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._running = False
+        self._started_at = 0.0
+
+        # Timed events, (time, sequence, callable), run on the firmware thread.
+        self._events: List[Tuple[float, int, Callable[[], None]]] = []
+        self._event_sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+        # Serial line
+        self._parser = _FirmwareParser()
+        self.baud_rate = arduino_protocol.BASE_BAUD_RATE
+        self._awaiting_baud_confirm = False
+        self._last_handled_at = 0.0  # Keeps handling in order despite jitter
+        self._inbound_line_free_at = 0.0
+        self._outbound_line_free_at = 0.0
+
+        # Commands
+        self._in_batch = False
+        self._batch_status = 0
+
+        # BuzzerController
+        self.buzzer_state = _BuzzerState.IDLE
+        self._active_packet_id = 0
+        self._buzzer_generation = 0  # Invalidates completion timers of a stopped task
+        self._note_seconds = 0.0
+        self._streamed_notes_remaining = 0
+        self._stream_tempo_read = False
+        self._note_playing_until = 0.0
+
+        # DispenserController
+        self.dispensing = False
+        self._dispense_packet_id = 0
+        self._dispense_target = 0
+
+        # Transfer
+        self._transfer_active = False
+        self._transfer_packet_id = 0
+        self._transfer_buffer = bytearray()
+        self._transfer_remaining = 0
+        self._transfer_sequence = 0
+        self._transfer_last_chunk_at = 0.0
+        self._window_update_pending = False
+
+    # --- Lifecycle
+
+    @property
+    def port(self) -> str:
+        """Path of the pseudo terminal to open, e.g. with ArduinoService."""
+        if self._slave is None:
+            raise RuntimeError("The virtual Arduino hasn't started.")
+        return os.ttyname(self._slave)
+
+    def start(self) -> str:
+        """Opens the pseudo terminal and boots, returning the port to connect to."""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self._running = True
+        self._started_at = time.monotonic()
+        self._threads = [threading.Thread(target=self._read_loop, name="virtual-arduino-rx", daemon=True),
+                         threading.Thread(target=self._event_loop, name="virtual-arduino", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        if self._send_boot_hello:
+            self.schedule(0, lambda: self._send_hello(0))
+        return self.port
+
+    def stop(self):
+        """
+        Stops the emulator and closes the pseudo terminal, which the other
+        end sees as the board being unplugged.
+        """
+        self._running = False
+        with self._condition:
+            self._condition.notify()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def schedule(self, delay: float, fn: Callable[[], None]):
+        """Runs fn on the firmware thread after delay seconds."""
+        with self._condition:
+            heapq.heappush(self._events, (time.monotonic() + delay, next(self._event_sequence), fn))
+            self._condition.notify()
+
+    def _event_loop(self):
+        while self._running:
+            with self._condition:
+                while self._running and (not self._events or self._events[0][0] > time.monotonic()):
+                    timeout = self._events[0][0] - time.monotonic() if self._events else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, fn = heapq.heappop(self._events)
+            try:
+                fn()
+            except OSError:
+                return  # Stopped while writing
+
+    # --- Serial line
+
+    def _byte_seconds(self) -> float:
+        return BITS_PER_BYTE / self.baud_rate if self.conditions.simulate_baud else 0.0
+
+    def _apply_faults(self, data: bytes) -> bytes:
+        conditions = self.conditions
+        if not conditions.drop_rate and not conditions.corrupt_rate:
+            return data
+        result = bytearray()
+        for byte in data:
+            if self._rng.random() < conditions.drop_rate:
+                self.stats.bytes_dropped += 1
+                continue
+            if self._rng.random() < conditions.corrupt_rate:
+                self.stats.bytes_corrupted += 1
+                byte ^= 1 << self._rng.randrange(8)
+            result.append(byte)
+        return bytes(result)
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                # Polls, so stop can close the pty once this returns, a read blocked on it would keep it open.
+                if not select.select([self._master], [], [], READ_POLL_SECONDS)[0]:
+                    continue
+                data = os.read(self._master, 4096)  # pyright: ignore[reportArgumentType]
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.monotonic()
+            self.stats.bytes_received += len(data)
+            packets, checksum_errors = self._parser.feed(self._apply_faults(data))
+            self.stats.checksum_errors += checksum_errors
+
+            # Bytes arrive no faster than the baud rate, and each packet waits out the latency.
+            self._inbound_line_free_at = max(self._inbound_line_free_at, now) + len(data) * self._byte_seconds()
+            for packet in packets:
+                handle_at = self._inbound_line_free_at + self.conditions.latency + self._rng.uniform(0, self.conditions.jitter)
+                self._last_handled_at = max(self._last_handled_at, handle_at)
+                self.schedule(self._last_handled_at - now, lambda packet=packet: self._receive(*packet))
+
+    def _receive(self, packet_id: int, command_id: int, payload: bytes):
+        self.stats.packets_received += 1
+        self._awaiting_baud_confirm = False  # The Pi is talking at this rate.
+        self.handle_command(packet_id, command_id, payload)
+
+    def send_response(self, packet_id: int, response_id: int, payload: bytes = b''):
+        """Protocol::send_response, with any outbound faults and baud pacing."""
+        packet = arduino_protocol.encode_packet(packet_id, response_id, payload)
+        self.stats.packets_sent += 1
+        self.stats.bytes_sent += len(packet)
+        self.stats.responses[response_id] = self.stats.responses.get(response_id, 0) + 1
+        data = self._apply_faults(packet)
+
+        byte_seconds = self._byte_seconds()
+        if not byte_seconds:
+            os.write(self._master, data)  # pyright: ignore[reportArgumentType]
+            return
+        now = time.monotonic()
+        start = max(now, self._outbound_line_free_at)
+        self._outbound_line_free_at = start + len(packet) * byte_seconds
+        self.schedule(self._outbound_line_free_at - now, lambda: os.write(self._master, data))  # pyright: ignore[reportArgumentType]
+
+    # --- Commands
+
+    def _reply(self, packet_id: int, response_id: int, payload: bytes = b''):
+        """Sends a command's immediate response, or keeps it for the batch result."""
+        if self._in_batch:
+            self._batch_status = response_id
+            return
+        self.send_response(packet_id, response_id, payload)
+
+    def handle_command(self, packet_id: int, command_id: int, payload: bytes):
+        """Commands::handle_command, runs on the firmware thread."""
+        handlers = {
+            arduino_protocol.CMD_HELLO: lambda: self._send_hello(packet_id),
+            arduino_protocol.CMD_SET_BAUD: lambda: self._handle_set_baud(packet_id, payload),
+            arduino_protocol.CMD_BUZZER_SIMPLE: lambda: self._handle_buzzer_simple(packet_id, payload),
+            arduino_protocol.CMD_BUZZER_MELODY: lambda: self._handle_buzzer_melody(packet_id, payload),
+            arduino_protocol.CMD_STREAM_BEGIN: lambda: self._handle_stream_begin(packet_id, payload),
+            arduino_protocol.CMD_STREAM_CHUNK: lambda: self._handle_stream_chunk(packet_id, payload),
+            arduino_protocol.CMD_BATCH: lambda: self._handle_batch(packet_id, payload),
+            arduino_protocol.CMD_DISPENSE: lambda: self._handle_dispense(packet_id, payload),
+        }
+        handler = handlers.get(command_id)
+        if handler is None:
+            self._reply(packet_id, arduino_protocol.R_ERROR_UNKNOWN_COMMAND, bytes([command_id]))
+            return
+        handler()
+
+    def _send_hello(self, packet_id: int):
+        self.send_response(packet_id, arduino_protocol.R_NOTIFY_HELLO, arduino_protocol.HELLO_PAYLOAD.pack(
+            arduino_protocol.PROTOCOL_VERSION, *FIRMWARE_VERSION, MAX_BAUD_RATE))
+
+    def _handle_set_baud(self, packet_id: int, payload: bytes):
+        if len(payload) != 4:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        baud_rate = int.from_bytes(payload, "big")
+        if baud_rate not in arduino_protocol.SUPPORTED_BAUD_RATES or baud_rate > MAX_BAUD_RATE:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        self.send_response(packet_id, arduino_protocol.R_NOTIFY_TASK_COMPLETE)
+        self._change_baud_rate(baud_rate)
+
+    def _change_baud_rate(self, baud_rate: int):
+        self.baud_rate = baud_rate
+        self._parser = _FirmwareParser()
+        self._awaiting_baud_confirm = baud_rate != arduino_protocol.BASE_BAUD_RATE
+        if self._awaiting_baud_confirm:
+            self.schedule(BAUD_CONFIRM_TIMEOUT_SECONDS, self._check_baud_confirmed)
+
+    def _check_baud_confirmed(self):
+        if self._awaiting_baud_confirm:
+            self._change_baud_rate(arduino_protocol.BASE_BAUD_RATE)
+
+    def _buzzer_available(self) -> bool:
+        """BuzzerController accepts a new task, unless it's busy or in a configured busy period."""
+        conditions = self.conditions
+        if conditions.busy_interval and conditions.busy_duration:
+            if (time.monotonic() - self._started_at) % conditions.busy_interval < conditions.busy_duration:
+                self.stats.busy_rejections += 1
+                return False
+        return self.buzzer_state == _BuzzerState.IDLE
+
+    def _start_buzzer_task(self, packet_id: int, state: _BuzzerState, seconds: Optional[float]):
+        self.buzzer_state = state
+        self._active_packet_id = packet_id
+        self._buzzer_generation += 1
+        if seconds is not None:
+            generation = self._buzzer_generation
+            self.schedule(seconds * self.conditions.time_scale, lambda: self._finish_buzzer_task(generation))
+
+    def _finish_buzzer_task(self, generation: int):
+        if generation != self._buzzer_generation or self.buzzer_state == _BuzzerState.IDLE:
+            return
+        self.buzzer_state = _BuzzerState.IDLE
+        self.send_response(self._active_packet_id, arduino_protocol.R_NOTIFY_TASK_COMPLETE)
+
+    def _handle_buzzer_simple(self, packet_id: int, payload: bytes):
+        if len(payload) != 4:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        frequency, duration_ms = int.from_bytes(payload[:2], "big"), int.from_bytes(payload[2:], "big")
+        if frequency == 0 or duration_ms == 0:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        if not self._buzzer_available():
+            self._reply(packet_id, arduino_protocol.R_ERROR_RESOURCE_BUSY)
+            return
+        self._start_buzzer_task(packet_id, _BuzzerState.SIMPLE_DURATION, duration_ms / 1000)
+        self._reply(packet_id, arduino_protocol.R_NOTIFY_COMMAND_RECEIVED)
+
+    def _handle_buzzer_melody(self, packet_id: int, payload: bytes):
+        if len(payload) < 3:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        tempo, note_count = int.from_bytes(payload[:2], "big"), payload[2]
+        if len(payload) != 3 + note_count * 2 or note_count == 0 or tempo == 0:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        if note_count > MAX_MELODY_NOTES or not self._buzzer_available():
+            self._reply(packet_id, arduino_protocol.R_ERROR_RESOURCE_BUSY)
+            return
+        self._start_buzzer_task(packet_id, _BuzzerState.PLAYING_MELODY, note_count * (60000 // tempo) / 1000)
+        self._reply(packet_id, arduino_protocol.R_NOTIFY_COMMAND_RECEIVED)
+
+    def _handle_dispense(self, packet_id: int, payload: bytes):
+        if len(payload) != 2:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        grams = int.from_bytes(payload, "big")
+        if grams == 0 or grams > MAX_DISPENSE_GRAMS:
+            self._reply(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        if self.dispensing:
+            self._reply(packet_id, arduino_protocol.R_ERROR_RESOURCE_BUSY)
+            return
+        self.dispensing = True
+        self._dispense_packet_id = packet_id
+        self._dispense_target = grams
+        self._reply(packet_id, arduino_protocol.R_NOTIFY_COMMAND_RECEIVED)
+        self._schedule_dispense_update(0.0)
+
+    def _schedule_dispense_update(self, elapsed: float):
+        """Runs the next DispenserController::update that reports, a progress interval after elapsed."""
+        finish = self._dispense_target * DISPENSE_SECONDS_PER_GRAM
+        next_elapsed = min(elapsed + DISPENSE_PROGRESS_INTERVAL_SECONDS, finish)
+        self.schedule((next_elapsed - elapsed) * self.conditions.time_scale,
+                      lambda: self._update_dispense(next_elapsed))
+
+    def _update_dispense(self, elapsed: float):
+        delivered = min(self._dispense_target, round(elapsed / DISPENSE_SECONDS_PER_GRAM))
+        amount = delivered.to_bytes(2, "big") + self._dispense_target.to_bytes(2, "big")
+        if delivered >= self._dispense_target:
+            self.dispensing = False
+            self.send_response(self._dispense_packet_id, arduino_protocol.R_NOTIFY_TASK_COMPLETE, amount)
+            return
+        self.send_response(self._dispense_packet_id, arduino_protocol.R_NOTIFY_PROGRESS, amount)
+        self._schedule_dispense_update(elapsed)
+
+    def _handle_batch(self, packet_id: int, payload: bytes):
+        entries = []
+        offset = 0
+        while offset < len(payload):
+            if len(payload) - offset < arduino_protocol.BATCH_ENTRY_HEADER.size:
+                entries = None
+                break
+            entry_packet_id, command_id, length = arduino_protocol.BATCH_ENTRY_HEADER.unpack_from(payload, offset)
+            offset += arduino_protocol.BATCH_ENTRY_HEADER.size
+            entries.append((entry_packet_id, command_id, payload[offset:offset + length]))
+            offset += length
+            if command_id in arduino_protocol.UNBATCHABLE_COMMANDS:
+                entries = None
+                break
+        if not entries or offset != len(payload):
+            self.send_response(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+
+        results = bytearray()
+        self._in_batch = True
+        for entry_packet_id, command_id, entry_payload in entries:
+            self._batch_status = arduino_protocol.R_ERROR_TASK_FAILED
+            self.handle_command(entry_packet_id, command_id, entry_payload)
+            results.append(self._batch_status)
+        self._in_batch = False
+        self.send_response(packet_id, arduino_protocol.R_NOTIFY_BATCH_RESULT, bytes(results))
+
+    # --- Streams
+
+    def _handle_stream_begin(self, packet_id: int, payload: bytes):
+        if len(payload) != arduino_protocol.STREAM_BEGIN_PAYLOAD.size:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        command_id, total_length = arduino_protocol.STREAM_BEGIN_PAYLOAD.unpack(payload)
+        if command_id != arduino_protocol.CMD_BUZZER_MELODY:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_UNKNOWN_COMMAND, bytes([command_id]))
+            return
+        if total_length < 4 or total_length % 2:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            return
+        if self._transfer_active or not self._buzzer_available():
+            self.send_response(packet_id, arduino_protocol.R_ERROR_RESOURCE_BUSY)
+            return
+
+        self._start_buzzer_task(packet_id, _BuzzerState.STREAMING_MELODY, None)
+        self._streamed_notes_remaining = (total_length - 2) // 2
+        self._stream_tempo_read = False
+        self._note_playing_until = 0.0
+        self.send_response(packet_id, arduino_protocol.R_NOTIFY_COMMAND_RECEIVED)
+
+        self._transfer_active = True
+        self._transfer_packet_id = packet_id
+        self._transfer_buffer = bytearray()
+        self._transfer_remaining = total_length
+        self._transfer_sequence = 0
+        self._transfer_last_chunk_at = time.monotonic()
+        self._send_chunk_ack()
+        self.schedule(STALL_TIMEOUT_SECONDS, self._check_transfer_stalled)
+
+    def _transfer_free(self) -> int:
+        return TRANSFER_BUFFER_SIZE - len(self._transfer_buffer)
+
+    def _space_for_next_chunk(self) -> int:
+        return min(self._transfer_remaining, arduino_protocol.MAX_CHUNK_DATA_SIZE)
+
+    def _send_chunk_ack(self):
+        free = self._transfer_free()
+        self.send_response(self._transfer_packet_id, arduino_protocol.R_NOTIFY_CHUNK_ACK,
+                           arduino_protocol.CHUNK_ACK_PAYLOAD.pack(self._transfer_sequence, free))
+        self._window_update_pending = self._transfer_remaining > 0 and free < self._space_for_next_chunk()
+
+    def _end_transfer(self, error_response_id: Optional[int] = None):
+        if self._transfer_active and error_response_id is not None:
+            self.send_response(self._transfer_packet_id, error_response_id)
+        self._transfer_active = False
+        self._transfer_buffer = bytearray()
+        self._window_update_pending = False
+
+    def _handle_stream_chunk(self, packet_id: int, payload: bytes):
+        if not self._transfer_active or packet_id != self._transfer_packet_id:
+            self.send_response(packet_id, arduino_protocol.R_ERROR_TASK_FAILED)
+            return
+        if len(payload) < 2:
+            self._end_transfer(arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            self._update_streamed_melody()
+            return
+        # Out of order chunks follow a lost one, and duplicates a lost acknowledgement,
+        # either way drop them and repeat where we are, before their length means anything.
+        if payload[0] != self._transfer_sequence:
+            self._send_chunk_ack()
+            return
+        data = payload[1:]
+        if len(data) > self._transfer_remaining:
+            self._end_transfer(arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+            self._update_streamed_melody()
+            return
+        if len(data) > self._transfer_free():
+            self._send_chunk_ack()
+            return
+
+        self._transfer_buffer += data
+        self._transfer_remaining -= len(data)
+        self._transfer_sequence = (self._transfer_sequence + 1) & 0xFF
+        self._transfer_last_chunk_at = time.monotonic()
+        self._send_chunk_ack()
+        self._update_streamed_melody()
+
+    def _check_transfer_stalled(self):
+        if not self._transfer_active or not self._transfer_remaining:
+            return
+        now = time.monotonic()
+        if self._transfer_free() < self._space_for_next_chunk():
+            self._transfer_last_chunk_at = now  # Waiting on us, not stalled.
+        stalled_at = self._transfer_last_chunk_at + STALL_TIMEOUT_SECONDS
+        if now >= stalled_at:
+            self._end_transfer(arduino_protocol.R_ERROR_TASK_FAILED)
+            self._update_streamed_melody()
+            return
+        self.schedule(stalled_at - now, self._check_transfer_stalled)
+
+    def _read_stream_uint16(self) -> Optional[int]:
+        if len(self._transfer_buffer) < 2:
+            return None
+        value = int.from_bytes(self._transfer_buffer[:2], "big")
+        del self._transfer_buffer[:2]
+        if self._window_update_pending and self._transfer_free() >= self._space_for_next_chunk():
+            self._send_chunk_ack()
+        return value
+
+    def _update_streamed_melody(self):
+        """BuzzerController's STREAMING_MELODY state, run when data arrives or a note ends."""
+        while self.buzzer_state == _BuzzerState.STREAMING_MELODY:
+            if not self._transfer_active or self._transfer_packet_id != self._active_packet_id:
+                self.buzzer_state = _BuzzerState.IDLE  # Abandoned, the transfer reported it.
+                return
+
+            if not self._stream_tempo_read:
+                tempo = self._read_stream_uint16()
+                if tempo is None:
+                    return
+                if tempo == 0:
+                    self.buzzer_state = _BuzzerState.IDLE
+                    self._end_transfer(arduino_protocol.R_ERROR_INVALID_PAYLOAD)
+                    return
+                self._stream_tempo_read = True
+                self._note_seconds = (60000 // tempo) / 1000 * self.conditions.time_scale
+
+            now = time.monotonic()
+            if now < self._note_playing_until:
+                return  # A timer for the end of the note is already set.
+
+            if self._streamed_notes_remaining == 0:
+                self.buzzer_state = _BuzzerState.IDLE
+                self._end_transfer()
+                self.send_response(self._active_packet_id, arduino_protocol.R_NOTIFY_TASK_COMPLETE)
+                return
+
+            if self._read_stream_uint16() is None:
+                return  # Rest until the next note arrives.
+            self._streamed_notes_remaining -= 1
+            if self._note_seconds:
+                self._note_playing_until = now + self._note_seconds
+                self.schedule(self._note_seconds, self._update_streamed_melody)
+                return
+
+class EchoArduino(VirtualArduino):
+    """
+    Accepts every command that isn't part of the link, HELLO, SET_BAUD and
+    batches, and completes it after completion_delay() seconds with the
+    command's payload echoed back, so a response can be matched to its command.
+    """
+    LINK_COMMANDS = (arduino_protocol.CMD_HELLO, arduino_protocol.CMD_SET_BAUD, arduino_protocol.CMD_BATCH)
+
+    def __init__(self, completion_delay: Callable[[], float] = lambda: 0.0, conditions: Optional[LinkConditions] = None):
+        """
+        Args:
+            completion_delay (Callable[[], float]): Returns the seconds each command takes.
+            conditions (LinkConditions, optional): Faults to apply, none by default.
+        """
+        super().__init__(conditions)
+        self._completion_delay = completion_delay
+        self.commands_received = 0
+
+    def handle_command(self, packet_id: int, command_id: int, payload: bytes):
+        if command_id in self.LINK_COMMANDS:
+            super().handle_command(packet_id, command_id, payload)
+            return
+        self.commands_received += 1
+        self._reply(packet_id, arduino_protocol.R_NOTIFY_COMMAND_RECEIVED)
+        self.schedule(self._completion_delay(),
+                      lambda: self.send_response(packet_id, arduino_protocol.R_NOTIFY_TASK_COMPLETE, payload))
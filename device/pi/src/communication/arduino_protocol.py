@@ -1,4 +1,6 @@
 import logging
+import struct
+from typing import List, NamedTuple, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -6,19 +8,39 @@ logger = logging.getLogger(__name__)
 START_BYTE = 0xAA
 MAX_BUFFER_SIZE = 64
 MAX_PAYLOAD_SIZE = MAX_BUFFER_SIZE - 5
+HEADER_SIZE = 4  # START_BYTE, PACKET_ID, COMMAND_ID/RESPONSE_ID, PAYLOAD_LENGTH
+
+# --- Link Settings
+PROTOCOL_VERSION = 1
+BASE_BAUD_RATE = 9600  # The firmware always starts at this rate
+SUPPORTED_BAUD_RATES = (9600, 19200, 38400, 57600, 115200)
 
 # --- Command IDs
+CMD_HELLO = 0x01
+CMD_SET_BAUD = 0x02
 CMD_BUZZER_SIMPLE = 0x10
 CMD_BUZZER_MELODY = 0x11
+CMD_STREAM_BEGIN = 0x20
+CMD_STREAM_CHUNK = 0x21
+CMD_BATCH = 0x30
+CMD_DISPENSE = 0x40
 
 # -- Response IDs 
 R_NOTIFY_COMMAND_RECEIVED = 0xA0
 R_NOTIFY_TASK_COMPLETE = 0xA1
+R_NOTIFY_CHUNK_ACK = 0xA2
+R_NOTIFY_BATCH_RESULT = 0xA3
+R_NOTIFY_PROGRESS = 0xA4
+R_NOTIFY_HELLO = 0xB0
 R_ERROR_UNKNOWN_COMMAND = 0xE0
 R_ERROR_INVALID_PAYLOAD = 0xE1
 R_ERROR_RESOURCE_BUSY = 0xE2
 R_ERROR_TASK_FAILED = 0xE3
 
+def is_error_response(response_id: int) -> bool:
+    """Returns True for the R_ERROR_ responses, 0xE0 to 0xEF, each ends the command it answers."""
+    return response_id & 0xF0 == 0xE0
+
 def get_response_message(response_code: int) -> str:
     """
     Returns a human readable response message from 
@@ -27,6 +49,10 @@ def get_response_message(response_code: int) -> str:
     response_codes = {
             R_NOTIFY_COMMAND_RECEIVED: "NOTIFY_COMMAND_RECEIVED",
             R_NOTIFY_TASK_COMPLETE: "NOTIFY_TASK_COMPLETE",
+            R_NOTIFY_CHUNK_ACK: "NOTIFY_CHUNK_ACK",
+            R_NOTIFY_BATCH_RESULT: "NOTIFY_BATCH_RESULT",
+            R_NOTIFY_PROGRESS: "NOTIFY_PROGRESS",
+            R_NOTIFY_HELLO: "NOTIFY_HELLO",
             R_ERROR_UNKNOWN_COMMAND: "ERROR_UNKNOWN_COMMAND",
             R_ERROR_INVALID_PAYLOAD: "ERROR_INVALID_PAYLOAD",
             R_ERROR_RESOURCE_BUSY: "ERROR_RESOURCE_BUSY",
@@ -34,20 +60,116 @@ def get_response_message(response_code: int) -> str:
             }
     return response_codes.get(response_code, "UNKNOWN_RESPONSE")
 
+class FirmwareInfo(NamedTuple):
+    """The contents of a R_NOTIFY_HELLO payload."""
+    protocol_version: int
+    firmware_major: int
+    firmware_minor: int
+    max_baud_rate: int
+
+HELLO_PAYLOAD = struct.Struct(">BBBI")
+
+def parse_hello(payload: bytes) -> FirmwareInfo:
+    """
+    Parses the payload of a R_NOTIFY_HELLO response.
+
+    Raises:
+        ValueError: If the payload is too short.
+    """
+    if len(payload) < HELLO_PAYLOAD.size:
+        raise ValueError(f"Hello payload is {len(payload)} bytes, expected {HELLO_PAYLOAD.size}.")
+    return FirmwareInfo(*HELLO_PAYLOAD.unpack_from(payload))
+
+# --- Streams
+# A payload too large for one packet is sent as a stream: CMD_STREAM_BEGIN
+# names the command and total length, then CMD_STREAM_CHUNKs with the same
+# packet ID carry the data, each prefixed with a sequence byte. The Arduino
+# acknowledges chunks with R_NOTIFY_CHUNK_ACK, and completes the stream
+# like the command itself, so it can start before the last chunk arrives.
+MAX_STREAM_LENGTH = 0xFFFF
+MAX_CHUNK_DATA_SIZE = MAX_PAYLOAD_SIZE - 1
+STREAM_BEGIN_PAYLOAD = struct.Struct(">BH")  # command ID, total length
+CHUNK_HEADER = struct.Struct(">B")  # sequence number, modulo 256
+CHUNK_ACK_PAYLOAD = struct.Struct(">BH")  # next expected sequence number, free buffer bytes
+
+# --- Batches
+# CMD_BATCH carries several commands in one packet, each with a packet ID of
+# its own. The Arduino starts them in order and answers with one
+# R_NOTIFY_BATCH_RESULT, holding the response ID each command would have sent
+# straight away. Later responses, e.g. R_NOTIFY_TASK_COMPLETE, are sent with
+# each command's own packet ID as usual.
+BATCH_ENTRY_HEADER = struct.Struct(">BBB")  # packet ID, command ID, payload length
+# Commands that answer in ways a batch result can't hold.
+UNBATCHABLE_COMMANDS = frozenset((CMD_HELLO, CMD_SET_BAUD, CMD_STREAM_BEGIN, CMD_STREAM_CHUNK, CMD_BATCH))
+
+def encode_batch(entries: Sequence[Tuple[int, int, bytes]]) -> bytes:
+    """
+    Encodes the payload of a CMD_BATCH packet.
+
+    Args:
+        entries (Sequence[Tuple[int, int, bytes]]): (packet_id, command_id, payload)
+            of each command, in the order they should start.
+
+    Returns:
+        bytes: The batch payload.
+
+    Raises:
+        ValueError: If the batch is empty, holds a command in UNBATCHABLE_COMMANDS,
+            or exceeds MAX_PAYLOAD_SIZE.
+    """
+    if not entries:
+        raise ValueError("Batch must contain at least one command.")
+    size = sum(BATCH_ENTRY_HEADER.size + len(payload) for _, _, payload in entries)
+    if size > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Batch size ({size}) exceeds maximum allowed ({MAX_PAYLOAD_SIZE})")
+
+    batch = bytearray(size)
+    offset = 0
+    for packet_id, command_id, payload in entries:
+        if command_id in UNBATCHABLE_COMMANDS:
+            raise ValueError(f"Command {hex(command_id)} can't be batched.")
+        BATCH_ENTRY_HEADER.pack_into(batch, offset, packet_id, command_id, len(payload))
+        offset += BATCH_ENTRY_HEADER.size
+        batch[offset:offset + len(payload)] = payload
+        offset += len(payload)
+    return bytes(batch)
+
+# Below this many bytes a plain loop beats folding a big integer.
+_CHECKSUM_FOLD_THRESHOLD = 16
+
 def calculate_checksum(data_bytes: bytes) -> int:
     """
     Calculates an XOR checksum for the given bytes.
+
+    Longer data is read as one integer and folded in half repeatedly,
+    XORing the upper half onto the lower, until a single byte is left.
     """
-    checksum = 0 
-    for byte in data_bytes:
-        checksum ^= byte
-    return checksum
+    if len(data_bytes) <= _CHECKSUM_FOLD_THRESHOLD:
+        checksum = 0
+        for byte in data_bytes:
+            checksum ^= byte
+        return checksum
+
+    value = int.from_bytes(data_bytes, "little")
+    shift = 8 << ((len(data_bytes) - 1).bit_length() - 1)  # Largest power of two bytes below the length
+    while shift >= 8:
+        value ^= value >> shift
+        shift >>= 1
+    return value & 0xFF
+
+def header_checksum(packet_id: int, command_id: int, payload_length: int) -> int:
+    """Returns the XOR checksum of a packet header."""
+    return START_BYTE ^ packet_id ^ command_id ^ payload_length
+
+HEADER = struct.Struct(">BBBB")
 
 def encode_packet(packet_id: int, command_id: int, payload: bytes = b'') -> bytes:
     """
     Encodes a command packet according to the protocol.
     Format: [START_BYTE] [PACKET_ID] [COMMAND_ID] [PAYLOAD_LENGTH] [PAYLOAD] [CHECKSUM]
 
+    Allocates a new packet on every call, see PacketEncoder to reuse a buffer.
+
     Args:
         packet_id (int): Unique identifier for this packet (0-255).
         command_id (int): The ID of the command to execute (0-255).
@@ -59,17 +181,188 @@ def encode_packet(packet_id: int, command_id: int, payload: bytes = b'') -> byte
     Raises:
         ValueError: If the payload size exceeds MAX_PAYLOAD_SIZE.
     """
-    if len(payload) > MAX_PAYLOAD_SIZE:
-        raise ValueError(f"Payload size ({len(payload)}) exceeds maximum allowed ({MAX_PAYLOAD_SIZE})")
-    
-    # Header: START_BYTE, PACKET_ID, COMMAND_ID, PAYLOAD_LENGTH
-    header = bytes([START_BYTE, packet_id, command_id, len(payload)])
-    data_for_checksum = header + payload
-    checksum = calculate_checksum(data_for_checksum)
+    payload_length = len(payload)
+    if payload_length > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Payload size ({payload_length}) exceeds maximum allowed ({MAX_PAYLOAD_SIZE})")
+
+    packet = bytearray(HEADER_SIZE + payload_length + 1)
+    HEADER.pack_into(packet, 0, START_BYTE, packet_id, command_id, payload_length)
+    packet[HEADER_SIZE:-1] = payload
+    packet[-1] = header_checksum(packet_id, command_id, payload_length) ^ calculate_checksum(payload)
+    return bytes(packet)
+
+class PacketEncoder:
+    """
+    Encodes packets into a single preallocated buffer, packing the header
+    in place and copying the payload once, rather than concatenating new
+    bytes objects for every packet.
+
+    The packet returned by encode is a view of the buffer, only valid until
+    the next call, so write it out before encoding another. Not thread safe.
+    """
+    def __init__(self):
+        self._buffer = bytearray(MAX_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def encode(self,
+               packet_id: int,
+               command_id: int,
+               payload: bytes = b'',
+               payload_checksum: Optional[int] = None) -> memoryview:
+        """
+        Encodes a command packet according to the protocol, see encode_packet.
+
+        Args:
+            packet_id (int): Unique identifier for this packet (0-255).
+            command_id (int): The ID of the command to execute (0-255).
+            payload (bytes, optional): The payload data, defaults to empty bytes.
+            payload_checksum (int, optional): XOR checksum of the payload, if already
+                known, e.g. for a payload that is sent repeatedly.
+
+        Returns:
+            memoryview: The encoded packet, a view of the encoder's buffer.
+
+        Raises:
+            ValueError: If the payload size exceeds MAX_PAYLOAD_SIZE.
+        """
+        payload_length = len(payload)
+        if payload_length > MAX_PAYLOAD_SIZE:
+            raise ValueError(f"Payload size ({payload_length}) exceeds maximum allowed ({MAX_PAYLOAD_SIZE})")
+
+        buffer = self._buffer
+        HEADER.pack_into(buffer, 0, START_BYTE, packet_id, command_id, payload_length)
+        end = HEADER_SIZE + payload_length
+        buffer[HEADER_SIZE:end] = payload
+        if payload_checksum is None:
+            payload_checksum = calculate_checksum(payload)
+        checksum = header_checksum(packet_id, command_id, payload_length) ^ payload_checksum
+        buffer[end] = checksum
+        packet = self._view[:end + 1]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Encoded packet (ID: {packet_id}, CMD: {command_id}, PAY_L: {payload_length}, CHECKSUM: {checksum}): {packet.hex()}")
+
+        return packet
+
+EMPTY_PAYLOAD = memoryview(b'')
+
+class Packet:
+    """
+    A packet received from the Arduino.
+
+    A non-empty payload is a read-only memoryview of the bytes read from the
+    serial port, so parsing a packet copies nothing, bytes(packet.payload)
+    copies it out. The packet keeps the bytes it was read from, the hex
+    dump of the whole packet is only built when something asks for raw_hex,
+    e.g. a debug log.
+    """
+    __slots__ = ("packet_id", "response_id", "payload", "_data", "_start")
+
+    def __init__(self,
+                 packet_id: int,
+                 response_id: int,
+                 payload: memoryview = EMPTY_PAYLOAD,
+                 data: Optional[bytes] = None,
+                 start: int = 0):
+        """
+        Args:
+            packet_id (int): ID of the command the packet responds to.
+            response_id (int): The response ID.
+            payload (memoryview, optional): The payload. Defaults to empty.
+            data (bytes, optional): The bytes the packet was read from,
+                encoded from the fields if not given.
+            start (int): Offset of the packet's START_BYTE in data.
+        """
+        self.packet_id = packet_id
+        self.response_id = response_id
+        self.payload = payload
+        self._data = data
+        self._start = start
+
+    @property
+    def raw_hex(self) -> str:
+        """The whole packet as a hex string."""
+        if self._data is None:
+            return encode_packet(self.packet_id, self.response_id, self.payload).hex()
+        return self._data[self._start:self._start + HEADER_SIZE + len(self.payload) + 1].hex()
+
+    def __repr__(self) -> str:
+        return (f"Packet(packet_id={self.packet_id}, response={get_response_message(self.response_id)}, "
+                f"payload_length={len(self.payload)}, raw={self.raw_hex})")
+
+class FrameScanner:
+    """
+    Assembles packets from chunks of the serial stream.
+
+    Each chunk is searched for START_BYTE and packets are validated over
+    slices of it, a bad length or checksum only skips past its START_BYTE,
+    so a real packet hidden behind garbage is still found. Parsed packets
+    refer to the chunk rather than copying from it. Only the bytes of an
+    incomplete packet are kept, and joined to the next chunk.
+
+    checksum_errors and invalid_lengths count the packets rejected, ever.
+    """
+    def __init__(self):
+        self._pending = b''
+        self.checksum_errors = 0
+        self.invalid_lengths = 0
+
+    def reset(self):
+        """Discards any partially received packet."""
+        self._pending = b''
+
+    def feed(self, data: bytes) -> List[Packet]:
+        """
+        Adds newly read bytes and returns every packet they complete.
+
+        Args:
+            data (bytes): Bytes read from the serial port, of any length.
+                Anything but bytes is copied, as packets keep views of it.
+
+        Returns:
+            List[Packet]: The parsed packets, in the order received.
+        """
+        if type(data) is not bytes:
+            data = bytes(data)
+        if self._pending:
+            data = self._pending + data
+        packets: List[Packet] = []
+        data_length = len(data)
+        position = 0
+        view = memoryview(data)
+
+        while True:
+            start = data.find(START_BYTE, position)
+            if start < 0:
+                # No packet started, all of it is garbage.
+                position = data_length
+                break
+            if data_length - start < HEADER_SIZE:
+                position = start
+                break
+
+            payload_length = data[start + 3]
+            if payload_length > MAX_PAYLOAD_SIZE:
+                logger.warning(f"Received invalid or excessive payload length ({payload_length}) from Arduino. Resynchronising.")
+                self.invalid_lengths += 1
+                position = start + 1
+                continue
+
+            end = start + HEADER_SIZE + payload_length + 1
+            if end > data_length:
+                # Wait for the rest of the packet.
+                position = start
+                break
 
-    full_packet = data_for_checksum + bytes([checksum])
-    
-    logger.debug(f"Encoded packet (ID: {packet_id}, CMD: {command_id}, PAY_L: {len(payload)}, CHECKSUM: {checksum}): {full_packet.hex()}")
+            if data[end - 1] != calculate_checksum(view[start:end - 1]):
+                logger.warning(f"Checksum mismatch in packet from Arduino - discarding: {view[start:end].hex()}")
+                self.checksum_errors += 1
+                position = start + 1
+                continue
 
-    return full_packet
+            payload = view[start + HEADER_SIZE:end - 1] if payload_length else EMPTY_PAYLOAD
+            packets.append(Packet(data[start + 1], data[start + 2], payload, data, start))
+            position = end
 
+        self._pending = data[position:]
+        return packets
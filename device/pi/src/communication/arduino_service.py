@@ -1,12 +1,21 @@
+import asyncio
+import heapq
 import logging
+import struct
 import time
 import serial
 import itertools
 import threading
-from enum import Enum, auto
-from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from . import arduino_protocol
+from .command_future import CommandFuture
+from . import link_stats
+from .link_stats import LinkStats
+from .packet_ids import PacketIdAllocator
+from .protocol_tracer import ProtocolTracer
+from .stream_transfer import DEFAULT_STREAM_WINDOW, StreamTransfer
 
 logger = logging.getLogger(__name__)
 
@@ -34,54 +43,107 @@ class ArduinoPacketSizeError(ArduinoProtocolError):
     """Raised when a packet size exceeds maximum allowed by the protocol."""
     ...
 
+class ArduinoErrorResponse(ArduinoProtocolError):
+    """
+    Raised on a command's future when the Arduino answers it with an error
+    response. What the error means for the command is up to its spec, see
+    ArduinoCommand.parse_response.
+    """
+    def __init__(self, message: str, response_id: int, payload: bytes):
+        super().__init__(message)
+        self.response_id = response_id
+        self.payload = payload
+
 class ArduinoConnectionError(ArduinoCommunicationError):
     """Raised for issues related to the serial connection state."""
     ...
 
-# --- Packet Parsing State Machine ---
-class ParseState(Enum):
-    """States forn the incoming packet parsing state machine."""
-    WAITING_FOR_START = auto()
-    READING_PACKET_ID = auto()
-    READING_RESPONSE_ID = auto()
-    READING_LENGTH = auto()
-    READING_PAYLOAD = auto()
-    VALIDATING_CHECKSUM = auto()
+class ArduinoConnectionLostError(ArduinoConnectionError):
+    """Raised on pending commands when the serial link drops, e.g. the USB cable is unplugged."""
+    ...
+
+# Responses that resolve a command's future with their payload.
+RESULT_RESPONSES = frozenset((arduino_protocol.R_NOTIFY_TASK_COMPLETE, arduino_protocol.R_NOTIFY_BATCH_RESULT))
+
+DEFAULT_COMMAND_TIMEOUT_SECONDS = 60.0
+# Most time to wait for the firmware to say hello, boards reset when the port opens.
+HANDSHAKE_TIMEOUT_SECONDS = 5.0
+# How often to ask for a hello, for boards that were already running.
+HANDSHAKE_PROBE_INTERVAL_SECONDS = 0.25
+# How long the firmware waits to hear from us at a new baud rate before reverting.
+FIRMWARE_BAUD_CONFIRM_SECONDS = 1.0
+DISPATCH_THREAD_PREFIX = "arduino-dispatch"
+
+def _command_name(command_id: int) -> str:
+    from .commands.base_command import get_command_name  # Commands import this module.
+    return get_command_name(command_id)
 
 # --- Arduino Service Class ---
 class ArduinoService:
-    def __init__(self, port: str, baud_rate: int, timeout: float = 1.0) -> None:
+    def __init__(self,
+                 port: str,
+                 baud_rate: int = arduino_protocol.BASE_BAUD_RATE,
+                 timeout: float = 1.0,
+                 max_baud_rate: int = max(arduino_protocol.SUPPORTED_BAUD_RATES),
+                 tracer: Optional[ProtocolTracer] = None) -> None:
         """
         Initialzies the ArduinoService.
 
         Args:
             port (str): Serial port the Arduino is connected to, e.g. "/dev/ttyACM0".
-            baud_rate (int): The baud rate for serial communication.
-            timeout (float): Default timeout for serial read operations.
+            baud_rate (int): The baud rate the firmware starts at, the handshake
+                is done at this rate. Defaults to BASE_BAUD_RATE.
+            timeout (float): Default timeout for serial read operations, also
+                how long the reader thread may take to notice a disconnect.
                 Defaults to 1.0.
+            max_baud_rate (int): Highest baud rate to negotiate after the handshake,
+                if the firmware supports it. Defaults to the highest supported rate.
+            tracer (ProtocolTracer, optional): Records the bytes sent and received,
+                a new one by default.
         """
         self._port = port
         self._baud_rate = baud_rate
+        self._max_baud_rate = max_baud_rate
         self._default_timeout = timeout
         self._connection: Optional[serial.Serial] = None
 
-        # Parsing state machine variables
-        self._parse_state = ParseState.WAITING_FOR_START
-        self._current_packet_id: Optional[int] = None
-        self._current_response_id: Optional[int] = None
-        self._expected_payload_length = 0 
-        self._payload_buffer = bytearray()
-        self._bytes_recieved_count = 0 
-        self._packet_buffer = bytearray()
+        # Assembles packets from the bytes read, and encodes those written
+        self._frame_scanner = arduino_protocol.FrameScanner()
+        self._encoder = arduino_protocol.PacketEncoder()
+        self._write_lock = threading.Lock()  # Guards the encoder's buffer, and keeps packets whole
+        self._tracer = tracer or ProtocolTracer()
+
+        # Counters and latencies, see get_link_telemetry. The scanner counts its rejections, ever.
+        self._link_stats = LinkStats(name_command=_command_name)
+        self._collected_scanner_errors = (0, 0)
 
         # Response handling
-        self._packet_id_generator = itertools.cycle(range(256))
-        self._pending_commands: Dict[int, Dict[str, Any]] = {}
+        self._packet_ids = PacketIdAllocator()
+        self._pending_commands: Dict[int, CommandFuture] = {}
         self._pending_commands_lock = threading.Lock()
+        # Min-heap of (deadline, sequence, future), the sequence breaks ties.
+        self._deadlines: List[Tuple[float, int, CommandFuture]] = []
+        self._deadline_sequence = itertools.count()
+
+        # Serial I/O, the reader thread blocks on the port and hands packets
+        # to a single dispatch thread so callbacks run in the order received.
+        self._reader_thread: Optional[threading.Thread] = None
+        self._dispatcher: Optional[ThreadPoolExecutor] = None
+        self._stop_event = threading.Event()
+
+        # Handshake, set when the firmware says hello or answers the probe.
+        self._hello_event = threading.Event()
+        self._handshake_packet_id: Optional[int] = None
+        self._firmware_info: Optional[arduino_protocol.FirmwareInfo] = None
+
+        # Called with True once connected, and False when the connection closes or is lost.
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        self._reported_connected = False
 
     def connect(self) -> bool:
         """
-        Opens the serial connection to the Arduino.
+        Opens the serial connection to the Arduino and waits for the firmware
+        to say hello, then raises the baud rate if both sides support it.
 
         Returns:
             bool: True if connection is successful, False otherwise.
@@ -96,208 +158,403 @@ class ArduinoService:
                     self._baud_rate,
                     timeout=self._default_timeout
                     )
-            time.sleep(2)  # Wait for Arduino initialization -> Could be replaced with a handshake.
 
             # Reset any stale data
             self._connection.reset_input_buffer()
             self._reset_parser_state()
-            self._pending_commands.clear()
-            
-            logger.info(f"Connected successfully to Arduino on port {self._port} at rate {self._baud_rate}.")
+            self._fail_pending_commands(ArduinoConnectionError("Connection was reset."))
+            self._firmware_info = None
+            self._start_io()
+
+            started = time.monotonic()
+            if not self._wait_for_hello(HANDSHAKE_TIMEOUT_SECONDS):
+                logger.error(f"Arduino on port {self._port} didn't respond within {HANDSHAKE_TIMEOUT_SECONDS}s.")
+                self.disconnect()
+                return False
+            logger.info(f"Arduino ready after {time.monotonic() - started:.3f}s, firmware: {self._firmware_info}.")
+            self._negotiate_baud_rate()
+
+            logger.info(f"Connected successfully to Arduino on port {self._port} at rate {self._connection.baudrate}.")
+            self._tracer.record_event(f"Connected on {self._port} at {self._connection.baudrate} baud")
+            self._notify_connection_listeners(True)
             return True
         except serial.SerialException as e:
             logger.error(f"Could not connect to Arduino on port {self._port}: {e}")
-            self._connection = None
+            self._abandon_connection()
             return False
         except Exception as e:
             logger.exception(f"An unexpected error occured during Arduino connection on port {self._port}")
-            self._connection = None
+            self._abandon_connection()
             return False
+
+    def _abandon_connection(self):
+        """
+        Stops the threads and closes the port of a connection that failed
+        partway through connect, so retries don't leak them.
+        """
+        self._stop_io()
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.warning(f"Error closing port {self._port} after a failed connect: {e}")
+        self._reset_parser_state()
+        self._fail_pending_commands(ArduinoConnectionError("Connection failed."))
     
     def disconnect(self):
         """Closes the serial connection."""
         if self._connection and self._connection.is_open:
+            self._stop_io()
             self._connection.close()
             self._connection = None
             logger.info(f"Arduino connection on port {self._port} closed.")
+            self._tracer.record_event("Connection closed")
             self._reset_parser_state()
-            self._pending_commands.clear()
+            self._notify_connection_listeners(False)
+            self._fail_pending_commands(ArduinoConnectionError("Connection was closed."))
         else:
             self._connection = None
             logger.info("Attempting to close non-existant connection.")
 
-    def is_connected(self) -> bool:
-        """Checks if the serial connection is currently open."""
-        return self._connection is not None and self._connection.is_open
+    @property
+    def port(self) -> str:
+        """The serial port the Arduino is connected to, or will be."""
+        return self._port
 
-    def _reset_parser_state(self):
-        """Resets the parser state machine variables."""
-        self._parse_state = ParseState.WAITING_FOR_START
-        self._current_packet_id = None
-        self._current_response_id = None
-        self._expected_payload_length = 0 
-        self._payload_buffer.clear()
-        self._bytes_recieved_count = 0 
-        self._packet_buffer.clear()
+    def set_port(self, port: str):
+        """
+        Changes the serial port to connect to, e.g. after the Arduino was
+        plugged back in under a different name. Takes effect on the next connect.
+        """
+        self._port = port
 
-    def _parse_byte(self, byte: int) -> Optional[Dict[str, Any]]:
+    def add_connection_listener(self, listener: Callable[[bool], None]):
         """
-        Processes a single byte from the serial stream using a state 
-        machine to assemble incoming packets.
+        Registers a function called with True once the connection is ready,
+        and False when it's closed or lost. Called on the thread that
+        connected, closed, or noticed the loss, so it shouldn't block.
 
         Args:
-            byte (int): The byte received from the serial port.
-
-        Returns:
-            Optional[Dict[str, Any]]: A dictionary representing the parsed 
-                                      packet if a complete packet is received,
-                                      otherwise None.
-        """
-        self._packet_buffer.append(byte)
-
-        if self._parse_state == ParseState.WAITING_FOR_START:
-            if byte == arduino_protocol.START_BYTE:
-                self._parse_state = ParseState.READING_PACKET_ID
-                # Ensure no stale data is present as we already added without checks
-                self._packet_buffer.clear()
-                self._packet_buffer.append(byte)
-            else:
-                # Garbage data, discard
-                self._packet_buffer.clear()
-
-        elif self._parse_state == ParseState.READING_PACKET_ID:
-            self._current_packet_id = byte
-            self._parse_state = ParseState.READING_RESPONSE_ID
-
-        elif self._parse_state == ParseState.READING_RESPONSE_ID:
-            self._current_response_id = byte
-            self._parse_state = ParseState.READING_LENGTH
-
-        elif self._parse_state == ParseState.READING_LENGTH:
-            self._expected_payload_length = byte
-            if self._expected_payload_length > arduino_protocol.MAX_PAYLOAD_SIZE:
-                logger.warning(f"Received invalid or excessive payload length ({self._expected_payload_length}) from Arduino. \
-                        Resetting buffer.")
-                self._reset_parser_state()
-            else:
-                self._bytes_recieved_count = 0 
-                self._payload_buffer.clear()
-                if self._expected_payload_length == 0:
-                    # No payload expected, skip
-                    self._parse_state = ParseState.VALIDATING_CHECKSUM
-                else:
-                    self._parse_state = ParseState.READING_PAYLOAD
-        
-        elif self._parse_state == ParseState.READING_PAYLOAD:
-            self._payload_buffer.append(byte)
-            self._bytes_recieved_count += 1 
-            if self._bytes_recieved_count == self._expected_payload_length:
-                self._parse_state = ParseState.VALIDATING_CHECKSUM
-
-        elif self._parse_state == ParseState.VALIDATING_CHECKSUM:
-            received_checksum = byte
-            # Final byte is the checksum, so ignore that with a slice.
-            calculated_checksum = arduino_protocol.calculate_checksum(bytes(self._packet_buffer[0:-1]))
-            is_valid = received_checksum == calculated_checksum
-            
-            parsed_packet = {
-                    "packet_id": self._current_packet_id,
-                    "response_id": self._current_response_id,
-                    "payload_length": self._expected_payload_length,
-                    "payload": bytes(self._payload_buffer),
-                    "received_checksum": received_checksum,
-                    "calculated_checksum": calculated_checksum,
-                    "raw_bytes": bytes(self._packet_buffer).hex()
-                    }
-            self._reset_parser_state()
-            
-            if is_valid:
-                logger.debug(f"Successfully parsed valid packet from Arduino: {parsed_packet}")
-                return parsed_packet
-            else:
-                logger.warning(f"Checksum mismatch in packet from Arduino - discarding: {parsed_packet}")
-        
-        # Nothing to return yet, only state VALIDATING_CHECKSUM will return a packet.
-        # Until then we're just running this in a loop.
-        return None
+            listener (Callable[[bool], None]): The function to call.
+        """
+        self._connection_listeners.append(listener)
 
-    def process_incoming_data(self):
+    def _notify_connection_listeners(self, connected: bool):
+        """Tells the listeners the connection state changed, if it did."""
+        if connected == self._reported_connected:
+            return
+        self._reported_connected = connected
+        for listener in list(self._connection_listeners):
+            try:
+                listener(connected)
+            except Exception:
+                logger.exception("Arduino connection listener failed.")
+
+    def get_link_telemetry(self) -> Dict[str, Any]:
+        """
+        Returns the link's counters and command latencies since the last
+        call, as flat telemetry, see LinkStats.collect.
+        """
+        scanner = self._frame_scanner
+        checksum_errors, invalid_lengths = scanner.checksum_errors, scanner.invalid_lengths
+        collected_checksum_errors, collected_invalid_lengths = self._collected_scanner_errors
+        self._collected_scanner_errors = (checksum_errors, invalid_lengths)
+        self._link_stats.count(link_stats.CHECKSUM_ERRORS, checksum_errors - collected_checksum_errors)
+        self._link_stats.count(link_stats.INVALID_LENGTHS, invalid_lengths - collected_invalid_lengths)
+        return self._link_stats.collect()
+
+    def get_tracer(self) -> ProtocolTracer:
+        """Returns the tracer recording the serial link, e.g. to dump it."""
+        return self._tracer
+
+    def get_firmware_info(self) -> Optional[arduino_protocol.FirmwareInfo]:
+        """Returns what the firmware reported in its hello, None for firmware without a handshake."""
+        return self._firmware_info
+
+    def _wait_for_hello(self, timeout: float) -> bool:
         """
-        Reads all available bytes from the serial buffer, processes 
-        them through the state machine and handles any complete packets 
-        found by triggering appropriate callbacks.
+        Waits for the firmware to say hello, either unprompted once it has
+        booted or in answer to a CMD_HELLO probe sent every probe interval.
 
-        This method should be called in the main loop.
+        Returns:
+            bool: True once the firmware answered, False on timeout.
         """
-        if not self.is_connected():
-            logger.debug("Arduino not connected, skipping data processing.")
+        self._hello_event.clear()
+        self._handshake_packet_id = self._packet_ids.acquire(timeout=0)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                if self._handshake_packet_id is not None:
+                    self._write_packet(self._handshake_packet_id, arduino_protocol.CMD_HELLO)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self._hello_event.wait(min(HANDSHAKE_PROBE_INTERVAL_SECONDS, remaining)):
+                    return True
+        finally:
+            if self._handshake_packet_id is not None:
+                self._packet_ids.release(self._handshake_packet_id)
+                self._handshake_packet_id = None
+
+    def _negotiate_baud_rate(self):
+        """
+        Raises the baud rate to the highest both sides support. Falls back
+        to the base rate if the firmware can't be heard at the new one.
+        """
+        if self._firmware_info is None or self._connection is None:
+            return  # Firmware without a handshake only talks at the base rate.
+
+        limit = min(self._firmware_info.max_baud_rate, self._max_baud_rate)
+        target = max((rate for rate in arduino_protocol.SUPPORTED_BAUD_RATES if rate <= limit), default=self._baud_rate)
+        if target <= self._connection.baudrate:
             return
 
         try:
-            bytes_to_read = self._connection.in_waiting # pyright: ignore[reportOptionalMemberAccess]
-            if bytes_to_read > 0:
-                for _ in range(bytes_to_read):
-                    byte = self._connection.read(1) # pyright: ignore[reportOptionalMemberAccess]
-                    if byte:
-                        parsed_packet = self._parse_byte(byte[0])
-                        if parsed_packet:
-                            self._handle_received_packet(parsed_packet)
-                    else:
-                        # This shouldn't happen.
-                        logger.warning("Arduino read unexpected returned None during process_incoming_data.")
-                        break
+            self.send_command(arduino_protocol.CMD_SET_BAUD, struct.pack(">I", target),
+                              timeout=FIRMWARE_BAUD_CONFIRM_SECONDS).result()
+        except ArduinoCommunicationError as e:
+            logger.warning(f"Arduino refused baud rate {target}, staying at {self._connection.baudrate}: {e}")
+            return
 
-        except serial.SerialException as e:
-            logger.error(f"Serial exception during data processing: {e}")
+        self._connection.baudrate = target
+        self._tracer.record_event(f"Baud rate {target}")
+        if self._wait_for_hello(FIRMWARE_BAUD_CONFIRM_SECONDS / 2):
+            logger.info(f"Raised the Arduino baud rate to {target}.")
+            return
 
-        except Exception as e:
-            logger.exception("An unexpected error occured trying to read bytes from Arduino.")
+        logger.warning(f"Arduino didn't answer at baud rate {target}, reverting to {self._baud_rate}.")
+        self._connection.baudrate = self._baud_rate
+        self._tracer.record_event(f"Baud rate {self._baud_rate}, reverted")
+        if not self._wait_for_hello(FIRMWARE_BAUD_CONFIRM_SECONDS * 2):
+            logger.error("Arduino didn't answer after reverting the baud rate.")
+
+    def is_connected(self) -> bool:
+        """Checks if the serial connection is currently open."""
+        return self._connection is not None and self._connection.is_open
+
+    def _reset_parser_state(self):
+        """Discards any partially received packet."""
+        self._frame_scanner.reset()
 
-    def _handle_received_packet(self, packet: Dict[str, Any]):
+    def _start_io(self):
+        """Starts the reader and dispatch threads for a newly opened connection."""
+        self._stop_event.clear()
+        self._dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix=DISPATCH_THREAD_PREFIX)
+        self._reader_thread = threading.Thread(target=self._reader_loop, name="arduino-reader", daemon=True)
+        self._reader_thread.start()
+
+    def _stop_io(self):
+        """
+        Stops the reader and dispatch threads. Safe to call from a callback,
+        in which case the dispatch thread finishes once the callback returns.
+        """
+        self._stop_event.set()
+        if self._connection is not None and hasattr(self._connection, "cancel_read"):
+            self._connection.cancel_read()  # Wakes the reader, where supported.
+
+        if self._reader_thread is not None and self._reader_thread is not threading.current_thread():
+            self._reader_thread.join(timeout=self._default_timeout + 1)
+        self._reader_thread = None
+
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown(wait=False)
+            self._dispatcher = None
+
+    def _reader_loop(self):
+        """
+        Blocks on the serial port until data arrives, then reads everything
+        waiting in one call and dispatches each complete packet immediately.
+
+        Runs on the reader thread until the connection is closed.
         """
-        Handles a complete received packet (valid or invalid checksum).
-        If valid and matching a pending command, will trigger the callback.
+        connection = self._connection
+        dispatcher = self._dispatcher
+        if connection is None or dispatcher is None:
+            return
+
+        while not self._stop_event.is_set():
+            try:
+                data = connection.read(1)  # Returns empty after the read timeout.
+                self._expire_pending_commands()
+                if not data:
+                    continue
+                bytes_waiting = connection.in_waiting
+                if bytes_waiting > 0:
+                    data += connection.read(bytes_waiting)
+                self._tracer.record_received(data)
+                self._link_stats.count(link_stats.BYTES_RECEIVED, len(data))
+
+                packets = self._frame_scanner.feed(data)
+                if packets:
+                    self._link_stats.count(link_stats.PACKETS_RECEIVED, len(packets))
+                for parsed_packet in packets:
+                    dispatcher.submit(self._handle_received_packet, parsed_packet)
+
+            except serial.SerialException as e:
+                if not self._stop_event.is_set():
+                    logger.error(f"Serial exception in the Arduino reader thread: {e}")
+                    self._handle_connection_lost(e)
+                break
+            except Exception as e:
+                logger.exception("An unexpected error occured trying to read bytes from Arduino.")
+                self._handle_connection_lost(e)
+                break
+
+        logger.debug("Arduino reader thread stopped.")
+
+    def _handle_connection_lost(self, error: Exception):
+        """
+        Closes a connection the reader can no longer read from, and fails
+        every pending command with ArduinoConnectionLostError. Listeners hear
+        of the loss first, so they can tell these failures from others.
+        Runs on the reader thread.
+        """
+        if self._stop_event.is_set():
+            return  # Being closed anyway.
+        connection = self._connection
+        self._connection = None
+        self._stop_io()
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing the lost Arduino connection: {e}")
+        self._reset_parser_state()
+        logger.warning(f"Arduino connection on port {self._port} lost.")
+        self._tracer.record_event(f"Connection lost: {error}")
+        self._link_stats.count(link_stats.CONNECTION_LOSSES)
+        self._notify_connection_listeners(False)
+        self._fail_pending_commands(ArduinoConnectionLostError(f"Connection to the Arduino was lost: {error}"))
+
+    def _handle_received_packet(self, packet: arduino_protocol.Packet):
         """
-        logger.debug(f"Packet: {packet}")
-        packet_id = packet["packet_id"]
-        response_id = packet["response_id"]
-        payload = packet["payload"]
-        logger.debug(f"Processing a received packet {packet_id}: {packet}")
-        logger.debug(f"And response_id {response_id}")
+        Handles a complete received packet, resolving the future of the
+        pending command it responds to or reporting progress on it.
+        Runs on the dispatch thread.
+        """
+        packet_id = packet.packet_id
+        response_id = packet.response_id
+        payload = packet.payload
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Processing a received packet: {packet!r}")
+
+        if response_id == arduino_protocol.R_NOTIFY_HELLO:
+            self._handle_hello(payload)
+            return
+        if packet_id == self._handshake_packet_id and response_id == arduino_protocol.R_ERROR_UNKNOWN_COMMAND:
+            logger.warning("Arduino firmware doesn't support the handshake, staying at the base baud rate.")
+            self._hello_event.set()
+            return
 
+        resolves = response_id in RESULT_RESPONSES
+        is_error = arduino_protocol.is_error_response(response_id)
+        is_final = resolves or is_error
         with self._pending_commands_lock:
-            pending_command_info = self._pending_commands.get(packet_id, None)
-
-        if pending_command_info:
-            logger.debug("Found pending command for packet ID {packet_id}. Triggering callback.")
-
-            # If the response_id is R_NOTIFY_COMMAND_RECEIVED we still expect further responses.
-            if response_id != arduino_protocol.R_NOTIFY_COMMAND_RECEIVED:
-                with self._pending_commands_lock:
-                    self._pending_commands.pop(packet_id)
-
-            callback = pending_command_info.get("callback")
-            if callback:
-                try:
-                    callback(packet_id, response_id, payload)
-                except Exception:
-                    logger.exception(f"Error executing callback for packet {packet_id}.")
+            if is_final:
+                future = self._pending_commands.pop(packet_id, None)
+                if future is not None:
+                    self._packet_ids.release(packet_id)
             else:
-                logger.debug(f"No callback registered for packet {packet_id}.")
+                future = self._pending_commands.get(packet_id, None)
 
-        else:
+        if response_id == arduino_protocol.R_ERROR_RESOURCE_BUSY:
+            self._link_stats.count(link_stats.BUSY_REJECTIONS)
+        elif is_error:
+            self._link_stats.count(link_stats.ERROR_RESPONSES)
+
+        if future is None:
             # Could be an unsolicited message, or response to a timed out command.
             logger.warning(f"Received packet with ID {packet_id}, but no matching pending command found.")
+            self._link_stats.count(link_stats.UNMATCHED_RESPONSES)
+            return
+
+        if response_id == arduino_protocol.R_NOTIFY_COMMAND_RECEIVED:
+            self._link_stats.record_latency(future.command_id, link_stats.STAGE_ACK, time.monotonic() - future.sent_at)
+        elif resolves:
+            self._link_stats.record_latency(future.command_id, link_stats.STAGE_COMPLETE, time.monotonic() - future.sent_at)
+
+        # Parsing only views the bytes read, callbacks and results get a copy they can keep and compare.
+        payload = bytes(payload)
+        future._notify_response(response_id, payload)
+        if future.done():
+            return  # Cancelled by the caller while waiting.
+
+        if resolves:
+            future.set_result(payload)
+        elif is_final:
+            future.set_exception(ArduinoErrorResponse(f"Arduino reported {arduino_protocol.get_response_message(response_id)} "
+                                                      f"for command {hex(future.command_id)} (packet {packet_id}).",
+                                                      response_id, payload))
+        else:
+            if response_id == arduino_protocol.R_NOTIFY_COMMAND_RECEIVED:
+                future.acknowledged = True
+            future._notify_progress(response_id, payload)
+
+    def _write_packet(self, packet_id: int, command_id: int, payload: bytes = b'', payload_checksum: Optional[int] = None):
+        """
+        Encodes a packet into the reusable buffer and writes it out.
+        payload_checksum, if known, saves recalculating it.
+
+        Raises:
+            ValueError: If the payload size exceeds MAX_PAYLOAD_SIZE.
+            serial.SerialException: If the write fails.
+        """
+        with self._write_lock:
+            packet = self._encoder.encode(packet_id, command_id, payload, payload_checksum)
+            self._connection.write(packet) # pyright: ignore[reportOptionalMemberAccess]
+            self._tracer.record_sent(packet)
+        self._link_stats.count(link_stats.BYTES_SENT, len(packet))
+        self._link_stats.count(link_stats.PACKETS_SENT)
+
+    def _handle_hello(self, payload: bytes):
+        """Records the firmware's details from a R_NOTIFY_HELLO, sent after boot or to a probe."""
+        try:
+            self._firmware_info = arduino_protocol.parse_hello(payload)
+        except ValueError as e:
+            logger.error(f"Malformed hello from Arduino: {e}")
+            return
+        if self._firmware_info.protocol_version != arduino_protocol.PROTOCOL_VERSION:
+            logger.warning(f"Arduino speaks protocol version {self._firmware_info.protocol_version}, "
+                           f"expected {arduino_protocol.PROTOCOL_VERSION}.")
+        self._hello_event.set()
+
+    def _register_command(self,
+                          command_id: int,
+                          callback: Optional[Callable[[int, int, bytes], None]],
+                          timeout: float) -> CommandFuture:
+        """
+        Allocates a packet ID and records a pending command for it, before it's sent.
+
+        Raises:
+            ArduinoResourceBusyError: If no packet ID frees up within the timeout.
+        """
+        waits = not threading.current_thread().name.startswith(DISPATCH_THREAD_PREFIX)
+        packet_id = self._packet_ids.acquire(timeout=timeout if waits else 0)
+        if packet_id is None:
+            logger.error("All packet IDs are in use, cannot send command.")
+            raise ArduinoResourceBusyError("All packet IDs are in use by pending commands.")
+
+        future = CommandFuture(packet_id, command_id, time.monotonic() + timeout, callback)
+        with self._pending_commands_lock:
+            self._pending_commands[packet_id] = future
+            heapq.heappush(self._deadlines, (future.deadline, next(self._deadline_sequence), future))
+            if len(self._deadlines) > 2 * len(self._pending_commands) + 64:
+                # Mostly completed commands, drop them rather than wait for their deadlines.
+                self._deadlines = [entry for entry in self._deadlines
+                                   if self._pending_commands.get(entry[2].packet_id) is entry[2]]
+                heapq.heapify(self._deadlines)
+        return future
 
     def send_command(self,
                      command_id: int,
                      payload: bytes = b'',
-                     callback: Optional[Callable[[int, int, bytes], None]] = None
-                     ) -> int:
+                     callback: Optional[Callable[[int, int, bytes], None]] = None,
+                     timeout: float = DEFAULT_COMMAND_TIMEOUT_SECONDS,
+                     payload_checksum: Optional[int] = None
+                     ) -> CommandFuture:
         """
         Encodes and sends a command and packet to the Arduino.
-        Registers an optional callback to be called when a response 
-        with matching packet ID is received.
 
         Args:
             command_id (int): The command ID.
@@ -305,11 +562,21 @@ class ArduinoService:
             callback (Callable[int, int, bytes], optional) A function to call
                 when a response with matching packet ID is received. The callback 
                 will receive paramaters (packet_id: int, response_id: int, payload: bytes)
+            timeout (float, optional): Seconds to wait for the command to complete
+                before its future fails with ArduinoTimeoutError. Checked by the
+                reader thread, so expiry may be late by up to the read timeout.
+                Defaults to DEFAULT_COMMAND_TIMEOUT_SECONDS.
+            payload_checksum (int, optional): XOR checksum of the payload, if already
+                known, e.g. from ArduinoCommand.get_payload_checksum.
 
         Returns:
-            int: The packet ID used for this command.
+            CommandFuture: Resolves with the R_NOTIFY_TASK_COMPLETE payload, or fails
+                with ArduinoErrorResponse if the Arduino answers with an error.
 
         Raises:
+            ArduinoResourceBusyError: If every packet ID is still in use by a pending
+                command after waiting up to the timeout. Doesn't wait when called
+                from a response callback, as those are what free the IDs.
             ArduinoConnectionError: If not connected.
             ArduinoProtocolError: If payload size is invalid.
             ArduinoCommunicationError: For other serial communication errors.
@@ -318,47 +585,227 @@ class ArduinoService:
             logger.error("Arduino not connected, cannot send command.")
             raise ArduinoConnectionError("Connection is not open or available.")
 
-        packet_id = next(self._packet_id_generator)
+        future = self._register_command(command_id, callback, timeout)
+        packet_id = future.packet_id
         try:
-            encoded_packet = arduino_protocol.encode_packet(packet_id, command_id, payload)
-            with self._pending_commands_lock:
-                self._pending_commands[packet_id] = {
-                        'command_id': command_id,
-                        'callback': callback,
-                        'timestamp': time.time()
-                        }
-            logger.debug(f"Registered callback for packet {packet_id}.")
-            self._connection.write(encoded_packet) # pyright: ignore[reportOptionalMemberAccess]
+            self._write_packet(packet_id, command_id, payload, payload_checksum)
             logger.info(f"Sent command {command_id}, with packet ID {packet_id}.")
-            return packet_id
+            return future
 
         except ValueError as e:
-            logger.error("Protocol error during packet encoding: {e}")
+            self._discard_pending_command(future)
+            logger.error(f"Protocol error during packet encoding: {e}")
             raise ArduinoProtocolError("Packet encoding failed.") from e
         except serial.SerialException as e:
-            with self._pending_commands_lock:
-                self._pending_commands.pop(packet_id, None)
+            self._discard_pending_command(future)
             logger.exception("Serial exception during send_command.")
             raise ArduinoCommunicationError("Serial communication failure during send_command.") from e
         except Exception as e:
-            with self._pending_commands_lock:
-                self._pending_commands.pop(packet_id, None)
+            self._discard_pending_command(future)
             logger.exception("An unexpected error occured during send_command.")
             raise ArduinoCommunicationError("Unexpected error during send_command") from e
 
-    def cleanup_pending_commands(self, timeout_seconds: float):
+    async def send_command_async(self,
+                                 command_id: int,
+                                 payload: bytes = b'',
+                                 timeout: float = DEFAULT_COMMAND_TIMEOUT_SECONDS
+                                 ) -> bytes:
+        """
+        Sends a command like send_command, for use from asyncio code.
+
+        Returns:
+            bytes: The R_NOTIFY_TASK_COMPLETE payload.
+
+        Raises:
+            ArduinoTimeoutError: If the command doesn't complete within the timeout.
+            ArduinoCommunicationError: If sending fails or the Arduino reports an error.
         """
-        Removes pending commands that have been waiting longer than the specified
-        timeout. Should be called in the main loop.
+        future = self.send_command(command_id, payload, timeout=timeout)
+        return await asyncio.wrap_future(future)
+
+    def send_stream(self,
+                    command_id: int,
+                    data: bytes,
+                    callback: Optional[Callable[[int, int, bytes], None]] = None,
+                    timeout: float = DEFAULT_COMMAND_TIMEOUT_SECONDS,
+                    window: int = DEFAULT_STREAM_WINDOW
+                    ) -> CommandFuture:
         """
-        now = time.time()
-        expired_packet_ids = []
-        with self._pending_commands_lock:
-            for packet_id, info in self._pending_commands.items():
-                if now - info.get("timestamp", now) > timeout_seconds:
-                    expired_packet_ids.append(packet_id)
+        Sends a command whose payload is too large for one packet, as a stream
+        of chunks. The Arduino may start on the command before the last chunk
+        arrives, e.g. playing the start of a long melody.
+
+        Args:
+            command_id (int): The command ID, it must support streaming.
+            data (bytes): The command's stream payload, up to MAX_STREAM_LENGTH bytes.
+            callback (Callable[int, int, bytes], optional): As for send_command,
+                also receives every R_NOTIFY_CHUNK_ACK.
+            timeout (float, optional): Seconds for the whole command to complete,
+                including the transfer.
+            window (int, optional): Most chunks sent ahead of an acknowledgement.
+
+        Returns:
+            CommandFuture: Resolves with the R_NOTIFY_TASK_COMPLETE payload.
+
+        Raises:
+            ArduinoPacketSizeError: If the data is longer than MAX_STREAM_LENGTH.
+            Anything send_command raises.
+        """
+        if len(data) > arduino_protocol.MAX_STREAM_LENGTH:
+            raise ArduinoPacketSizeError(f"Stream of {len(data)} bytes exceeds "
+                                         f"MAX_STREAM_LENGTH ({arduino_protocol.MAX_STREAM_LENGTH}).")
+
+        transfer = StreamTransfer(data, window, callback=callback)
+        header = arduino_protocol.STREAM_BEGIN_PAYLOAD.pack(command_id, len(data))
+        # The transfer is the response callback, so it sees acknowledgements sent straight away.
+        future = self.send_command(arduino_protocol.CMD_STREAM_BEGIN, header, transfer.on_response, timeout)
+        packet_id = future.packet_id
+        transfer.start(lambda chunk: self._write_packet(packet_id, arduino_protocol.CMD_STREAM_CHUNK, chunk), future)
+        return future
+
+    def send_batch(self,
+                   commands: Sequence[Tuple[int, bytes]],
+                   timeout: float = DEFAULT_COMMAND_TIMEOUT_SECONDS
+                   ) -> List[CommandFuture]:
+        """
+        Sends several commands in one CMD_BATCH packet. They reach the Arduino
+        together, with nothing else between them, and start in order. Each
+        command gets its own packet ID and future, as from send_command.
+
+        Args:
+            commands (Sequence[Tuple[int, bytes]]): (command_id, payload) of each command.
+            timeout (float, optional): Seconds for each command to complete.
+
+        Returns:
+            List[CommandFuture]: A future for each command, in order. If the batch
+                itself is rejected or times out, every one fails with that error.
+
+        Raises:
+            ArduinoProtocolError: If the batch is empty, too large for one packet,
+                or holds a command in UNBATCHABLE_COMMANDS.
+            Anything send_command raises.
+        """
+        if not self.is_connected():
+            logger.error("Arduino not connected, cannot send batch.")
+            raise ArduinoConnectionError("Connection is not open or available.")
+
+        futures: List[CommandFuture] = []
+        try:
+            for command_id, _ in commands:
+                futures.append(self._register_command(command_id, None, timeout))
+            batch_payload = arduino_protocol.encode_batch(
+                    [(future.packet_id, command_id, payload) for future, (command_id, payload) in zip(futures, commands)])
+            batch_future = self._register_command(arduino_protocol.CMD_BATCH, None, timeout)
+            futures_with_batch = futures + [batch_future]
+        except ValueError as e:
+            for future in futures:
+                self._discard_pending_command(future)
+            logger.error(f"Invalid batch: {e}")
+            raise ArduinoProtocolError(f"Invalid batch: {e}") from e
+        except Exception:
+            for future in futures:
+                self._discard_pending_command(future)
+            raise
+
+        # Runs on the dispatch thread as the result arrives, before any later response.
+        batch_future.add_done_callback(lambda batch_future: self._apply_batch_result(batch_future, futures))
+        try:
+            self._write_packet(batch_future.packet_id, arduino_protocol.CMD_BATCH, batch_payload)
+            logger.info(f"Sent batch of {len(futures)} commands, with packet ID {batch_future.packet_id}.")
+            return futures
+        except serial.SerialException as e:
+            for future in futures_with_batch:
+                self._discard_pending_command(future)
+            logger.exception("Serial exception during send_batch.")
+            raise ArduinoCommunicationError("Serial communication failure during send_batch.") from e
+        except Exception as e:
+            for future in futures_with_batch:
+                self._discard_pending_command(future)
+            logger.exception("An unexpected error occured during send_batch.")
+            raise ArduinoCommunicationError("Unexpected error during send_batch") from e
 
-            for packet_id in expired_packet_ids:
-                logger.warning(f"Pending command for packet {packet_id} timed out.")
-                self._pending_commands.pop(packet_id, None)
+    def _apply_batch_result(self, batch_future: CommandFuture, futures: List[CommandFuture]):
+        """
+        Hands each command in a batch the response held for it in the
+        R_NOTIFY_BATCH_RESULT, or fails them all if the batch failed.
+        """
+        if batch_future.cancelled():
+            error: Optional[BaseException] = ArduinoCommunicationError("Batch was cancelled.")
+        else:
+            error = batch_future.exception()
+        if error is None:
+            statuses = batch_future.result()
+            if len(statuses) == len(futures):
+                for future, status in zip(futures, statuses):
+                    self._handle_received_packet(arduino_protocol.Packet(future.packet_id, status))
+                return
+            error = ArduinoProtocolError(f"Batch result holds {len(statuses)} responses for {len(futures)} commands.")
+
+        for future in futures:
+            with self._pending_commands_lock:
+                pending = self._pending_commands.get(future.packet_id) is future
+                if pending:
+                    del self._pending_commands[future.packet_id]
+                    self._packet_ids.release(future.packet_id)
+            if pending:
+                self._fail_future(future, error)  # pyright: ignore[reportArgumentType]
+
+    def _expire_pending_commands(self):
+        """
+        Fails the futures of pending commands whose deadline has passed.
+        Deadlines are kept in a min-heap, entries for commands that already
+        completed are discarded as they reach the top.
+        """
+        now = time.monotonic()
+        expired: List[CommandFuture] = []
+        with self._pending_commands_lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, future = heapq.heappop(self._deadlines)
+                if self._pending_commands.get(future.packet_id) is future:
+                    del self._pending_commands[future.packet_id]
+                    self._packet_ids.release(future.packet_id)
+                    expired.append(future)
+
+        if expired:
+            self._link_stats.count(link_stats.TIMEOUTS, len(expired))
+        for future in expired:
+            logger.warning(f"Pending command for packet {future.packet_id} timed out.")
+            self._fail_future(future, ArduinoTimeoutError(
+                f"Command {hex(future.command_id)} (packet {future.packet_id}) timed out."))
+
+    def _discard_pending_command(self, future: CommandFuture):
+        """
+        Forgets a command that failed to send and frees its packet ID, unless
+        it already expired or failed, which freed the ID for another command.
+        """
+        with self._pending_commands_lock:
+            if self._pending_commands.get(future.packet_id) is future:
+                del self._pending_commands[future.packet_id]
+                self._packet_ids.release(future.packet_id)
 
+    def _fail_pending_commands(self, error: Exception):
+        """Fails every pending command, e.g. when the connection closes."""
+        with self._pending_commands_lock:
+            pending = list(self._pending_commands.values())
+            self._pending_commands.clear()
+            self._deadlines.clear()
+            for future in pending:
+                self._packet_ids.release(future.packet_id)
+
+        for future in pending:
+            self._fail_future(future, error)
+
+    def _fail_future(self, future: CommandFuture, error: Exception):
+        """Fails a future on the dispatch thread, so its callbacks run in order with responses."""
+        def fail():
+            if not future.done():
+                future.set_exception(error)
+
+        dispatcher = self._dispatcher
+        if dispatcher is None:
+            fail()
+            return
+        try:
+            dispatcher.submit(fail)
+        except RuntimeError:  # Dispatcher already shut down.
+            fail()
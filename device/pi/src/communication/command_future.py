@@ -0,0 +1,72 @@
+import logging
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ProgressFuture(Future):
+    """
+    A Future that also reports progress before it resolves, e.g. the
+    R_NOTIFY_PROGRESS responses of a long running command.
+    """
+    def __init__(self):
+        super().__init__()
+        self._progress_callbacks: List[Callable[["ProgressFuture", int, Any], None]] = []
+
+    def add_progress_callback(self, fn: Callable[["ProgressFuture", int, Any], None]):
+        """
+        Registers a function to be called with (future, response_id, response)
+        for every response that doesn't resolve the command. A CommandFuture
+        passes the raw payload as the response, a CommandScheduler future the
+        payload as parsed by the command's spec. Called on the ArduinoService
+        dispatch thread.
+        """
+        self._progress_callbacks.append(fn)
+
+    def _notify_progress(self, response_id: int, response: Any):
+        """Calls the progress callbacks for a response that doesn't resolve the command."""
+        for fn in self._progress_callbacks:
+            try:
+                fn(self, response_id, response)
+            except Exception:
+                logger.exception("Error executing progress callback.")
+
+class CommandFuture(ProgressFuture):
+    """
+    The outcome of a command sent to the Arduino.
+
+    Resolves with the payload of the R_NOTIFY_TASK_COMPLETE response, or
+    fails with an ArduinoErrorResponse if the Arduino answers with an error,
+    or an ArduinoTimeoutError once the command's deadline passes. Any other response, such as
+    R_NOTIFY_COMMAND_RECEIVED, is reported to the progress callbacks.
+    """
+    def __init__(self,
+                 packet_id: int,
+                 command_id: int,
+                 deadline: float,
+                 callback: Optional[Callable[[int, int, bytes], None]] = None):
+        """
+        Args:
+            packet_id (int): Packet ID the command was sent with.
+            command_id (int): ID of the command sent.
+            deadline (float): time.monotonic() value after which the command times out.
+            callback (Callable[int, int, bytes], optional): Called with
+                (packet_id, response_id, payload) for every response received.
+        """
+        super().__init__()
+        self.packet_id = packet_id
+        self.command_id = command_id
+        self.deadline = deadline
+        self.sent_at = time.monotonic()
+        self.acknowledged = False
+        self._response_callback = callback
+
+    def _notify_response(self, response_id: int, payload: bytes):
+        """Calls the response callback given to send_command, if any."""
+        if self._response_callback is None:
+            return
+        try:
+            self._response_callback(self.packet_id, response_id, payload)
+        except Exception:
+            logger.exception(f"Error executing callback for packet {self.packet_id}.")
@@ -0,0 +1,342 @@
+import heapq
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import arduino_protocol
+from .arduino_service import (DEFAULT_COMMAND_TIMEOUT_SECONDS, ArduinoConnectionError, ArduinoConnectionLostError,
+                              ArduinoErrorResponse, ArduinoProtocolError, ArduinoResourceBusyError,
+                              ArduinoService)
+from .command_future import CommandFuture, ProgressFuture
+from .commands.base_command import RECONNECT_REPLAY, ArduinoCommand
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOURCE_LIMIT = 1
+DEFAULT_BUSY_RETRY_DELAY_SECONDS = 0.25
+DEFAULT_MAX_BUSY_RETRIES = 5
+
+@dataclass(eq=False)
+class _QueuedCommand:
+    """A command waiting to be sent, or in flight, along with its callers future."""
+    command: ArduinoCommand
+    command_id: int
+    payload: bytes
+    resource: str
+    priority: int
+    timeout: float
+    sequence: int
+    # Its key in CommandScheduler._queued, see _QueuedCommand.make_key.
+    key: Tuple[int, bytes, Optional[int]]
+    streamed: bool = False
+    future: ProgressFuture = field(default_factory=ProgressFuture)
+    attempts: int = 0
+    dispatched: bool = False
+    acknowledged: bool = False
+    # The queue entry currently representing this command, others are stale.
+    entry: Optional[Tuple[int, int, "_QueuedCommand"]] = None
+
+    @staticmethod
+    def make_key(command: ArduinoCommand, sequence: int) -> Tuple[int, bytes, Optional[int]]:
+        """Identical coalescable commands share a key, others are keyed by their sequence too."""
+        return (command.get_command_id(), command.get_payload(), None if command.is_coalescable() else sequence)
+
+    @property
+    def replays(self) -> bool:
+        return self.command.get_reconnect_policy() == RECONNECT_REPLAY
+
+    @property
+    def packet_size(self) -> int:
+        if self.streamed:
+            # Only the CMD_STREAM_BEGIN, the transfer paces its chunks by the Arduino's acknowledgements.
+            return arduino_protocol.HEADER_SIZE + arduino_protocol.STREAM_BEGIN_PAYLOAD.size + 1
+        return arduino_protocol.HEADER_SIZE + len(self.payload) + 1
+
+class CommandScheduler:
+    """
+    Sits in front of ArduinoService, deciding when each command is sent.
+
+    - Each resource (e.g. the buzzer) has a limit on commands in flight,
+      further commands for it are queued rather than rejected as busy.
+    - Queued commands are sent in priority order, then in order submitted.
+    - A coalescable command identical to one still queued shares its
+      future, see ArduinoCommand.is_coalescable.
+    - Commands rejected with R_ERROR_RESOURCE_BUSY are retried with backoff.
+    - Bytes sent but not yet acknowledged are capped, so the Arduino's
+      serial buffer is never flooded.
+    - Responses mean what the command's spec says, see
+      ArduinoCommand.parse_response: the caller's future resolves, or fails,
+      with the parsed R_NOTIFY_TASK_COMPLETE or error response. Progress
+      responses the spec lists, e.g. R_NOTIFY_PROGRESS, are passed on parsed
+      to the future's progress callbacks.
+    - While disconnected nothing is sent. Commands whose reconnect policy is
+      RECONNECT_REPLAY wait, even if they were in flight when the connection
+      was lost, and are sent once reconnected. Others fail.
+    """
+    def __init__(self,
+                 arduino_service: ArduinoService,
+                 resource_limits: Optional[Dict[str, int]] = None,
+                 max_unacked_bytes: int = arduino_protocol.MAX_BUFFER_SIZE,
+                 busy_retry_delay: float = DEFAULT_BUSY_RETRY_DELAY_SECONDS,
+                 max_busy_retries: int = DEFAULT_MAX_BUSY_RETRIES):
+        """
+        Args:
+            arduino_service (ArduinoService): Service used to send the commands.
+            resource_limits (Dict[str, int], optional): Commands allowed in flight
+                per resource, resources not listed allow DEFAULT_RESOURCE_LIMIT.
+            max_unacked_bytes (int): Most bytes that may be sent without the Arduino
+                acknowledging them. Defaults to the Arduino's buffer size.
+            busy_retry_delay (float): Seconds before the first retry of a busy
+                command, doubled on every further retry.
+            max_busy_retries (int): Retries before a busy command's future fails
+                with ArduinoResourceBusyError.
+        """
+        self._service = arduino_service
+        self._resource_limits = resource_limits or {}
+        self._max_unacked_bytes = max_unacked_bytes
+        self._busy_retry_delay = busy_retry_delay
+        self._max_busy_retries = max_busy_retries
+
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        # Per-resource min-heaps of (priority, sequence, command)
+        self._queues: Dict[str, List[Tuple[int, int, _QueuedCommand]]] = {}
+        # Queued commands by _QueuedCommand.key, for coalescing
+        self._queued: Dict[Tuple[int, bytes, Optional[int]], _QueuedCommand] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._unacked_bytes = 0
+        self._connected = arduino_service.is_connected()
+        arduino_service.add_connection_listener(self._on_connection_change)
+
+    def submit(self, command: ArduinoCommand, timeout: float = DEFAULT_COMMAND_TIMEOUT_SECONDS) -> ProgressFuture:
+        """
+        Queues a command to be sent as soon as its resource is free.
+
+        Args:
+            command (ArduinoCommand): The command to send.
+            timeout (float): Seconds to wait for completion once sent.
+
+        Returns:
+            ProgressFuture: Resolves with the R_NOTIFY_TASK_COMPLETE response as parsed
+                by command.parse_response, or fails with the exception it raises for
+                an error response, like the CommandFuture from ArduinoService.send_command
+                otherwise. Fails with ArduinoConnectionError while disconnected,
+                unless the command replays.
+        """
+        if not self._connected and command.get_reconnect_policy() != RECONNECT_REPLAY:
+            future = ProgressFuture()
+            future.set_exception(ArduinoConnectionError("Arduino is not connected."))
+            return future
+
+        priority = command.get_priority()
+
+        with self._lock:
+            sequence = next(self._sequence)
+            key = _QueuedCommand.make_key(command, sequence)
+            queued = self._queued.get(key)
+            if queued is not None and not queued.future.cancelled():
+                if priority < queued.priority:
+                    # Push again at the higher priority, the old entry becomes stale.
+                    queued.priority = priority
+                    self._enqueue(queued)
+                logger.debug(f"Coalesced command {hex(key[0])} with an identical queued command.")
+                return queued.future
+
+            queued = _QueuedCommand(command=command,
+                                    command_id=key[0],
+                                    payload=key[1],
+                                    resource=command.get_resource(),
+                                    priority=priority,
+                                    timeout=timeout,
+                                    sequence=sequence,
+                                    key=key,
+                                    streamed=command.is_streamed())
+            self._queued[key] = queued
+            self._enqueue(queued)
+
+        self._pump()
+        return queued.future
+
+    def pending_count(self) -> int:
+        """Returns the number of commands queued but not yet sent."""
+        with self._lock:
+            return len(self._queued)
+
+    def _enqueue(self, queued: _QueuedCommand):
+        """Adds a command to its resource queue. Must hold the lock."""
+        queued.dispatched = False
+        queued.entry = (queued.priority, queued.sequence, queued)
+        heapq.heappush(self._queues.setdefault(queued.resource, []), queued.entry)
+
+    def _next_sendable(self) -> Optional[_QueuedCommand]:
+        """
+        Removes and returns the best queued command that can be sent now,
+        across every resource with a free slot. Must hold the lock.
+        """
+        if not self._connected:
+            return None
+
+        best: Optional[Tuple[int, int, _QueuedCommand]] = None
+        for resource, queue in self._queues.items():
+            # Drop stale entries, superseded by a higher priority one or sent, and cancelled commands.
+            while queue and (queue[0][2].entry is not queue[0] or queue[0][2].future.cancelled()):
+                stale = heapq.heappop(queue)
+                if stale[2].entry is stale and stale[2].future.cancelled():
+                    self._queued.pop(stale[2].key, None)
+            if not queue:
+                continue
+            if self._in_flight.get(resource, 0) >= self._resource_limits.get(resource, DEFAULT_RESOURCE_LIMIT):
+                continue
+            if best is None or queue[0][:2] < best[:2]:
+                best = queue[0]
+
+        if best is None:
+            return None
+        queued = best[2]
+        if self._unacked_bytes and self._unacked_bytes + queued.packet_size > self._max_unacked_bytes:
+            return None
+
+        heapq.heappop(self._queues[queued.resource])
+        queued.dispatched = True
+        queued.entry = None
+        queued.acknowledged = False
+        if self._queued.get(queued.key) is queued:
+            del self._queued[queued.key]
+        self._in_flight[queued.resource] = self._in_flight.get(queued.resource, 0) + 1
+        self._unacked_bytes += queued.packet_size
+        return queued
+
+    def _pump(self):
+        """Sends queued commands until a limit is reached or the queues are empty."""
+        while True:
+            with self._lock:
+                queued = self._next_sendable()
+            if queued is None:
+                return
+
+            if queued.attempts == 0 and not queued.future.set_running_or_notify_cancel():
+                self._release(queued)
+                continue
+            queued.attempts += 1
+
+            try:
+                if queued.streamed:
+                    command_future = self._service.send_stream(queued.command_id, queued.payload, timeout=queued.timeout)
+                else:
+                    command_future = self._service.send_command(queued.command_id, queued.payload, timeout=queued.timeout,
+                                                                payload_checksum=queued.command.get_payload_checksum())
+            except Exception as e:
+                self._release(queued)
+                if isinstance(e, ArduinoConnectionError) and queued.replays and not self._service.is_connected():
+                    # Lost just now, the connection listener hasn't heard yet and will pump once reconnected.
+                    with self._lock:
+                        self._enqueue(queued)
+                    return
+                queued.future.set_exception(e)
+                continue
+
+            command_future.add_progress_callback(
+                    lambda _, response_id, payload, queued=queued: self._on_command_progress(queued, response_id, payload))
+            command_future.add_done_callback(
+                    lambda command_future, queued=queued: self._on_command_done(queued, command_future))
+
+    def _acknowledge(self, queued: _QueuedCommand):
+        """Stops counting a sent command's bytes as unacknowledged. Must hold the lock."""
+        if not queued.acknowledged:
+            queued.acknowledged = True
+            self._unacked_bytes -= queued.packet_size
+
+    def _release(self, queued: _QueuedCommand):
+        """Frees the resource slot, and any unacknowledged bytes, held by a sent command."""
+        with self._lock:
+            self._in_flight[queued.resource] -= 1
+            self._acknowledge(queued)
+
+    def _on_command_progress(self, queued: _QueuedCommand, response_id: int, payload: bytes):
+        """
+        Passes progress the command's spec lists on to the caller, parsed.
+        Once the Arduino has received a command, its bytes have left the
+        serial buffer.
+        """
+        if queued.command.expects_response(response_id):
+            try:
+                queued.future._notify_progress(response_id, queued.command.parse_response(response_id, payload))
+            except ArduinoProtocolError as e:
+                logger.error(f"Ignoring progress for command {hex(queued.command_id)}: {e}")
+        if response_id == arduino_protocol.R_NOTIFY_COMMAND_RECEIVED:
+            with self._lock:
+                self._acknowledge(queued)
+            self._pump()
+
+    def _on_command_done(self, queued: _QueuedCommand, command_future: CommandFuture):
+        """
+        Resolves the callers future with the final response, as the command's
+        spec parses it, or schedules a retry if the resource was busy.
+        """
+        self._release(queued)
+
+        error = command_future.exception()
+        result = None
+        if error is None or isinstance(error, ArduinoErrorResponse):
+            response_id, payload = ((arduino_protocol.R_NOTIFY_TASK_COMPLETE, command_future.result()) if error is None
+                                    else (error.response_id, error.payload))
+            try:
+                result = queued.command.parse_response(response_id, payload)
+                error = None
+            except Exception as e:
+                error = e
+
+        if isinstance(error, ArduinoResourceBusyError) and queued.attempts <= self._max_busy_retries:
+            delay = self._busy_retry_delay * (2 ** (queued.attempts - 1))
+            logger.info(f"Resource '{queued.resource}' busy, retrying command {hex(queued.command_id)} in {delay:.2f}s.")
+            timer = threading.Timer(delay, self._retry, args=(queued,))
+            timer.daemon = True
+            timer.start()
+        elif isinstance(error, ArduinoConnectionLostError) and queued.replays:
+            logger.info(f"Connection lost, command {hex(queued.command_id)} will be sent again once reconnected.")
+            self._retry(queued)
+            return
+        elif error is not None:
+            queued.future.set_exception(error)
+        else:
+            queued.future.set_result(result)
+
+        self._pump()
+
+    def _retry(self, queued: _QueuedCommand):
+        """Queues a command again, keeping its place ahead of commands submitted after it."""
+        with self._lock:
+            fails = not self._connected and not queued.replays
+            if not fails:
+                self._enqueue(queued)
+        if fails:
+            queued.future.set_exception(ArduinoConnectionLostError("Connection to the Arduino was lost."))
+            return
+        self._pump()
+
+    def _on_connection_change(self, connected: bool):
+        """
+        Sends what was waiting once connected. Once disconnected, fails the
+        queued commands that don't replay, in flight ones fail with their
+        CommandFuture.
+        """
+        failed: List[_QueuedCommand] = []
+        with self._lock:
+            self._connected = connected
+            if not connected:
+                for queue in self._queues.values():
+                    for entry in queue:
+                        queued = entry[2]
+                        if queued.entry is entry and not queued.replays:
+                            queued.entry = None  # Stale, dropped when it reaches the top.
+                            if self._queued.get(queued.key) is queued:
+                                del self._queued[queued.key]
+                            failed.append(queued)
+
+        for queued in failed:
+            if not queued.future.done():
+                queued.future.set_exception(ArduinoConnectionLostError("Connection to the Arduino was lost."))
+        if connected:
+            self._pump()
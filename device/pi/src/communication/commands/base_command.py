@@ -1,13 +1,198 @@
-from abc import ABC, abstractmethod
-from typing import Any
+import functools
+import logging
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Callable, ClassVar, Dict, Optional, Tuple, Type, Union
 
-class ArduinoCommand(ABC):
+from .. import arduino_protocol
+from ..arduino_service import ArduinoProtocolError, ArduinoResourceBusyError
+
+logger = logging.getLogger(__name__)
+
+# Command priorities for the CommandScheduler, lower values are sent first.
+PRIORITY_HIGH = 0  # e.g. dispensing food
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10  # e.g. buzzer sounds
+
+# What the CommandScheduler does with a command queued or in flight when the connection is lost.
+RECONNECT_FAIL = "fail"  # Fail it with ArduinoConnectionLostError, e.g. a sound that would be late
+RECONNECT_REPLAY = "replay"  # Send it again once reconnected, from the start
+
+@functools.lru_cache(maxsize=64)
+def _compile_struct(format: str) -> struct.Struct:
+    """Compiles a payload format, keeping the most recently used item counts' Structs."""
+    return struct.Struct(format)
+
+class PayloadLayout:
+    """
+    Describes a command payload as struct format characters, compiled once.
+
+    A payload is a fixed part, optionally followed by a count byte and that
+    many repeated items, e.g. a melody's tempo followed by its notes. With
+    an empty count format the item count is implied by the payload length.
+    """
+    def __init__(self, fixed: str = "", repeated: Optional[str] = None, count: str = "B"):
+        """
+        Args:
+            fixed (str): Format of the fixed fields, e.g. "HH". Always big-endian.
+            repeated (str, optional): Format of each repeated item, e.g. "H".
+            count (str): Format of the item count sent before the repeated items,
+                or "" to send no count.
+        """
+        self._fixed = fixed
+        self._repeated = repeated
+        self._count = count
+        self._fixed_struct = struct.Struct(">" + fixed)
+        self._header_struct = struct.Struct(">" + fixed + (count if repeated else ""))
+        self._item_size = struct.calcsize(">" + repeated) if repeated else 0
+
+    def _struct_for(self, item_count: int) -> struct.Struct:
+        """Returns the compiled Struct for a payload with item_count repeated items."""
+        repeated = self._repeated or ""
+        # A single format character takes a repeat count, keeping the format short for any item count.
+        items = f"{item_count}{repeated}" if len(repeated) == 1 else item_count * repeated
+        return _compile_struct(f">{self._fixed}{self._count}{items}")
+
+    def size(self, *values: Any) -> int:
+        """Returns the length of the payload the values would pack into."""
+        if self._repeated is None:
+            return self._fixed_struct.size
+        return self._header_struct.size + len(values[-1]) * self._item_size
+
+    def pack(self, *values: Any) -> bytes:
+        """
+        Packs the fixed fields, followed by a sequence of repeated items
+        if the layout has them.
+
+        Raises:
+            ValueError: If a value doesn't fit its field.
+        """
+        try:
+            if self._repeated is None:
+                return self._fixed_struct.pack(*values)
+            *fixed_values, items = values
+            if not self._count:
+                return self._struct_for(len(items)).pack(*fixed_values, *items)
+            return self._struct_for(len(items)).pack(*fixed_values, len(items), *items)
+        except struct.error as e:
+            raise ValueError(f"Invalid payload values: {e}") from e
+
+    def unpack(self, payload: bytes) -> Tuple[Any, ...]:
+        """
+        Unpacks a payload, repeated items are returned as a tuple in the last field.
+
+        Raises:
+            ValueError: If the payload doesn't match the layout.
+        """
+        try:
+            if self._repeated is None:
+                return self._fixed_struct.unpack(payload)
+            if not self._count:
+                item_count = (len(payload) - self._header_struct.size) // self._item_size
+                values = self._struct_for(item_count).unpack(payload)
+                fixed_count = len(values) - item_count
+                return (*values[:fixed_count], values[fixed_count:])
+            *fixed_values, item_count = self._header_struct.unpack_from(payload)
+            values = self._struct_for(item_count).unpack(payload)
+            return (*fixed_values, values[len(fixed_values) + 1:])
+        except struct.error as e:
+            raise ValueError(f"Payload doesn't match the layout: {e}") from e
+
+# What a response means: a function of its payload giving parse_response's
+# result, or the exception parse_response raises.
+ResponseHandler = Union[Callable[[bytes], Any], Type[Exception]]
+
+DEFAULT_RESPONSES: Dict[int, ResponseHandler] = {
+        arduino_protocol.R_NOTIFY_COMMAND_RECEIVED: lambda payload: False,
+        arduino_protocol.R_NOTIFY_TASK_COMPLETE: lambda payload: True,
+        arduino_protocol.R_ERROR_UNKNOWN_COMMAND: ArduinoProtocolError,
+        arduino_protocol.R_ERROR_INVALID_PAYLOAD: ArduinoProtocolError,
+        arduino_protocol.R_ERROR_RESOURCE_BUSY: ArduinoResourceBusyError,
+        arduino_protocol.R_ERROR_TASK_FAILED: ArduinoProtocolError
+        }
+
+@dataclass(frozen=True)
+class CommandSpec:
+    """
+    Everything that defines a command: its ID, payload layout and responses.
+
+    Commands with a stream_layout are sent as a stream when their payload
+    is too large for one packet, see ArduinoService.send_stream. The
+    reconnect_policy is RECONNECT_FAIL or RECONNECT_REPLAY. Only
+    idempotent commands should be coalescable, see is_coalescable.
+    """
+    command_id: int
+    name: str
+    layout: PayloadLayout = field(default_factory=PayloadLayout)
+    stream_layout: Optional[PayloadLayout] = None
+    resource: str = "default"
+    priority: int = PRIORITY_NORMAL
+    reconnect_policy: str = RECONNECT_FAIL
+    coalescable: bool = True
+    responses: Dict[int, ResponseHandler] = field(default_factory=lambda: dict(DEFAULT_RESPONSES))
+
+# Every registered command by ID, see register_command.
+COMMAND_SPECS: Dict[int, CommandSpec] = {}
+
+def register_command(spec: CommandSpec) -> CommandSpec:
+    """
+    Adds a command to COMMAND_SPECS.
+
+    Raises:
+        ValueError: If another command is registered with the same ID.
     """
-    Abstract base class for all commands that will be 
+    existing = COMMAND_SPECS.get(spec.command_id)
+    if existing is not None and existing is not spec:
+        raise ValueError(f"Command ID {hex(spec.command_id)} is already registered to {existing.name}.")
+    COMMAND_SPECS[spec.command_id] = spec
+    return spec
+
+# Commands of the protocol itself, rather than a device.
+_PROTOCOL_COMMAND_NAMES = {
+        arduino_protocol.CMD_HELLO: "Hello",
+        arduino_protocol.CMD_SET_BAUD: "SetBaud",
+        arduino_protocol.CMD_STREAM_BEGIN: "StreamBegin",
+        arduino_protocol.CMD_STREAM_CHUNK: "StreamChunk",
+        arduino_protocol.CMD_BATCH: "Batch",
+        }
+
+def get_command_name(command_id: int) -> str:
+    """Returns the name of a protocol or registered command, or its ID in hex."""
+    if command_id in _PROTOCOL_COMMAND_NAMES:
+        return _PROTOCOL_COMMAND_NAMES[command_id]
+    spec = COMMAND_SPECS.get(command_id)
+    return spec.name if spec is not None else hex(command_id)
+
+class ArduinoCommand:
+    """
+    Base class for all commands that will be
     sent from the Pi to the Arduino.
+
+    Subclasses set SPEC to a registered CommandSpec and pass their payload
+    values to __init__, in the order of the layout. Commands are immutable,
+    so the payload and its checksum are only encoded once.
     """
+    SPEC: ClassVar[CommandSpec]
+
+    def __init__(self, *values: Any):
+        """
+        Args:
+            values: Payload values, packed with the SPEC's layout.
+
+        Raises:
+            ValueError: If a value doesn't fit its field.
+        """
+        layout = self.SPEC.layout
+        self._streamed = (self.SPEC.stream_layout is not None
+                          and layout.size(*values) > arduino_protocol.MAX_PAYLOAD_SIZE)
+        if self._streamed:
+            layout = self.SPEC.stream_layout
+            if layout.size(*values) > arduino_protocol.MAX_STREAM_LENGTH:  # pyright: ignore[reportOptionalMemberAccess]
+                raise ValueError(f"{self.SPEC.name} payload exceeds MAX_STREAM_LENGTH "
+                                 f"({arduino_protocol.MAX_STREAM_LENGTH}).")
+        self._payload = layout.pack(*values)  # pyright: ignore[reportOptionalMemberAccess]
+        self._payload_checksum = arduino_protocol.calculate_checksum(self._payload)
 
-    @abstractmethod
     def get_command_id(self) -> int:
         """
         Returns the unique byte ID for this command as defined
@@ -18,26 +203,68 @@ class ArduinoCommand(ABC):
         Returns:
             int: The command ID (0-255)
         """
-        ...
+        return self.SPEC.command_id
 
-    @abstractmethod
     def get_payload(self) -> bytes:
         """
-        Encodes the command's paramaters into a binary payload.
+        Returns the command's paramaters encoded as a binary payload.
 
         Returns:
             bytes: The binary payload data. For no payload, b''.
         """
-        ...
+        return self._payload
 
-    @abstractmethod 
-    def parse_response(self, response_id: int, payload: bytes) -> Any:
+    def get_payload_checksum(self) -> int:
+        """Returns the XOR checksum of the payload."""
+        return self._payload_checksum
+
+    def is_streamed(self) -> bool:
+        """
+        Returns True if the payload is too large for one packet, and must be
+        sent with ArduinoService.send_stream. get_payload then returns the
+        stream payload, laid out by the SPEC's stream_layout.
+        """
+        return self._streamed
+
+    def get_resource(self) -> str:
         """
-        Parses the payload of a response packet receives from 
-        the Arduino that corresponds to this command.
+        Returns the name of the Arduino resource this command occupies,
+        e.g. "buzzer". The CommandScheduler limits how many commands
+        may be in flight for each resource.
+        """
+        return self.SPEC.resource
+
+    def get_priority(self) -> int:
+        """
+        Returns the priority of this command when queued, see PRIORITY_HIGH,
+        PRIORITY_NORMAL and PRIORITY_LOW.
+        """
+        return self.SPEC.priority
 
-        The implementation should check response_id and interpret
-        the payload bytes accordingly.
+    def get_reconnect_policy(self) -> str:
+        """
+        Returns what to do with this command if the connection is lost before
+        it completes, RECONNECT_FAIL or RECONNECT_REPLAY.
+        """
+        return self.SPEC.reconnect_policy
+
+    def is_coalescable(self) -> bool:
+        """
+        Returns True if sending this command twice has the same effect as
+        sending it once, so the CommandScheduler may merge it with an
+        identical command still queued. False for e.g. dispensing food.
+        """
+        return self.SPEC.coalescable
+
+    def expects_response(self, response_id: int) -> bool:
+        """Returns True if the SPEC's response table says what the response means."""
+        return response_id in self.SPEC.responses
+
+    def parse_response(self, response_id: int, payload: bytes) -> Any:
+        """
+        Parses the payload of a response packet receives from
+        the Arduino that corresponds to this command, using the
+        SPEC's response table.
 
         Args:
             response_id (int): The response ID received from the Arduino,
@@ -45,7 +272,28 @@ class ArduinoCommand(ABC):
             payload (bytes): The raw payload bytes receives in the response packet.
 
         Returns:
-            Any: A parsed representation of the response data.
+            Any: A parsed representation of the response data. By default,
+                False for R_NOTIFY_COMMAND_RECEIVED and True for R_NOTIFY_TASK_COMPLETE.
+
+        Raises:
+            ArduinoProtocolError: If the response is an error, unexpected,
+                or its payload is malformed.
+            ArduinoResourceBusyError: If the resource was busy.
         """
-        ...
+        handler = self.SPEC.responses.get(response_id)
+        if handler is None:
+            error_msg = f"Received unexpected response ID {hex(response_id)} for {self.SPEC.name}."
+            logger.error(error_msg)
+            raise ArduinoProtocolError(error_msg)
+
+        if isinstance(handler, type) and issubclass(handler, Exception):
+            # Left to the caller to log, e.g. the CommandScheduler retries busy commands.
+            raise handler(f"Arduino reported {arduino_protocol.get_response_message(response_id)} for {self.SPEC.name}.")
 
+        try:
+            return handler(payload)
+        except ValueError as e:
+            error_msg = (f"Malformed {arduino_protocol.get_response_message(response_id)} payload "
+                         f"for {self.SPEC.name}: {e}")
+            logger.error(error_msg)
+            raise ArduinoProtocolError(error_msg) from e
@@ -0,0 +1,75 @@
+import logging
+from typing import NamedTuple
+
+from .base_command import (DEFAULT_RESPONSES, PRIORITY_HIGH, RECONNECT_FAIL, ArduinoCommand, CommandSpec,
+                           PayloadLayout, register_command)
+from .. import arduino_protocol
+
+logger = logging.getLogger(__name__)
+
+# DispenserController::MAX_DISPENSE_GRAMS
+MAX_DISPENSE_GRAMS = 500
+# The firmware estimates about 50ms of motor time per gram, this leaves room for the link.
+DISPENSE_SECONDS_PER_GRAM = 0.1
+MIN_DISPENSE_TIMEOUT_SECONDS = 10.0
+
+class DispenseProgress(NamedTuple):
+    """The payload of R_NOTIFY_PROGRESS, and R_NOTIFY_TASK_COMPLETE, for a dispense."""
+    delivered_grams: int
+    target_grams: int
+
+# Grams delivered, grams requested
+DISPENSE_PROGRESS_LAYOUT = PayloadLayout("HH")
+
+def parse_dispense_progress(payload: bytes) -> DispenseProgress:
+    """
+    Parses the payload of a dispense's R_NOTIFY_PROGRESS or R_NOTIFY_TASK_COMPLETE.
+
+    Raises:
+        ValueError: If the payload doesn't match the layout.
+    """
+    return DispenseProgress(*DISPENSE_PROGRESS_LAYOUT.unpack(payload))
+
+class DispenseCommand(ArduinoCommand):
+    """
+    Represents the DISPENSE command, to run the dispenser motor until an
+    amount of food is delivered.
+
+    Payload: grams to dispense (uint16).
+    Returns once the motor starts. The Arduino reports the grams delivered
+    with R_NOTIFY_PROGRESS while it runs, and completes with the same
+    payload, both parsed into a DispenseProgress by parse_response.
+
+    Not replayed after a lost connection, as the food may already be out,
+    and never coalesced, as two identical dispenses are two feeds.
+    """
+    SPEC = register_command(CommandSpec(command_id=arduino_protocol.CMD_DISPENSE,
+                                        name="Dispense",
+                                        layout=PayloadLayout("H"),
+                                        resource="dispenser",
+                                        priority=PRIORITY_HIGH,
+                                        reconnect_policy=RECONNECT_FAIL,
+                                        coalescable=False,
+                                        responses={
+                                            **DEFAULT_RESPONSES,
+                                            arduino_protocol.R_NOTIFY_PROGRESS: parse_dispense_progress,
+                                            arduino_protocol.R_NOTIFY_TASK_COMPLETE: parse_dispense_progress
+                                            }))
+
+    def __init__(self, grams: int):
+        """
+        Args:
+            grams (int): Food to dispense, from 1 to MAX_DISPENSE_GRAMS.
+
+        Raises:
+            ValueError: If grams is out of range.
+        """
+        if not 0 < grams <= MAX_DISPENSE_GRAMS:
+            raise ValueError(f"Amount to dispense ({grams}g) must be between 1 and {MAX_DISPENSE_GRAMS}g.")
+
+        super().__init__(grams)
+        self._grams = grams
+
+    def get_timeout(self) -> float:
+        """Returns the seconds to allow for the dispense to complete once sent."""
+        return max(MIN_DISPENSE_TIMEOUT_SECONDS, self._grams * DISPENSE_SECONDS_PER_GRAM)
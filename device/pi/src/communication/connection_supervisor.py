@@ -0,0 +1,178 @@
+import glob
+import logging
+import os
+import random
+import threading
+from enum import Enum
+from typing import Callable, Optional
+
+from .arduino_service import ArduinoService
+
+logger = logging.getLogger(__name__)
+
+# Where udev links serial devices by their USB ID, a name that survives replugging.
+DEFAULT_PORT_PATTERN = "/dev/serial/by-id/*Arduino*"
+PORT_POLL_INTERVAL_SECONDS = 0.5
+INITIAL_RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 60.0
+
+class ConnectionState(Enum):
+    CONNECTING = "connecting"  # First connection, or waiting for the port to appear
+    CONNECTED = "connected"
+    RECONNECTING = "reconnecting"  # Lost, retrying with backoff
+    STOPPED = "stopped"
+
+class ConnectionSupervisor:
+    """
+    Keeps ArduinoService connected, from a background thread so the main
+    loop never waits on the port or the handshake.
+
+    Connects once started, and again whenever the connection is lost.
+    Failed attempts back off exponentially, each delay randomised between
+    half and all of it so several devices don't retry in step. The port is
+    polled while waiting: if it disappears, e.g. the cable is unplugged,
+    the next attempt waits for it to come back and then starts at once. If
+    the configured port doesn't exist, the first match for port_pattern is
+    used instead, as the Arduino may come back under another name.
+    """
+    def __init__(self,
+                 arduino_service: ArduinoService,
+                 on_state_change: Optional[Callable[[ConnectionState], None]] = None,
+                 port_pattern: str = DEFAULT_PORT_PATTERN,
+                 initial_delay: float = INITIAL_RECONNECT_DELAY_SECONDS,
+                 max_delay: float = MAX_RECONNECT_DELAY_SECONDS,
+                 poll_interval: float = PORT_POLL_INTERVAL_SECONDS):
+        """
+        Args:
+            arduino_service (ArduinoService): The service to keep connected.
+            on_state_change (Callable[[ConnectionState], None], optional): Called
+                with each new state, on the supervisor's thread or the thread
+                that noticed the connection was lost.
+            port_pattern (str): Glob for ports to try when the configured one is gone.
+                Defaults to the Arduino's udev link.
+            initial_delay (float): Seconds before retrying after the first failed attempt.
+            max_delay (float): Most seconds between attempts.
+            poll_interval (float): Seconds between checks for the port.
+        """
+        self._service = arduino_service
+        self._on_state_change = on_state_change
+        self._port_pattern = port_pattern
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._poll_interval = poll_interval
+
+        self._state = ConnectionState.STOPPED
+        self._state_lock = threading.Lock()
+        self._wake_event = threading.Event()  # Set when the connection is lost, or to stop
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rng = random.Random()
+
+        arduino_service.add_connection_listener(self._on_connection_change)
+
+    def start(self):
+        """Starts connecting in the background, returns immediately."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._set_state(ConnectionState.CONNECTING)
+        self._thread = threading.Thread(target=self._run, name="arduino-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops reconnecting, without closing the connection. Waits for an
+        attempt in progress, at most the handshake timeout.
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._set_state(ConnectionState.STOPPED)
+
+    def get_state(self) -> ConnectionState:
+        """Returns the current connection state."""
+        return self._state
+
+    def _set_state(self, state: ConnectionState):
+        with self._state_lock:
+            if state == self._state:
+                return
+            self._state = state
+        logger.info(f"Arduino connection {state.value}.")
+        if self._on_state_change is not None:
+            try:
+                self._on_state_change(state)
+            except Exception:
+                logger.exception("Error reporting the Arduino connection state.")
+
+    def _on_connection_change(self, connected: bool):
+        """ArduinoService connection listener."""
+        if self._stop_event.is_set() or self._thread is None:
+            return
+        if connected:
+            self._set_state(ConnectionState.CONNECTED)
+        else:
+            self._set_state(ConnectionState.RECONNECTING)
+            self._wake_event.set()
+
+    def _find_port(self) -> Optional[str]:
+        """Returns the port to connect to, or None if the Arduino isn't plugged in."""
+        if os.path.exists(self._service.port):
+            return self._service.port
+        matches = sorted(glob.glob(self._port_pattern))
+        return matches[0] if matches else None
+
+    def _backoff_delay(self, failed_attempts: int) -> float:
+        """Seconds to wait after failed_attempts failures in a row, with jitter."""
+        delay = min(self._max_delay, self._initial_delay * 2 ** (failed_attempts - 1))
+        return self._rng.uniform(delay / 2, delay)
+
+    def _wait_for_retry(self, delay: float):
+        """
+        Waits up to delay seconds, returning early if stopped, or if the port
+        disappears and comes back, as the Arduino was just plugged in again.
+        """
+        remaining = delay
+        unplugged = False
+        while remaining > 0 and not self._stop_event.is_set():
+            wait = min(self._poll_interval, remaining)
+            self._stop_event.wait(wait)
+            remaining -= wait
+            present = self._find_port() is not None
+            if unplugged and present:
+                logger.info("Arduino port reappeared, reconnecting.")
+                return
+            unplugged = unplugged or not present
+
+    def _run(self):
+        failed_attempts = 0
+        while not self._stop_event.is_set():
+            if self._service.is_connected():
+                failed_attempts = 0
+                self._wake_event.wait()
+                self._wake_event.clear()
+                continue
+
+            port = self._find_port()
+            if port is None:
+                self._stop_event.wait(self._poll_interval)  # Not plugged in.
+                continue
+            if port != self._service.port:
+                logger.info(f"Arduino port {self._service.port} is gone, trying {port}.")
+                self._service.set_port(port)
+
+            self._wake_event.clear()
+            if self._service.connect():
+                failed_attempts = 0
+                self._set_state(ConnectionState.CONNECTED)
+                continue
+
+            failed_attempts += 1
+            if self._state != ConnectionState.CONNECTING:
+                self._set_state(ConnectionState.RECONNECTING)
+            delay = self._backoff_delay(failed_attempts)
+            logger.warning(f"Arduino connection attempt {failed_attempts} failed, retrying in {delay:.1f}s.")
+            self._wait_for_retry(delay)
+        logger.debug("Arduino supervisor stopped.")
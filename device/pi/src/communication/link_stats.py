@@ -0,0 +1,120 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+# Counters
+BYTES_SENT = "bytes_sent"
+BYTES_RECEIVED = "bytes_received"
+PACKETS_SENT = "packets_sent"
+PACKETS_RECEIVED = "packets_received"
+CHECKSUM_ERRORS = "checksum_errors"
+INVALID_LENGTHS = "invalid_lengths"
+TIMEOUTS = "timeouts"
+BUSY_REJECTIONS = "busy_rejections"
+ERROR_RESPONSES = "error_responses"  # Other than busy
+UNMATCHED_RESPONSES = "unmatched_responses"  # No pending command, e.g. it timed out
+CONNECTION_LOSSES = "connection_losses"
+COUNTERS = (BYTES_SENT, BYTES_RECEIVED, PACKETS_SENT, PACKETS_RECEIVED, CHECKSUM_ERRORS, INVALID_LENGTHS,
+            TIMEOUTS, BUSY_REJECTIONS, ERROR_RESPONSES, UNMATCHED_RESPONSES, CONNECTION_LOSSES)
+
+# Latency stages, from sending a command to...
+STAGE_ACK = "ack"  # ...R_NOTIFY_COMMAND_RECEIVED
+STAGE_COMPLETE = "complete"  # ...the response that resolves it
+
+# Buckets of LatencyHistogram, bucket n holds latencies under 2^n microseconds.
+LATENCY_BUCKETS = 25  # The last also holds anything over ~16s
+
+class LatencyHistogram:
+    """
+    Counts latencies in power of two buckets of microseconds, so recording
+    is a bit_length and an increment, whatever the range of latencies.
+    Percentiles are the upper bound of their bucket, at most twice too high.
+    """
+    __slots__ = ("counts", "count", "total", "maximum")
+
+    def __init__(self):
+        self.counts = [0] * LATENCY_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float):
+        """Adds one latency, in seconds."""
+        bucket = int(seconds * 1_000_000).bit_length()
+        self.counts[bucket if bucket < LATENCY_BUCKETS else LATENCY_BUCKETS - 1] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Returns the latency, in seconds, that fraction of those recorded
+        were under, rounded up to a bucket boundary. 0 if none were recorded.
+        """
+        target = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= target:
+                return min((1 << bucket) / 1_000_000, self.maximum)
+        return 0.0
+
+class LinkStats:
+    """
+    Counters and per-command latency histograms for the serial link,
+    gathered between calls to collect. Thread safe, the reader, dispatch
+    and sending threads all record.
+    """
+    def __init__(self, name_command: Callable[[int], str] = hex):
+        """
+        Args:
+            name_command (Callable[[int], str]): Names a command ID in the
+                collected telemetry. Defaults to its ID in hex.
+        """
+        self._name_command = name_command
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._latencies: Dict[Tuple[int, str], LatencyHistogram] = {}
+        self._started = time.monotonic()
+
+    def count(self, counter: str, amount: int = 1):
+        """Adds amount to a counter, e.g. BYTES_SENT."""
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def record_latency(self, command_id: int, stage: str, seconds: float):
+        """Records how long a command took to reach a stage, STAGE_ACK or STAGE_COMPLETE."""
+        key = (command_id, stage)
+        with self._lock:
+            histogram = self._latencies.get(key)
+            if histogram is None:
+                histogram = self._latencies[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Returns everything recorded since the last call as flat telemetry,
+        and starts again. Counters are totals for the interval, plus byte
+        rates. Latencies are in milliseconds, per command and stage, e.g.
+        serial_SimpleBuzz_ack_p95_ms.
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            latencies, self._latencies = self._latencies, {}
+            started, self._started = self._started, time.monotonic()
+        interval = max(self._started - started, 1e-9)
+
+        # Every counter, zero or not, so dashboards show quiet intervals as zero rather than a gap.
+        telemetry: Dict[str, Any] = {f"serial_{name}": counters.get(name, 0) for name in COUNTERS}
+        telemetry["serial_interval_s"] = round(interval, 1)
+        telemetry["serial_bytes_sent_per_s"] = round(counters.get(BYTES_SENT, 0) / interval, 1)
+        telemetry["serial_bytes_received_per_s"] = round(counters.get(BYTES_RECEIVED, 0) / interval, 1)
+        for (command_id, stage), histogram in latencies.items():
+            prefix = f"serial_{self._name_command(command_id)}_{stage}"
+            telemetry[f"{prefix}_count"] = histogram.count
+            telemetry[f"{prefix}_mean_ms"] = round(histogram.total / histogram.count * 1000, 2)
+            telemetry[f"{prefix}_p50_ms"] = round(histogram.percentile(0.5) * 1000, 2)
+            telemetry[f"{prefix}_p95_ms"] = round(histogram.percentile(0.95) * 1000, 2)
+            telemetry[f"{prefix}_max_ms"] = round(histogram.maximum * 1000, 2)
+        return telemetry
@@ -0,0 +1,63 @@
+import threading
+from collections import deque
+from typing import Optional
+
+PACKET_ID_COUNT = 256
+
+class PacketIdAllocator:
+    """
+    Hands out packet IDs that aren't in use by a pending command.
+
+    Free IDs are kept in a FIFO free-list, so an ID that was just released
+    is the last to be reused, giving a late response to a timed out command
+    the longest time to arrive before its ID means something else. A
+    bytearray tracks which IDs are in use, to catch double releases.
+    Acquiring and releasing are O(1), acquiring blocks while all IDs are in use.
+    """
+    def __init__(self, id_count: int = PACKET_ID_COUNT):
+        """
+        Args:
+            id_count (int): Number of IDs available, 0 to id_count - 1.
+                Defaults to PACKET_ID_COUNT, every value of the PACKET_ID byte.
+        """
+        self._free = deque(range(id_count))
+        self._in_use = bytearray(id_count)
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Takes a free packet ID, waiting for one to be released if necessary.
+
+        Args:
+            timeout (float, optional): Most seconds to wait, None waits forever
+                and 0 doesn't wait at all.
+
+        Returns:
+            Optional[int]: The packet ID, or None if none was freed in time.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._free, timeout):
+                return None
+            packet_id = self._free.popleft()
+            self._in_use[packet_id] = 1
+            return packet_id
+
+    def release(self, packet_id: int):
+        """
+        Returns a packet ID to the free-list. Releasing an ID that isn't
+        in use does nothing.
+
+        Args:
+            packet_id (int): ID from acquire.
+        """
+        with self._condition:
+            if not self._in_use[packet_id]:
+                return
+            self._in_use[packet_id] = 0
+            self._free.append(packet_id)
+            self._condition.notify()
+
+    def in_use_count(self) -> int:
+        """Returns the number of IDs currently in use."""
+        with self._condition:
+            return len(self._in_use) - len(self._free)
@@ -0,0 +1,203 @@
+"""
+Always-on record of the bytes passing over the serial link, for diagnosing
+problems after the fact without DEBUG logging.
+
+Decode a dump into a timeline of commands and responses with:
+python3 -m communication.protocol_tracer trace.bin
+run from the src folder.
+"""
+import logging
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from . import arduino_protocol
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_RECORDS = 4096  # About 300KiB, minutes of typical traffic
+
+# Record kinds
+TRACE_RECEIVED = 0  # Bytes as read from the port, garbage included
+TRACE_SENT = 1  # A packet as written to the port
+TRACE_EVENT = 2  # A short note, e.g. the connection was lost
+TRACE_CONTINUED = 0x80  # Flag, the record continues the data of the one before
+
+# Each record is a fixed size slot: monotonic time (ns), kind, data length, then the data.
+TRACE_RECORD_HEADER = struct.Struct("<QBB")
+TRACE_RECORD_DATA_SIZE = arduino_protocol.MAX_BUFFER_SIZE
+TRACE_RECORD_SIZE = TRACE_RECORD_HEADER.size + TRACE_RECORD_DATA_SIZE
+
+# Dump file: magic, format version, record size, wall clock and monotonic time (ns) at the dump, record count.
+TRACE_FILE_MAGIC = b"KBTRACE"
+TRACE_FILE_VERSION = 1
+TRACE_FILE_HEADER = struct.Struct("<7sBHQQI")
+
+class TraceRecord(NamedTuple):
+    """One record read back from a dump, data from continued records joined."""
+    time_ns: int  # Wall clock
+    kind: int
+    data: bytes
+
+class ProtocolTracer:
+    """
+    Keeps the most recent bytes sent and received in a preallocated ring
+    of fixed size records, so recording is a struct pack and a copy, with
+    no formatting and no allocation. dump writes them out in order.
+
+    Thread safe, the reader and writers record from their own threads.
+    """
+    def __init__(self, record_count: int = DEFAULT_TRACE_RECORDS):
+        """
+        Args:
+            record_count (int): Records kept, older ones are overwritten.
+                Received reads longer than TRACE_RECORD_DATA_SIZE take several.
+        """
+        self._record_count = record_count
+        self._buffer = bytearray(record_count * TRACE_RECORD_SIZE)
+        self._written = 0  # Records ever written, the next goes at _written % record_count
+        self._lock = threading.Lock()
+
+    def record_sent(self, packet: bytes):
+        """Records a packet written to the port."""
+        self._record(TRACE_SENT, packet)
+
+    def record_received(self, data: bytes):
+        """Records bytes read from the port."""
+        self._record(TRACE_RECEIVED, data)
+
+    def record_event(self, message: str):
+        """Records a short note in the timeline, cut to TRACE_RECORD_DATA_SIZE bytes."""
+        self._record(TRACE_EVENT, message.encode("utf-8", "replace")[:TRACE_RECORD_DATA_SIZE])
+
+    def _record(self, kind: int, data: bytes):
+        now = time.monotonic_ns()
+        buffer = self._buffer
+        length = len(data)
+        with self._lock:
+            if length <= TRACE_RECORD_DATA_SIZE:
+                start = self._written % self._record_count * TRACE_RECORD_SIZE
+                self._written += 1
+                TRACE_RECORD_HEADER.pack_into(buffer, start, now, kind, length)
+                start += TRACE_RECORD_HEADER.size
+                buffer[start:start + length] = data
+                return
+
+            # Longer data is split across records, each after the first flagged as continued.
+            with memoryview(data) as view:
+                for offset in range(0, length, TRACE_RECORD_DATA_SIZE):
+                    chunk = view[offset:offset + TRACE_RECORD_DATA_SIZE]
+                    start = self._written % self._record_count * TRACE_RECORD_SIZE
+                    self._written += 1
+                    TRACE_RECORD_HEADER.pack_into(buffer, start, now, kind | (TRACE_CONTINUED if offset else 0), len(chunk))
+                    start += TRACE_RECORD_HEADER.size
+                    buffer[start:start + len(chunk)] = chunk
+
+    def dump(self, path: str) -> int:
+        """
+        Writes the records, oldest first, to a binary file for decode.
+
+        Takes the same lock as recording, so don't call it from a signal
+        handler: it could interrupt a send on the same thread and deadlock.
+
+        Args:
+            path (str): File to write.
+
+        Returns:
+            int: Number of records written.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+        with self._lock:
+            written = self._written
+            snapshot = bytes(self._buffer)
+            wall_ns, monotonic_ns = time.time_ns(), time.monotonic_ns()
+
+        count = min(written, self._record_count)
+        first = (written - count) % self._record_count * TRACE_RECORD_SIZE
+        with open(path, "wb") as file:
+            file.write(TRACE_FILE_HEADER.pack(TRACE_FILE_MAGIC, TRACE_FILE_VERSION, TRACE_RECORD_SIZE,
+                                              wall_ns, monotonic_ns, count))
+            # The ring wraps, so the oldest records are from first to the end.
+            if count == self._record_count:
+                file.write(snapshot[first:])
+                file.write(snapshot[:first])
+            else:
+                file.write(snapshot[:count * TRACE_RECORD_SIZE])
+        logger.info(f"Dumped {count} serial trace records to {path}.")
+        return count
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    """
+    Reads the records of a dump, joining continued records and converting
+    times to the wall clock.
+
+    Raises:
+        ValueError: If the file isn't a trace dump this version can read.
+    """
+    with open(path, "rb") as file:
+        header = file.read(TRACE_FILE_HEADER.size)
+        if len(header) < TRACE_FILE_HEADER.size:
+            raise ValueError(f"{path} is too short to be a trace.")
+        magic, version, record_size, wall_ns, monotonic_ns, count = TRACE_FILE_HEADER.unpack(header)
+        if magic != TRACE_FILE_MAGIC or version != TRACE_FILE_VERSION:
+            raise ValueError(f"{path} isn't a version {TRACE_FILE_VERSION} serial trace.")
+        body = file.read(count * record_size)
+
+    offset_ns = wall_ns - monotonic_ns
+    pending: Optional[TraceRecord] = None
+    for start in range(0, len(body) - record_size + 1, record_size):
+        time_ns, kind, length = TRACE_RECORD_HEADER.unpack_from(body, start)
+        data_start = start + TRACE_RECORD_HEADER.size
+        data = body[data_start:data_start + length]
+        if kind & TRACE_CONTINUED:
+            if pending is not None and pending.kind == kind & ~TRACE_CONTINUED:
+                pending = pending._replace(data=pending.data + data)
+            continue  # Its start was overwritten, otherwise.
+        if pending is not None:
+            yield pending
+        pending = TraceRecord(time_ns + offset_ns, kind, data)
+    if pending is not None:
+        yield pending
+
+def decode_timeline(records: Iterator[TraceRecord]) -> Iterator[str]:
+    """
+    Turns trace records into timeline lines: each command sent, and each
+    response with the time since its command was sent. Received bytes are
+    parsed as the service would, garbage and bad checksums are noted.
+    """
+    from .commands.base_command import get_command_name  # Imports the service, which imports this.
+    scanner = arduino_protocol.FrameScanner()
+    sent_at: Dict[int, Tuple[int, str]] = {}  # packet ID -> (time, command name)
+
+    def timestamp(time_ns: int) -> str:
+        seconds, nanoseconds = divmod(time_ns, 1_000_000_000)
+        return time.strftime("%H:%M:%S", time.localtime(seconds)) + f".{nanoseconds // 1000:06d}"
+
+    for record in records:
+        if record.kind == TRACE_EVENT:
+            yield f"{timestamp(record.time_ns)}    -- {record.data.decode('utf-8', 'replace')}"
+        elif record.kind == TRACE_SENT:
+            packet_id, command_id = record.data[1], record.data[2]
+            name = get_command_name(command_id)
+            sent_at[packet_id] = (record.time_ns, name)
+            yield f"{timestamp(record.time_ns)} -> #{packet_id:<3} {name:<16} {record.data[4:-1].hex()}"
+        elif record.kind == TRACE_RECEIVED:
+            for packet in scanner.feed(record.data):
+                sent = sent_at.get(packet.packet_id)
+                since = f"+{(record.time_ns - sent[0]) / 1e6:.2f}ms after {sent[1]}" if sent else "no command"
+                yield (f"{timestamp(record.time_ns)} <- #{packet.packet_id:<3} "
+                       f"{arduino_protocol.get_response_message(packet.response_id):<16} "
+                       f"{bytes(packet.payload).hex():<12} {since}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        raise SystemExit(__doc__)
+    # Checksum failures and garbage in the trace are logged as the scanner finds them.
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    from .commands import buzzer_commands, dispenser_commands  # noqa: F401, registers the command names
+    for line in decode_timeline(read_trace(sys.argv[1])):
+        print(line)
@@ -0,0 +1,162 @@
+import logging
+import struct
+import threading
+import time
+from typing import Callable, List, Optional
+
+from . import arduino_protocol
+from .command_future import CommandFuture
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_WINDOW = 4
+# Seconds without an acknowledgement before unacknowledged chunks are sent again.
+DEFAULT_RETRANSMIT_TIMEOUT_SECONDS = 0.25
+# Seconds to wait for the Arduino to report free buffer space before probing it with
+# a chunk, in case its window update was lost. Must stay below the firmware's
+# STALL_TIMEOUT_MS, after which it gives up on the stream.
+BUFFER_PROBE_INTERVAL_SECONDS = 1.0
+
+class StreamTransfer:
+    """
+    Sends the chunks of a stream started with CMD_STREAM_BEGIN.
+
+    Uses go-back-N: up to `window` chunks are sent ahead of the last
+    R_NOTIFY_CHUNK_ACK, and only while they fit in the buffer space that
+    acknowledgement reported free. The Arduino drops chunks that arrive out
+    of order, so if no acknowledgement arrives in time every chunk from the
+    first unacknowledged one is sent again, resuming after the one that was lost.
+
+    Chunks are written from a thread of its own, the stream's CommandFuture
+    resolves when the Arduino completes the command, as for any other.
+    """
+    def __init__(self,
+                 data: bytes,
+                 window: int = DEFAULT_STREAM_WINDOW,
+                 retransmit_timeout: float = DEFAULT_RETRANSMIT_TIMEOUT_SECONDS,
+                 callback: Optional[Callable[[int, int, bytes], None]] = None):
+        """
+        Args:
+            data (bytes): The payload to stream, up to MAX_STREAM_LENGTH bytes.
+            window (int): Most chunks sent but not yet acknowledged, at most 128
+                so sequence numbers stay unambiguous.
+            retransmit_timeout (float): Seconds to wait for an acknowledgement.
+            callback (Callable[int, int, bytes], optional): Also called with
+                every response, like the callback for send_command.
+
+        Raises:
+            ValueError: If the window is out of range.
+        """
+        if not 1 <= window <= 128:
+            raise ValueError(f"Window ({window}) must be between 1 and 128 chunks.")
+
+        self._chunks: List[bytes] = [data[i:i + arduino_protocol.MAX_CHUNK_DATA_SIZE]
+                                     for i in range(0, len(data), arduino_protocol.MAX_CHUNK_DATA_SIZE)]
+        self._window = window
+        self._retransmit_timeout = retransmit_timeout
+        self._callback = callback
+        self._condition = threading.Condition()
+        self._base = 0  # First unacknowledged chunk
+        self._next = 0  # Next chunk to send
+        self._free_bytes = 0  # Free buffer space reported by the last acknowledgement
+        self._started = False
+        self._last_progress = time.monotonic()
+        self._future: Optional[CommandFuture] = None
+        self.retransmissions = 0
+
+    def on_response(self, packet_id: int, response_id: int, payload: bytes):
+        """Response callback for the CMD_STREAM_BEGIN command, called on the dispatch thread."""
+        if response_id == arduino_protocol.R_NOTIFY_CHUNK_ACK:
+            self._handle_ack(payload)
+        if self._callback is not None:
+            self._callback(packet_id, response_id, payload)
+
+    def start(self, write_chunk: Callable[[bytes], None], future: CommandFuture):
+        """
+        Starts sending chunks once the Arduino acknowledges the stream.
+
+        Args:
+            write_chunk (Callable[bytes]): Writes a CMD_STREAM_CHUNK payload
+                with the stream's packet ID.
+            future (CommandFuture): Future of the CMD_STREAM_BEGIN command,
+                sending stops once it's done.
+        """
+        self._future = future
+        future.add_done_callback(lambda _: self._wake())
+        threading.Thread(target=self._run, args=(write_chunk,),
+                         name=f"arduino-stream-{future.packet_id}", daemon=True).start()
+
+    def _wake(self):
+        with self._condition:
+            self._condition.notify()
+
+    def _handle_ack(self, payload: bytes):
+        try:
+            next_sequence, free_bytes = arduino_protocol.CHUNK_ACK_PAYLOAD.unpack_from(payload)
+        except struct.error:
+            logger.error(f"Malformed chunk acknowledgement: {payload.hex()}")
+            return
+
+        with self._condition:
+            acknowledged = self._base + ((next_sequence - self._base) & 0xFF)
+            if acknowledged > len(self._chunks):
+                return  # Refers to chunks that don't exist, can't be for this stream.
+            if acknowledged > self._base or not self._started:
+                self._last_progress = time.monotonic()
+            self._base = acknowledged
+            self._next = max(self._next, acknowledged)
+            self._free_bytes = free_bytes
+            self._started = True
+            self._condition.notify()
+
+    def _in_flight_bytes(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks[self._base:self._next])
+
+    def _next_chunk(self) -> Optional[bytes]:
+        """
+        Waits until a chunk may be sent and returns its payload, or None once
+        every chunk is acknowledged or the command is over.
+        """
+        future = self._future
+        with self._condition:
+            while True:
+                if future.done() or self._base >= len(self._chunks):  # pyright: ignore[reportOptionalMemberAccess]
+                    return None
+
+                if self._started and self._next < len(self._chunks):
+                    chunk = self._chunks[self._next]
+                    fits = self._in_flight_bytes() + len(chunk) <= self._free_bytes
+                    if self._next - self._base < self._window and fits:
+                        break
+
+                waiting_for_space = self._started and self._next == self._base
+                timeout = BUFFER_PROBE_INTERVAL_SECONDS if waiting_for_space else self._retransmit_timeout
+                remaining = self._last_progress + timeout - time.monotonic()
+                if remaining <= 0:
+                    # Go back to the first unacknowledged chunk. Before the stream is
+                    # acknowledged this probes whether the Arduino has it open at all.
+                    if self._next != self._base:
+                        self.retransmissions += 1
+                        logger.debug(f"No acknowledgement for chunk {self._base}, resending from there.")
+                    self._next = self._base
+                    self._last_progress = time.monotonic()
+                    break
+                self._condition.wait(remaining)
+
+            if self._next == self._base:
+                self._last_progress = time.monotonic()  # Time the acknowledgement from the first chunk in flight.
+            sequence = self._next
+            self._next += 1
+        return arduino_protocol.CHUNK_HEADER.pack(sequence & 0xFF) + self._chunks[sequence]
+
+    def _run(self, write_chunk: Callable[[bytes], None]):
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return
+            try:
+                write_chunk(chunk)
+            except Exception:
+                # The connection is gone, which fails the stream's future.
+                logger.exception("Failed to write a stream chunk.")
+                return
@@ -1,7 +1,10 @@
 from datetime import time
+import logging
 from typing import List
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+logger = logging.getLogger(__name__)
 
 class Slot(BaseModel):
     """
@@ -12,6 +15,14 @@ class Slot(BaseModel):
     time_of_day: time = Field(..., description="Time of day for this feed.")
     amount: int = Field(..., ge=1, description="Amount of food to dispense at this time.")
 
+    @field_validator("time_of_day")
+    @classmethod
+    def validate_time_of_day(cls, value: time) -> time:
+        """Feeds run at local time, so times with a UTC offset are rejected, as by the backend."""
+        if value.tzinfo is not None:
+            raise ValueError("Time of day must not have a UTC offset, feeds run at local time.")
+        return value
+
 class ScheduleConfig(BaseModel):
     """
     Represents the overall schedule configuration, containing
@@ -20,3 +31,30 @@ class ScheduleConfig(BaseModel):
     slots: List[Slot] = Field(default_factory=list, description="List of scheduled feeding\
                                                         time slots.")
 
+
+    @field_validator("slots")
+    @classmethod
+    def normalize_slots(cls, slots: List[Slot]) -> List[Slot]:
+        """
+        Sorts the slots by day and time and merges identical slots that would
+        fire in the same minute, so no feed is scheduled twice.
+
+        Slots on the same day and minute with different amounts are rejected,
+        the same rule as the backend's normalize_slots, so a schedule the
+        backend would refuse is never half applied here.
+
+        Raises:
+            ValueError: If two slots share a day and minute but not an amount.
+        """
+        for slot in slots:
+            slot.time_of_day = slot.time_of_day.replace(second=0, microsecond=0)
+        ordered = sorted(slots, key=lambda slot: (slot.day_of_week, slot.time_of_day))
+        normalized: List[Slot] = []
+        for slot in ordered:
+            if normalized and (normalized[-1].day_of_week, normalized[-1].time_of_day) == (slot.day_of_week, slot.time_of_day):
+                if normalized[-1].amount != slot.amount:
+                    raise ValueError(f"Conflicting amounts for day {slot.day_of_week} at "
+                                     f"{slot.time_of_day.strftime('%H:%M')}.")
+                continue  # Exact duplicate
+            normalized.append(slot)
+        return normalized
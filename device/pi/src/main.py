@@ -1,9 +1,13 @@
 import logging
+import signal
+import threading
 import time
 
 from config.config_handler import ConfigHandler 
 from config.models.schedule_config import ScheduleConfig
 from communication.arduino_service import ArduinoService
+from communication.command_scheduler import CommandScheduler
+from communication.connection_supervisor import ConnectionSupervisor
 from services.service_coordinator import ServiceCoordinator
 from services.mqtt_service import MqttService
 from services.scheduler_service import SchedulerService
@@ -15,6 +19,14 @@ logger = logging.getLogger(__name__)
 
 #-- Configuration
 SCHEDULE_CONFIG_PATH = "config/schedule.json"
+# How often the main loop runs while detection is active, and otherwise.
+# Arduino responses and command timeouts are handled by ArduinoService's own thread.
+ACTIVE_LOOP_INTERVAL_SECONDS = 0.01
+IDLE_LOOP_INTERVAL_SECONDS = 0.5
+# Where `kill -USR1 <pid>` dumps the serial trace, see communication/protocol_tracer.py.
+SERIAL_TRACE_DUMP_PATH = "/tmp/arduino-trace-{timestamp}.bin"
+# How often the serial link's counters and command latencies are published, see communication/link_stats.py.
+LINK_TELEMETRY_INTERVAL_SECONDS = 60
 #--
 
 class App:
@@ -37,6 +49,13 @@ class App:
         self._service_coordinator = ServiceCoordinator()
 
         self._arduino_service = ArduinoService("/dev/ttyACM0", 9600)
+        # All commands for the Arduino should be submitted through the scheduler.
+        self._command_scheduler = CommandScheduler(self._arduino_service)
+        # Connects in the background, and reconnects if the Arduino is unplugged.
+        self._connection_supervisor = ConnectionSupervisor(
+                self._arduino_service,
+                on_state_change=self._service_coordinator.report_arduino_connection_state
+                )
 
         self._mqtt_service = MqttService(
                 host="192.168.0.17",
@@ -53,30 +72,44 @@ class App:
 
         self._detection_service = CatDetectionService()
 
-        self._service_coordinator.set_services(self._mqtt_service, self._scheduler_service)
+        # Set by the SIGUSR1 handler, the dump itself happens in the main loop.
+        self._serial_trace_requested = threading.Event()
+
+        self._service_coordinator.set_services(self._mqtt_service, self._scheduler_service, self._command_scheduler)
         logger.info("Application services initialized.")
 
     def run(self):
         """
         Runs the main application loop.
         """
-        self._arduino_service.connect()
+        signal.signal(signal.SIGUSR1, self._request_serial_trace)
+        self._connection_supervisor.start()
         self._mqtt_service.connect()
+        next_link_telemetry = time.monotonic() + LINK_TELEMETRY_INTERVAL_SECONDS
 
         try:
             while True:
-                # -- Process the data regarding the Arduino
-                self._arduino_service.process_incoming_data()
-                self._arduino_service.cleanup_pending_commands(60)  # TODO: Assign a timeout for commands individually
-                
                 # -- Run pending scheduled tasks
                 self._scheduler_service.run_pending()
 
+                # -- Publish the serial link's telemetry for the last interval
+                if time.monotonic() >= next_link_telemetry:
+                    next_link_telemetry += LINK_TELEMETRY_INTERVAL_SECONDS
+                    self._service_coordinator.publish_telemetry(self._arduino_service.get_link_telemetry())
+
+                # -- Dump the serial trace, if asked for with SIGUSR1
+                if self._serial_trace_requested.is_set():
+                    self._serial_trace_requested.clear()
+                    self._dump_serial_trace()
+
                 # -- Process frames for the detection service, if it's running 
                 # Will automatically handle the case where it is not running.
                 self._detection_service.capture_and_process_frame()
 
-                time.sleep(0.01)
+                if self._detection_service.is_running():
+                    time.sleep(ACTIVE_LOOP_INTERVAL_SECONDS)
+                else:
+                    time.sleep(IDLE_LOOP_INTERVAL_SECONDS)
 
         except KeyboardInterrupt:
             logger.info("KeyboardInterrupt received, shutting down.")
@@ -86,6 +119,23 @@ class App:
         finally:
             self.shutdown()
 
+    def _request_serial_trace(self, signum, frame):
+        """
+        SIGUSR1 handler, asks the main loop to dump the serial trace.
+
+        Signal handlers run on the main thread between bytecodes, possibly
+        while it holds the tracer's lock mid send, so this must not take it.
+        """
+        self._serial_trace_requested.set()
+
+    def _dump_serial_trace(self):
+        """Writes the recent serial traffic to a file for offline decoding."""
+        path = SERIAL_TRACE_DUMP_PATH.format(timestamp=time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            self._arduino_service.get_tracer().dump(path)
+        except OSError as e:
+            logger.error(f"Could not dump the serial trace to {path}: {e}")
+
     def shutdown(self):
         """
         Shuts down the application, cleaning up services.
@@ -95,6 +145,8 @@ class App:
             self._detection_service.stop()
         if self._mqtt_service is not None:
             self._mqtt_service.disconnect()
+        if self._connection_supervisor is not None:
+            self._connection_supervisor.stop()
         if self._arduino_service is not None:
             self._arduino_service.disconnect()
         logger.info("Application shutdown complete.")
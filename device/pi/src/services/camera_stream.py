@@ -0,0 +1,144 @@
+import logging
+import threading
+from typing import Iterator, Optional, Tuple
+
+import picamera
+
+from .frame_pool import FramePool, PooledFrame
+
+logger = logging.getLogger(__name__)
+
+# How long the capture thread waits before trying again when every frame is in use.
+FRAME_POOL_RETRY_SECONDS = 0.01
+
+class FrameMailbox:
+    """
+    Holds only the latest frame. Posting replaces, and releases, a frame
+    that wasn't taken, so the consumer always gets the newest frame and
+    never waits for one.
+    """
+    def __init__(self):
+        self._frame: Optional[PooledFrame] = None
+        self._lock = threading.Lock()
+        self.posted = 0
+        self.dropped = 0  # Replaced before they were taken
+
+    def post(self, frame: PooledFrame):
+        """Hands a frame to the mailbox, releasing the one it replaces."""
+        with self._lock:
+            replaced, self._frame = self._frame, frame
+            self.posted += 1
+            if replaced is not None:
+                self.dropped += 1
+        if replaced is not None:
+            replaced.release()
+
+    def take(self) -> Optional[PooledFrame]:
+        """Returns the latest frame, now owned by the caller, or None if there's no new one."""
+        with self._lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def clear(self):
+        """Releases a frame that wasn't taken."""
+        frame = self.take()
+        if frame is not None:
+            frame.release()
+
+class CameraStream:
+    """
+    Captures frames from the camera's video port continuously, on its own
+    thread, into frames from a FramePool, and posts each one to a
+    FrameMailbox. The video port keeps running between frames, so frames
+    arrive at the camera's frame rate however long the consumer takes.
+
+    With resize, the GPU scales frames down before they're copied out, and
+    other splitter ports can capture at the camera's full resolution.
+    """
+    def __init__(self,
+                 camera: picamera.PiCamera,
+                 frame_pool: FramePool,
+                 mailbox: FrameMailbox,
+                 format: str = "bgr",
+                 resize: Optional[Tuple[int, int]] = None,
+                 splitter_port: int = 0):
+        """
+        Args:
+            camera (picamera.PiCamera): An open camera.
+            frame_pool (FramePool): Frames to capture into, their shape must match
+                resize, or the camera's resolution without it.
+            mailbox (FrameMailbox): Where each captured frame is posted.
+            format (str): Channel order of the frames, "bgr" or "rgb".
+            resize (Tuple[int, int], optional): (width, height) to scale frames to.
+            splitter_port (int): Video port splitter output to capture from, 0-3.
+        """
+        self._camera = camera
+        self._frame_pool = frame_pool
+        self._mailbox = mailbox
+        self._format = format
+        self._resize = resize
+        self._splitter_port = splitter_port
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.captured = 0
+
+    def start(self):
+        """Starts capturing in the background."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._capture_loop, name="camera-stream", daemon=True)
+            self._thread.start()
+            logger.info("Camera stream started.")
+
+    def stop(self):
+        """Stops capturing, waiting for the frame in progress. Close the camera afterwards."""
+        if self._thread is not None and self._thread.is_alive():
+            self._stop_event.set()
+            self._thread.join()
+            logger.info(f"Camera stream stopped after {self.captured} frames.")
+        self._thread = None
+
+    def is_running(self) -> bool:
+        """Returns True while frames are being captured."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _acquire_frame(self) -> Optional[PooledFrame]:
+        """Waits for a free frame, returns None if stopped first."""
+        while not self._stop_event.is_set():
+            frame = self._frame_pool.acquire()
+            if frame is not None:
+                return frame
+            self._stop_event.wait(FRAME_POOL_RETRY_SECONDS)
+        return None
+
+    def _outputs(self) -> Iterator[object]:
+        """
+        Yields the array to capture each frame into. capture_sequence asks
+        for the next one once the last is filled, so that's when it's posted.
+        """
+        frame: Optional[PooledFrame] = None
+        try:
+            while True:
+                if frame is not None:
+                    self._mailbox.post(frame)
+                    self.captured += 1
+                    frame = None
+                frame = self._acquire_frame()
+                if frame is None:
+                    return
+                yield frame.array
+        finally:
+            # Stopped, or the capture failed, with a frame that may only be partly written.
+            if frame is not None:
+                frame.release()
+
+    def _capture_loop(self):
+        """The main loop for the thread."""
+        outputs = self._outputs()
+        try:
+            self._camera.capture_sequence(outputs, format=self._format, use_video_port=True, # pyright: ignore
+                                          resize=self._resize, splitter_port=self._splitter_port)
+        except Exception:
+            logger.exception("Camera stream failed.")
+        finally:
+            outputs.close()
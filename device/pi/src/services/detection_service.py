@@ -1,15 +1,20 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 import logging
 import os
 import threading
 import time
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy
 import cv2  # pyright: ignore
 import picamera
 from queue import Queue, Empty
 
+from .camera_stream import CameraStream, FrameMailbox
+from .frame_pool import FramePool, PooledFrame
+from .motion_detector import MotionDetector
+
 logger = logging.getLogger(__name__)
 
 # -- Confguration, TODO: Move to a cfg file
@@ -17,18 +22,40 @@ DEFAULT_CLASS_FILE_PATH = "/home/pi/Desktop/Object_Detection_Files/coco.names"
 DEFAULT_CONFIG_PATH = "/home/pi/Desktop/Object_Detection_Files/ssd_mobilenet_v3_large_coco_2020_01_14.pbtxt"
 DEFAULT_WEIGHTS_PATH = "/home/pi/Desktop/Object_Detection_Files/frozen_inference_graph.pb"
 CONFIDENCE_THRESHOLD = 0.45
-NMS_THRESHOLD = 0.2
 TARGET_OBJECT = 'cat'
+# The model's input: size (width, height), and each channel of RGB scaled as (value - mean) * scale.
+MODEL_INPUT_SIZE = (320, 320)
+MODEL_INPUT_MEAN = 127.5
+MODEL_INPUT_SCALE = 1.0 / 127.5
+# Frames only go to the model while there's motion, and for this long after.
+MOTION_HOLD_SECONDS = 10.0
+PIR_SENSOR_PIN: Optional[int] = None  # BCM pin of the PIR sensor, None without one
 # --
-CAMERA_WIDTH = 640
+CAMERA_WIDTH = 640  # Full resolution, for snapshots
 CAMERA_HEIGHT = 480
 CAMERA_FPS = 10
+# Frames for detection are resized by the GPU to the model's input size, in RGB,
+# on their own splitter port. Snapshots are captured at full resolution on another.
+INFERENCE_SPLITTER_PORT = 1
+SNAPSHOT_SPLITTER_PORT = 2
+SNAPSHOT_DIR = "/home/pi/Desktop/SavedFrames/"
+# One frame being captured, one in the mailbox, one queued for and one in
+# the AI worker, one queued as a result, and one spare.
+FRAME_POOL_SIZE = 6
 
 class AIWorker:
     """
     Worker class for performing AI inference in a seperate thread.
     Processes frames from an input queue, and puts detection results
     into an output queue.
+
+    Frames are PooledFrames: the worker owns each frame put to it, and
+    hands it on with its result. Frames dropped from either queue, as
+    newer ones replace them, are released.
+
+    Frames are expected in RGB at MODEL_INPUT_SIZE, so preparing the input
+    is one pass into a preallocated blob, with no resize or channel swap.
+    Other sizes are resized by blobFromImage first.
     """
     def __init__(self, 
                  class_names: List[str],
@@ -39,7 +66,9 @@ class AIWorker:
         self._weights_path = weights_path
         self._target_object = target_object
         self._target_class_id = class_names.index(target_object) + 1 # Model is 1-indexed
-        self._net: Optional[cv2.dnn_DetectionModel] = None # pyright: ignore
+        self._net: Optional[cv2.dnn_Net] = None # pyright: ignore
+        width, height = MODEL_INPUT_SIZE
+        self._blob = numpy.empty((1, 3, height, width), dtype=numpy.float32)  # NCHW
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
         self._frame_queue = Queue(maxsize=1)
@@ -59,26 +88,44 @@ class AIWorker:
             self._stop_event.set()
             self._thread.join()  # Wait for the current loop to finish.
             logger.info("AI worker thread stopped.")
+        self._release_queued(self._frame_queue)
+        self._release_queued(self._detection_result_queue)
 
     def _load_model(self):
         """Loads the pre-trained AI model."""
         try:
-            self._net = cv2.dnn_DetectionModel(self._weights_path, self._config_path) # pyright: ignore
-            self._net.setInputSize(320, 320) # pyright: ignore
-            self._net.setInputScale(1.0 / 127.5) # pyright: ignore
-            self._net.setInputMean((127.5, 127.5, 127.5)) # pyright: ignore
-            self._net.setInputSwapRB(True) # pyright: ignore
+            # Input size, mean, scale and channel order are handled by _prepare_input.
+            self._net = cv2.dnn.readNet(self._weights_path, self._config_path) # pyright: ignore
         except Exception as e:
             logger.error(f"AI model failed to load: {e}")
             self._stop_event.set()
 
+    def _prepare_input(self, frame: numpy.ndarray) -> numpy.ndarray:
+        """Returns the model's input blob for an RGB frame."""
+        if frame.shape[1::-1] != MODEL_INPUT_SIZE:
+            return cv2.dnn.blobFromImage(frame, MODEL_INPUT_SCALE, MODEL_INPUT_SIZE, # pyright: ignore
+                                         (MODEL_INPUT_MEAN,) * 3, swapRB=False, crop=False)
+        # (value - mean) * scale, as value * scale - mean * scale, from HWC into NCHW.
+        blob = self._blob
+        numpy.multiply(frame.transpose(2, 0, 1), MODEL_INPUT_SCALE, out=blob[0], casting="unsafe")
+        blob -= MODEL_INPUT_MEAN * MODEL_INPUT_SCALE
+        return blob
+
+    def _detect_target(self, frame: numpy.ndarray) -> bool:
+        """Returns True if the target object is in the frame, with at least CONFIDENCE_THRESHOLD."""
+        self._net.setInput(self._prepare_input(frame)) # pyright: ignore
+        # SSD output: (1, 1, detections, 7), each [image, class_id, confidence, left, top, right, bottom].
+        detections = self._net.forward()[0, 0] # pyright: ignore
+        return bool(numpy.any((detections[:, 1] == self._target_class_id) &
+                              (detections[:, 2] >= CONFIDENCE_THRESHOLD)))
+
     def _worker_loop(self):
         """The main loop for the thread."""
         self._load_model()
 
         while not self._stop_event.is_set():
             try:
-                frame = self._frame_queue.get(timeout=0.05)
+                frame: PooledFrame = self._frame_queue.get(timeout=0.05)
                 if self._net is None or self._target_class_id is None:
                     # Shouldn't happen, but better to handle.
                     logger.warning("Worker received frame, but model is not configured.")
@@ -86,12 +133,7 @@ class AIWorker:
                     continue
 
                 try:
-                    class_ids, _, _ = self._net.detect(frame,
-                                                       confThreshold=CONFIDENCE_THRESHOLD,
-                                                       nmsThreshold=NMS_THRESHOLD)
-                    cat_detected = False
-                    if class_ids is not None and self._target_class_id in class_ids:
-                        cat_detected = True
+                    cat_detected = self._detect_target(frame.array)
                     self._put_overwrite(self._detection_result_queue, (cat_detected, frame))
                 
                 except Exception as e:
@@ -108,25 +150,41 @@ class AIWorker:
     def _put_overwrite(queue: Queue, item: Any):
         """
         Puts in item into the queue, dropping the oldest item if the 
-        queue is currently full.
+        queue is currently full. The dropped item's frame is released.
         """
         if queue.full():
             try:
-                queue.get_nowait()
+                AIWorker._release_item(queue.get_nowait())
             except Empty: # Shouldn't happen, but better to handle
                 ...       # to prevent crashes.
         queue.put_nowait(item)
 
-    def put_frame(self, frame: Any):
+    @staticmethod
+    def _release_item(item: Any):
+        """Releases the frame of a queued frame, or of a queued (cat_detected, frame) result."""
+        frame = item[1] if isinstance(item, tuple) else item
+        frame.release()
+
+    @staticmethod
+    def _release_queued(queue: Queue):
+        """Empties a queue, releasing the frames in it."""
+        while True:
+            try:
+                AIWorker._release_item(queue.get_nowait())
+            except Empty:
+                return
+
+    def put_frame(self, frame: PooledFrame):
         """
-        Puts a frame into the queue for processing.
+        Puts a frame into the queue for processing, handing it to the worker.
         Will remove oldest frame if full.
         """
         self._put_overwrite(self._frame_queue, frame)
     
-    def get_detection_result(self) -> Optional[Tuple[bool, Optional[Any]]]:
+    def get_detection_result(self) -> Optional[Tuple[bool, PooledFrame]]:
         """
-        Gets the latest detection result from the queue.
+        Gets the latest detection result from the queue, the caller then
+        owns the frame and must release it.
         Returns None if the queue is empty.
         """
         try:
@@ -138,9 +196,23 @@ class CatDetectionService:
     """
     Manages the cat detection system, by handling camera capture,
     then delegating to the AI worker thread held within.
+
+    The camera streams on its own thread into a single frame mailbox, the
+    main loop takes the latest frame from it without waiting. Streamed
+    frames are already at the model's input size, in RGB. Frames only
+    reach the model while the MotionDetector sees motion, the feeder is
+    empty most of the day. Snapshots of detections are captured separately
+    at full resolution.
     """
     def __init__(self):
         self._camera: Optional[picamera.PiCamera] = None
+        self._frame_pool: Optional[FramePool] = None  # Allocated on first start
+        self._mailbox = FrameMailbox()
+        self._camera_stream: Optional[CameraStream] = None
+        self._motion_detector = MotionDetector(hold_seconds=MOTION_HOLD_SECONDS, pir_pin=PIR_SENSOR_PIN)
+        # Snapshots are captured and written off the main loop, one at a time.
+        self._snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self._snapshot_future: Optional[Future] = None
         
         class_names = self._initialize_class_names()
         target_object = 'cat'
@@ -179,7 +251,7 @@ class CatDetectionService:
     
     def start(self):
         """
-        Starts both the Pi camera and the AI worker thread.
+        Starts the Pi camera streaming, and the AI worker thread.
         """
         if self._running:
             logger.warning("Attempting to start already running CatDetectionService.")
@@ -187,7 +259,16 @@ class CatDetectionService:
 
         self._running = True 
         try:
+            if self._frame_pool is None:
+                width, height = MODEL_INPUT_SIZE
+                self._frame_pool = FramePool(FRAME_POOL_SIZE, (height, width, 3))
             self._initialize_camera()
+            self._motion_detector.reset()
+            self._camera_stream = CameraStream(self._camera, self._frame_pool, self._mailbox,  # pyright: ignore
+                                               format="rgb",
+                                               resize=MODEL_INPUT_SIZE,
+                                               splitter_port=INFERENCE_SPLITTER_PORT)
+            self._camera_stream.start()
             self._worker.start()
             logger.info("CatDetectionService has started.")
         except Exception:
@@ -203,63 +284,86 @@ class CatDetectionService:
             logger.warning("Attempting to stop non-running CatDetectionService.")
             return
 
+        if self._camera_stream is not None:
+            self._camera_stream.stop()
+            self._camera_stream = None
+        if self._snapshot_future is not None:
+            wait([self._snapshot_future])
+            self._snapshot_future = None
         self._camera.close()  # pyright: ignore
         self._camera = None
+        self._mailbox.clear()
         self._worker.stop()
-        logger.info("CatDetectionService has stopped.")
+        logger.info(f"CatDetectionService has stopped, frame pool: {self.get_frame_pool_stats()}, "
+                    f"frames posted: {self._mailbox.posted}, dropped unread: {self._mailbox.dropped}, "
+                    f"with motion: {self._motion_detector.frames_with_motion} of {self._motion_detector.frames_checked}.")
 
-    def _capture_frame(self):
-        """
-        Captures a frame using the camera, and returns a numpy array.
-        """
-        if not self._camera:
-            logger.warning("CatDetectionService attempting to capture image from uninitizalized camera.")
-            return 
+    def is_running(self) -> bool:
+        """Returns True while the camera is capturing frames for detection."""
+        return self._running and self._camera is not None
 
-        frame_buffer = numpy.empty((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=numpy.uint8)
-        self._camera.capture(frame_buffer, format="bgr", use_video_port=True) # pyright: ignore
-        return frame_buffer
+    def get_frame_pool_stats(self) -> Dict[str, int]:
+        """Returns the frame pool's statistics, see FramePool.get_stats. Empty before the first start."""
+        return self._frame_pool.get_stats() if self._frame_pool is not None else {}
 
-    def _save_frame(self, frame):
+    def _save_snapshot(self):
         """
-        Saves the provided frame as an image to the device.
+        Saves a full resolution image to the device, in the background.
+        Skipped if the last snapshot is still being saved.
         The save path is currently hardcoded.
         """
-        if frame is None:
-            logger.warning("CatDetectionService attempting to save an empty frame.")
+        if self._snapshot_future is not None and not self._snapshot_future.done():
             return
+        self._snapshot_future = self._snapshot_executor.submit(self._capture_snapshot, self._camera)
 
-        save_dir = "/home/pi/Desktop/SavedFrames/"
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir, exist_ok=True)
+    @staticmethod
+    def _capture_snapshot(camera: picamera.PiCamera):
+        """Captures a JPEG straight to a file, on the snapshot splitter port while frames stream."""
+        try:
+            if not os.path.exists(SNAPSHOT_DIR):
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"cat_detection_{timestamp}.jpg"
-        filepath = os.path.join(save_dir, filename)
-        cv2.imwrite(filepath, frame)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"cat_detection_{timestamp}.jpg"
+            filepath = os.path.join(SNAPSHOT_DIR, filename)
+            camera.capture(filepath, format="jpeg", use_video_port=True, splitter_port=SNAPSHOT_SPLITTER_PORT) # pyright: ignore
+        except Exception:
+            logger.exception("CatDetectionService failed to save a snapshot.")
 
     def capture_and_process_frame(self):
         """
-        Captures a new frame and appends it to the worker threads frame queue.
-        Reads the result queue for the last processed frame.
+        Passes the latest streamed frame, if there's a new one, to the worker
+        threads frame queue. Reads the result queue for the last processed frame.
 
         Should be called within the application main loop.
         """
         if not self._running or self._camera is None:
-            return  # This is where we'd read the motion sensor, but just skipping for now.
+            return
 
-        #-- Take a new frame.
-        new_frame = self._capture_frame()
-        self._worker.put_frame(new_frame)
+        #-- Take the latest frame, the worker owns it from here if there's motion.
+        new_frame = self._mailbox.take()
+        if new_frame is not None:
+            try:
+                motion = self._motion_detector.check(new_frame.array)
+            except Exception:
+                new_frame.release()
+                raise
+            if motion:
+                self._worker.put_frame(new_frame)
+            else:
+                new_frame.release()
 
-        #-- Read the processed frame.
+        #-- Read the processed frame, and return it to the pool once done with.
         result = self._worker.get_detection_result()
         if result is not None:
             cat_detected, processed_frame = result
-            if cat_detected:
-                logger.info("CatDetectionService detected a cat!")
-                self._save_frame(processed_frame) # We'd do more here, but just for testing.
-                                        # Probably return the data for processing elsewhere?
+            try:
+                if cat_detected:
+                    logger.info("CatDetectionService detected a cat!")
+                    self._save_snapshot() # We'd do more here, but just for testing.
+                                            # Probably return the data for processing elsewhere?
+            finally:
+                processed_frame.release()
 
 # -- Simple Test Script
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+class FramePoolError(Exception):
+    """Raised when a pooled frame is released twice, or to the wrong pool."""
+
+class PooledFrame:
+    """
+    A frame buffer borrowed from a FramePool.
+
+    Exactly one part of the pipeline owns a frame at a time: whoever it is
+    handed to, e.g. through a queue, takes over the duty to release it, and
+    must not touch array afterwards. Whoever drops a frame releases it.
+    """
+    __slots__ = ("array", "_pool", "_in_use")
+
+    def __init__(self, array: numpy.ndarray, pool: "FramePool"):
+        self.array = array
+        self._pool = pool
+        self._in_use = False
+
+    def release(self):
+        """
+        Returns the frame to its pool, for the next capture to overwrite.
+
+        Raises:
+            FramePoolError: If the frame was already released.
+        """
+        self._pool._release(self)
+
+class FramePool:
+    """
+    A fixed set of preallocated frame buffers, so capturing at the camera's
+    frame rate doesn't allocate a large array per frame.
+
+    Size the pool for every frame that can be held at once: the one being
+    captured, those waiting in queues, the one being processed and one
+    being saved. When it runs out, acquire returns None and the frame is
+    skipped, counted as exhausted in get_stats.
+
+    Thread safe, frames are acquired and released from different threads.
+    """
+    def __init__(self, count: int, shape: Tuple[int, ...], dtype: Any = numpy.uint8):
+        """
+        Args:
+            count (int): Number of frames, allocated up front.
+            shape (Tuple[int, ...]): Shape of each frame, e.g. (height, width, 3).
+            dtype: Element type of each frame. Defaults to uint8.
+        """
+        self._frames = [PooledFrame(numpy.empty(shape, dtype=dtype), self) for _ in range(count)]
+        self._free: List[PooledFrame] = list(self._frames)
+        self._lock = threading.Lock()
+        self.shape = shape
+
+        # Statistics, see get_stats
+        self._acquired = 0
+        self._exhausted = 0
+        self._fewest_free = count
+
+    def acquire(self) -> Optional[PooledFrame]:
+        """
+        Borrows a free frame, the caller owns it until it's released or
+        handed on. Its contents are whatever the last owner left.
+
+        Returns:
+            Optional[PooledFrame]: A frame, or None if every frame is in use.
+        """
+        with self._lock:
+            if not self._free:
+                self._exhausted += 1
+                return None
+            frame = self._free.pop()
+            frame._in_use = True
+            self._acquired += 1
+            if len(self._free) < self._fewest_free:
+                self._fewest_free = len(self._free)
+        return frame
+
+    def _release(self, frame: PooledFrame):
+        with self._lock:
+            if frame._pool is not self:
+                raise FramePoolError("Frame released to a pool it doesn't belong to.")
+            if not frame._in_use:
+                raise FramePoolError("Frame released twice.")
+            frame._in_use = False
+            self._free.append(frame)
+
+    def free_count(self) -> int:
+        """Returns the number of frames not in use."""
+        with self._lock:
+            return len(self._free)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the pool's size, frames in use, total acquired, times it
+        was exhausted, and the fewest frames that have been free at once.
+        """
+        with self._lock:
+            return {
+                "size": len(self._frames),
+                "in_use": len(self._frames) - len(self._free),
+                "acquired": self._acquired,
+                "exhausted": self._exhausted,
+                "fewest_free": self._fewest_free,
+                }
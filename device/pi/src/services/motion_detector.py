@@ -0,0 +1,118 @@
+import logging
+import time
+from typing import Optional, Tuple
+
+import cv2  # pyright: ignore
+import numpy
+
+try:
+    import RPi.GPIO as GPIO  # pyright: ignore
+except ImportError:  # Not on a Pi, or not installed; PIR input is then unavailable.
+    GPIO = None
+
+logger = logging.getLogger(__name__)
+
+# Frames are compared at this size, in grayscale.
+MOTION_FRAME_SIZE = (160, 160)
+MOTION_BLUR_KERNEL = (5, 5)
+# How quickly the background adapts, e.g. to daylight changing. Higher adapts faster.
+BACKGROUND_ALPHA = 0.05
+# Brightness change, out of 255, for a pixel to count as changed.
+PIXEL_CHANGE_THRESHOLD = 25
+# Fraction of pixels that must change to count as motion.
+MOTION_AREA_FRACTION = 0.01
+# How long motion is reported after it was last seen.
+DEFAULT_MOTION_HOLD_SECONDS = 10.0
+
+class MotionDetector:
+    """
+    A cheap check for movement, to decide whether a frame is worth
+    running through the detection model.
+
+    Each frame is shrunk to MOTION_FRAME_SIZE, turned grayscale, blurred,
+    and compared against a running average of the frames before it. A
+    PIR sensor, if given, also counts as motion. Once motion is seen,
+    motion is reported for hold_seconds after it was last seen, so a cat
+    standing still at the bowl is still checked.
+
+    Scratch images are allocated once, at the first frame.
+    """
+    def __init__(self,
+                 hold_seconds: float = DEFAULT_MOTION_HOLD_SECONDS,
+                 pir_pin: Optional[int] = None,
+                 frame_size: Tuple[int, int] = MOTION_FRAME_SIZE):
+        """
+        Args:
+            hold_seconds (float): Seconds motion is reported after it was last seen.
+            pir_pin (int, optional): BCM pin of a PIR sensor, high while it senses movement.
+            frame_size (Tuple[int, int]): (width, height) frames are compared at.
+        """
+        self._hold_seconds = hold_seconds
+        self._frame_size = frame_size
+        self._motion_until = 0.0
+
+        self._small: Optional[numpy.ndarray] = None
+        self._gray: Optional[numpy.ndarray] = None
+        self._difference: Optional[numpy.ndarray] = None
+        self._background_u8: Optional[numpy.ndarray] = None
+        self._background: Optional[numpy.ndarray] = None  # float32 running average
+        self._min_changed_pixels = int(frame_size[0] * frame_size[1] * MOTION_AREA_FRACTION)
+
+        self._pir_pin: Optional[int] = None
+        if pir_pin is not None:
+            if GPIO is None:
+                logger.warning("RPi.GPIO isn't available, motion detection won't use the PIR sensor.")
+            else:
+                GPIO.setmode(GPIO.BCM)
+                GPIO.setup(pir_pin, GPIO.IN)
+                self._pir_pin = pir_pin
+
+        # Statistics
+        self.frames_checked = 0
+        self.frames_with_motion = 0
+
+    def _frame_changed(self, frame: numpy.ndarray) -> bool:
+        """Returns True if enough of the frame differs from the background, then adds it to the background."""
+        self._small = cv2.resize(frame, self._frame_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        self._gray = cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=self._gray)
+        self._gray = cv2.GaussianBlur(self._gray, MOTION_BLUR_KERNEL, 0, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(numpy.float32)
+            return False
+
+        self._background_u8 = cv2.convertScaleAbs(self._background, dst=self._background_u8)
+        self._difference = cv2.absdiff(self._gray, self._background_u8, dst=self._difference)
+        _, self._difference = cv2.threshold(self._difference, PIXEL_CHANGE_THRESHOLD, 255,
+                                            cv2.THRESH_BINARY, dst=self._difference)
+        changed = cv2.countNonZero(self._difference) >= self._min_changed_pixels
+        cv2.accumulateWeighted(self._gray, self._background, BACKGROUND_ALPHA)
+        return changed
+
+    def _pir_triggered(self) -> bool:
+        return self._pir_pin is not None and GPIO.input(self._pir_pin) == GPIO.HIGH  # pyright: ignore
+
+    def check(self, frame: numpy.ndarray) -> bool:
+        """
+        Checks an RGB frame for motion, and updates the background with it.
+
+        Returns:
+            bool: True if there's motion, or was within the hold time.
+        """
+        now = time.monotonic()
+        self.frames_checked += 1
+        # The frame is always compared, so the background keeps up while the PIR is triggered.
+        if self._frame_changed(frame) or self._pir_triggered():
+            if now >= self._motion_until:
+                logger.debug("Motion detected.")
+            self._motion_until = now + self._hold_seconds
+
+        if now < self._motion_until:
+            self.frames_with_motion += 1
+            return True
+        return False
+
+    def reset(self):
+        """Forgets the background and any motion, e.g. after the camera restarts."""
+        self._background = None
+        self._motion_until = 0.0
@@ -6,10 +6,13 @@ import schedule
 from threading import Timer
 from typing import TYPE_CHECKING, Any, Dict, Optional
 
+from communication import arduino_protocol
+from communication.commands.dispenser_commands import DispenseProgress
 from config.config_handler import ConfigHandler
 from config.models.schedule_config import ScheduleConfig, Slot
 
 if TYPE_CHECKING:
+    from communication.command_future import ProgressFuture
     from .service_coordinator import ServiceCoordinator
 
 logger = logging.getLogger(__name__)
@@ -136,8 +139,15 @@ class SchedulerService:
         # Report to Thingsboard?
 
         # -- Initiate Feeding Sequence --
-        # Call appropriate logic within the ArduinoInterface here
-        logger.info(f"Triggering the feeding mechanism for {amount} grams... (NOT CURRENTLY IMPLEMENTED)")
+        # Returns at once, the Arduino reports progress while the motor runs.
+        logger.info(f"Triggering the feeding mechanism for {amount} grams...")
+        try:
+            dispense = self._coordinator.request_dispense(amount)
+        except Exception as e:
+            logger.error(f"Failed to request dispensing {amount} grams: {e}")
+        else:
+            dispense.add_progress_callback(self._on_dispense_progress)
+            dispense.add_done_callback(partial(self._on_dispense_done, amount=amount))
 
         # Clear any stale/conflicting missed_feed_timer, just incase
         if missed_feed_timer and missed_feed_timer.is_alive():
@@ -149,6 +159,38 @@ class SchedulerService:
         missed_feed_timer = Timer(DEFAULT_MISSED_FEED_TIMER_SECONDS, self._missed_feed_alert)
         missed_feed_timer.start()
 
+    def _on_dispense_progress(self, future: ProgressFuture, response_id: int, progress: Any):
+        """
+        Called on the ArduinoService dispatch thread as the dispenser runs.
+        Publishes the grams delivered so far, from each R_NOTIFY_PROGRESS
+        as DispenseCommand parses it.
+        """
+        if response_id != arduino_protocol.R_NOTIFY_PROGRESS:
+            return
+        logger.info(f"Dispensed {progress.delivered_grams} of {progress.target_grams} grams.")
+        try:
+            self._coordinator.publish_telemetry({"dispense_progress_grams": progress.delivered_grams})
+        except Exception as e:
+            logger.error(f"Failed to publish dispense progress telemetry: {e}")
+
+    def _on_dispense_done(self, future: ProgressFuture, amount: int):
+        """
+        Called once the dispense completes or fails, publishes the outcome.
+        """
+        error = future.exception()
+        if error is None:
+            progress: DispenseProgress = future.result()
+            logger.info(f"Dispensed {progress.delivered_grams} grams.")
+            telemetry: Dict[str, Any] = {"dispensed_grams": progress.delivered_grams}
+        else:
+            logger.error(f"Dispensing {amount} grams failed: {error}")
+            telemetry = {"feed_alert": "dispense_failed"}
+
+        try:
+            self._coordinator.publish_telemetry(telemetry)
+        except Exception as e:
+            logger.error(f"Failed to publish dispense telemetry: {e}")
+
     def _missed_feed_alert(self):
         """
         Called by the timer if a cat is not detected within the 
@@ -3,7 +3,12 @@ import logging
 
 from typing import Any, Dict, TYPE_CHECKING, Optional
 
+from communication.commands.dispenser_commands import DispenseCommand
+
 if TYPE_CHECKING:  # Pyright workaround
+    from communication.command_future import ProgressFuture
+    from communication.command_scheduler import CommandScheduler
+    from communication.connection_supervisor import ConnectionState
     from .mqtt_service import MqttService
     from .scheduler_service import SchedulerService
 
@@ -29,8 +34,12 @@ class ServiceCoordinator:
         """
         self._mqtt_service: Optional[MqttService] = None
         self._scheduler_service: Optional[SchedulerService] = None
+        self._command_scheduler: Optional[CommandScheduler] = None
 
-    def set_services(self, mqtt_service: MqttService, scheduler_service: SchedulerService):
+    def set_services(self,
+                     mqtt_service: MqttService,
+                     scheduler_service: SchedulerService,
+                     command_scheduler: CommandScheduler):
         """
         Called after intialization to provide a reference to the 
         service objects. Must be done this way as the services 
@@ -38,6 +47,7 @@ class ServiceCoordinator:
         """
         self._mqtt_service = mqtt_service
         self._scheduler_service = scheduler_service
+        self._command_scheduler = command_scheduler
     
     def handle_attribute_update_from_mqtt(self, attributes: Dict[str, Any]):
         """
@@ -74,3 +84,33 @@ class ServiceCoordinator:
         except Exception as e:
             logger.error(f"Error requesting telemetry publishing: {e}")
 
+    def request_dispense(self, grams: int) -> ProgressFuture:
+        """
+        Called by the SchedulerService to dispense food. Returns at once,
+        the motor runs on the Arduino.
+
+        Args:
+            grams (int): Amount of food to dispense.
+
+        Returns:
+            ProgressFuture: Reports each R_NOTIFY_PROGRESS, and resolves with the
+                R_NOTIFY_TASK_COMPLETE, as a dispenser_commands.DispenseProgress.
+
+        Raises:
+            ValueError: If grams is out of range.
+        """
+        if self._command_scheduler is None:
+            raise ServiceNotInitializedError("CommandScheduler not initialized. See ServiceCoordinator.set_services")
+
+        command = DispenseCommand(grams)
+        return self._command_scheduler.submit(command, timeout=command.get_timeout())
+
+    def report_arduino_connection_state(self, state: ConnectionState):
+        """
+        Called by the ConnectionSupervisor when the Arduino connects, is lost
+        or reconnects. Published as telemetry.
+
+        Args:
+            state (ConnectionState): The new connection state.
+        """
+        self.publish_telemetry({"arduino_connection": state.value})
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The Pi code runs from src, e.g. `import communication`, and the virtual Arduino lives in benchmarks.
+PI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PI_ROOT, "src"))
+sys.path.append(os.path.join(PI_ROOT, "benchmarks"))
@@ -0,0 +1,28 @@
+import pytest
+from virtual_arduino import EchoArduino
+
+from communication import arduino_protocol
+from communication.arduino_service import ArduinoService
+
+
+@pytest.fixture
+def echo_arduino():
+    arduino = EchoArduino()
+    service = ArduinoService(arduino.start(), timeout=0.1)
+    assert service.connect()
+    yield arduino, service
+    service.disconnect()
+    arduino.stop()
+
+
+def test_results_and_callbacks_get_bytes(echo_arduino):
+    _, service = echo_arduino
+    responses = []
+
+    future = service.send_command(arduino_protocol.CMD_BUZZER_SIMPLE, b"\x01\x02\x03\x04",
+                                  lambda packet_id, response_id, payload: responses.append(payload))
+
+    assert future.result(timeout=5) == b"\x01\x02\x03\x04"
+    assert type(future.result()) is bytes
+    assert responses == [b"", b"\x01\x02\x03\x04"]
+    assert all(type(payload) is bytes for payload in responses)
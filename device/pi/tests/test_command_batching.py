@@ -0,0 +1,81 @@
+import pytest
+from virtual_arduino import LinkConditions, VirtualArduino
+
+from communication import arduino_protocol
+from communication.arduino_service import ArduinoErrorResponse, ArduinoProtocolError, ArduinoService
+from communication.commands.buzzer_commands import MelodyCommand, SimpleBuzzCommand
+from communication.commands.dispenser_commands import DispenseCommand
+
+BEEP = SimpleBuzzCommand(2000, 100)
+MELODY = MelodyCommand(240, [523, 659, 784])
+DISPENSE = DispenseCommand(10)
+
+
+@pytest.fixture
+def arduino():
+    return VirtualArduino(LinkConditions(time_scale=0))
+
+@pytest.fixture
+def service(arduino):
+    service = ArduinoService(arduino.start(), timeout=0.1)
+    assert service.connect()
+    yield service
+    service.disconnect()
+    arduino.stop()
+
+def entries(*commands):
+    return [(command.get_command_id(), command.get_payload()) for command in commands]
+
+def error_response_ids(futures):
+    return [getattr(future.exception(timeout=5), "response_id", None) for future in futures]
+
+
+def test_every_command_in_a_batch_completes(arduino, service):
+    futures = service.send_batch(entries(BEEP, DISPENSE))
+
+    assert [future.exception(timeout=5) for future in futures] == [None, None]
+    assert arduino.stats.responses[arduino_protocol.R_NOTIFY_BATCH_RESULT] == 1
+    assert all(future.acknowledged for future in futures)
+
+def test_each_command_gets_its_own_status(arduino, service):
+    # The beep takes the buzzer, so the melody after it in the batch is turned away.
+    beep, melody, dispense = service.send_batch(entries(BEEP, MELODY, DISPENSE))
+
+    assert beep.exception(timeout=5) is None
+    assert dispense.exception(timeout=5) is None
+    error = melody.exception(timeout=5)
+    assert isinstance(error, ArduinoErrorResponse)
+    assert error.response_id == arduino_protocol.R_ERROR_RESOURCE_BUSY
+
+def test_invalid_commands_fail_without_failing_the_batch(service):
+    invalid_beep = (arduino_protocol.CMD_BUZZER_SIMPLE, b"\x00\x00\x00\x00")
+
+    futures = service.send_batch([invalid_beep] + entries(DISPENSE))
+
+    assert error_response_ids(futures) == [arduino_protocol.R_ERROR_INVALID_PAYLOAD, None]
+
+@pytest.mark.parametrize("commands", [
+        [],
+        [(arduino_protocol.CMD_HELLO, b"")],
+        entries(BEEP) + [(arduino_protocol.CMD_BATCH, b"")],
+        entries(*[BEEP] * 20),
+        ], ids=["empty", "unbatchable", "nested batch", "too large"])
+def test_invalid_batches_are_rejected_before_sending(arduino, service, commands):
+    packets_received = arduino.stats.packets_received
+
+    with pytest.raises(ArduinoProtocolError):
+        service.send_batch(commands)
+
+    assert service._packet_ids.in_use_count() == 0
+    assert arduino.stats.packets_received == packets_received
+
+def test_a_batch_the_arduino_rejects_fails_every_command(arduino, service, monkeypatch):
+    encode_batch = arduino_protocol.encode_batch
+    # A stray byte after the last entry, which the Arduino rejects before running any of them.
+    monkeypatch.setattr(arduino_protocol, "encode_batch", lambda batch_entries: encode_batch(batch_entries) + b"\x00")
+
+    futures = service.send_batch(entries(BEEP, DISPENSE))
+
+    assert error_response_ids(futures) == [arduino_protocol.R_ERROR_INVALID_PAYLOAD] * 2
+    assert arduino.buzzer_state.name == "IDLE" and not arduino.dispensing
+    assert service._packet_ids.in_use_count() == 0
@@ -0,0 +1,113 @@
+from typing import List, Tuple
+
+import pytest
+
+from communication import arduino_protocol
+from communication.arduino_protocol import START_BYTE, FrameScanner, Packet, encode_packet
+
+COMPLETE = arduino_protocol.R_NOTIFY_TASK_COMPLETE
+RECEIVED = arduino_protocol.R_NOTIFY_COMMAND_RECEIVED
+
+
+def fields(packets: List[Packet]) -> List[Tuple[int, int, bytes]]:
+    return [(packet.packet_id, packet.response_id, bytes(packet.payload)) for packet in packets]
+
+def corrupt_checksum(packet: bytes) -> bytes:
+    return packet[:-1] + bytes([packet[-1] ^ 0xFF])
+
+
+def test_parses_a_packet():
+    scanner = FrameScanner()
+
+    assert fields(scanner.feed(encode_packet(7, COMPLETE, b"\x01\x02\x03"))) == [(7, COMPLETE, b"\x01\x02\x03")]
+
+def test_parses_an_empty_payload():
+    scanner = FrameScanner()
+
+    assert fields(scanner.feed(encode_packet(1, RECEIVED))) == [(1, RECEIVED, b"")]
+
+def test_parses_several_packets_in_one_read():
+    scanner = FrameScanner()
+    data = encode_packet(1, RECEIVED) + encode_packet(1, COMPLETE, b"ok") + encode_packet(2, RECEIVED)
+
+    assert fields(scanner.feed(data)) == [(1, RECEIVED, b""), (1, COMPLETE, b"ok"), (2, RECEIVED, b"")]
+
+def test_resyncs_after_garbage():
+    scanner = FrameScanner()
+    # Garbage, including a START_BYTE whose header claims an impossible length.
+    garbage = b"\x00\x13" + bytes([START_BYTE, 0x05, COMPLETE, 0xFF]) + b"\x42"
+
+    assert fields(scanner.feed(garbage + encode_packet(3, COMPLETE, b"hi"))) == [(3, COMPLETE, b"hi")]
+    assert scanner.invalid_lengths == 1
+
+def test_garbage_without_a_start_byte_is_dropped():
+    scanner = FrameScanner()
+
+    assert scanner.feed(b"\x00\x01\x02" * 20) == []
+    assert fields(scanner.feed(encode_packet(4, RECEIVED))) == [(4, RECEIVED, b"")]
+
+@pytest.mark.parametrize("split", range(1, len(encode_packet(5, COMPLETE, b"split me"))))
+def test_joins_a_packet_split_across_reads(split):
+    scanner = FrameScanner()
+    packet = encode_packet(5, COMPLETE, b"split me")
+
+    assert scanner.feed(packet[:split]) == []
+    assert fields(scanner.feed(packet[split:])) == [(5, COMPLETE, b"split me")]
+
+def test_parses_a_stream_fed_one_byte_at_a_time():
+    scanner = FrameScanner()
+    data = encode_packet(1, RECEIVED) + b"\x99" + encode_packet(1, COMPLETE, bytes(range(20)))
+
+    packets = [packet for byte in data for packet in scanner.feed(bytes([byte]))]
+
+    assert fields(packets) == [(1, RECEIVED, b""), (1, COMPLETE, bytes(range(20)))]
+
+def test_skips_a_bad_checksum_mid_stream():
+    scanner = FrameScanner()
+    data = (encode_packet(1, COMPLETE, b"first")
+            + corrupt_checksum(encode_packet(2, COMPLETE, b"broken"))
+            + encode_packet(3, COMPLETE, b"third"))
+
+    assert fields(scanner.feed(data)) == [(1, COMPLETE, b"first"), (3, COMPLETE, b"third")]
+    assert scanner.checksum_errors == 1
+
+def test_finds_a_packet_inside_a_corrupt_one():
+    scanner = FrameScanner()
+    # A header whose length swallows the real packet that follows it.
+    inner = encode_packet(6, COMPLETE, b"inner")
+    data = bytes([START_BYTE, 0x09, COMPLETE, len(inner)]) + inner + b"\x00"
+
+    assert fields(scanner.feed(data)) == [(6, COMPLETE, b"inner")]
+    assert scanner.checksum_errors == 1
+
+def test_keeps_a_truncated_tail_until_it_completes():
+    scanner = FrameScanner()
+    packet = encode_packet(8, COMPLETE, b"tail")
+
+    assert fields(scanner.feed(encode_packet(7, RECEIVED) + packet[:-3])) == [(7, RECEIVED, b"")]
+    assert fields(scanner.feed(packet[-3:])) == [(8, COMPLETE, b"tail")]
+
+def test_keeps_a_lone_start_byte():
+    scanner = FrameScanner()
+    packet = encode_packet(9, RECEIVED)
+
+    assert scanner.feed(packet[:1]) == []
+    assert fields(scanner.feed(packet[1:])) == [(9, RECEIVED, b"")]
+
+def test_reset_discards_a_truncated_tail():
+    scanner = FrameScanner()
+    scanner.feed(encode_packet(8, COMPLETE, b"tail")[:-2])
+
+    scanner.reset()
+
+    assert fields(scanner.feed(encode_packet(9, RECEIVED))) == [(9, RECEIVED, b"")]
+    assert scanner.checksum_errors == 0
+
+def test_payload_survives_the_read_buffer_changing():
+    scanner = FrameScanner()
+    data = bytearray(encode_packet(1, COMPLETE, b"keep"))
+
+    packets = scanner.feed(data)
+    data[:] = bytes(len(data))
+
+    assert fields(packets) == [(1, COMPLETE, b"keep")]
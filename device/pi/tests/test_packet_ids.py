@@ -0,0 +1,103 @@
+import threading
+import time
+
+from communication.arduino_service import ArduinoService
+from communication.packet_ids import PACKET_ID_COUNT, PacketIdAllocator
+
+
+def test_hands_out_every_id_once():
+    allocator = PacketIdAllocator()
+
+    ids = [allocator.acquire(timeout=0) for _ in range(PACKET_ID_COUNT)]
+
+    assert sorted(ids) == list(range(PACKET_ID_COUNT))
+    assert allocator.in_use_count() == PACKET_ID_COUNT
+
+def test_reuses_released_ids_last():
+    allocator = PacketIdAllocator(4)
+    first, second = allocator.acquire(), allocator.acquire()
+
+    allocator.release(first)
+    allocator.release(second)
+
+    assert [allocator.acquire() for _ in range(4)] == [2, 3, first, second]
+
+def test_acquire_times_out_while_every_id_is_in_use():
+    allocator = PacketIdAllocator(1)
+    allocator.acquire()
+
+    started = time.monotonic()
+    assert allocator.acquire(timeout=0.1) is None
+    assert time.monotonic() - started >= 0.1
+    assert allocator.acquire(timeout=0) is None
+
+def test_acquire_waits_for_a_release():
+    allocator = PacketIdAllocator(1)
+    packet_id = allocator.acquire()
+    threading.Timer(0.05, allocator.release, args=(packet_id,)).start()
+
+    assert allocator.acquire(timeout=5) == packet_id
+
+def test_releasing_twice_frees_the_id_once():
+    allocator = PacketIdAllocator(2)
+    packet_id = allocator.acquire()
+
+    allocator.release(packet_id)
+    allocator.release(packet_id)
+
+    assert allocator.in_use_count() == 0
+    assert sorted([allocator.acquire(timeout=0), allocator.acquire(timeout=0)]) == [0, 1]
+    assert allocator.acquire(timeout=0) is None
+
+def test_releasing_an_unused_id_does_nothing():
+    allocator = PacketIdAllocator(2)
+
+    allocator.release(1)
+
+    assert allocator.in_use_count() == 0
+    assert [allocator.acquire(timeout=0), allocator.acquire(timeout=0), allocator.acquire(timeout=0)] == [0, 1, None]
+
+def test_no_id_is_held_twice_under_contention():
+    allocator = PacketIdAllocator(8)
+    held = set()
+    held_lock = threading.Lock()
+    errors = []
+
+    def worker():
+        for _ in range(2000):
+            packet_id = allocator.acquire(timeout=5)
+            if packet_id is None:
+                errors.append("timed out")
+                return
+            with held_lock:
+                if packet_id in held:
+                    errors.append(f"{packet_id} handed out twice")
+                held.add(packet_id)
+            time.sleep(0)  # Let the other threads run while it's held.
+            with held_lock:
+                held.discard(packet_id)
+            allocator.release(packet_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert allocator.in_use_count() == 0
+
+def test_discarding_an_expired_command_keeps_its_reused_id():
+    service = ArduinoService("/dev/null")
+    service._packet_ids = PacketIdAllocator(1)  # So the next command gets the expired one's ID.
+    expired = service._register_command(0x10, None, timeout=0)
+    time.sleep(0.01)
+    service._expire_pending_commands()
+    current = service._register_command(0x10, None, timeout=60)
+    assert current.packet_id == expired.packet_id
+
+    # e.g. the expired command's write failed after its deadline passed.
+    service._discard_pending_command(expired)
+
+    assert service._pending_commands.get(current.packet_id) is current
+    assert service._packet_ids.in_use_count() == 1
@@ -0,0 +1,53 @@
+from typing import Optional
+
+import pytest
+from virtual_arduino import LinkConditions, VirtualArduino
+
+from communication import arduino_protocol
+from communication.arduino_service import ArduinoService
+from communication.commands.buzzer_commands import MelodyCommand
+
+# Long enough to stream, at a tempo and time scale where it plays on well past a retransmission.
+MELODY = MelodyCommand(600, [440] * 40)
+TIME_SCALE = 0.2
+
+
+class AckDroppingArduino(VirtualArduino):
+    """Loses the chunk acknowledgement sent when `transfer_remaining` bytes are left to receive."""
+    def __init__(self, transfer_remaining: int):
+        super().__init__(LinkConditions(time_scale=TIME_SCALE))
+        self._drop_at_remaining: Optional[int] = transfer_remaining
+        self.chunk_acks_dropped = 0
+
+    def send_response(self, packet_id: int, response_id: int, payload: bytes = b''):
+        if (response_id == arduino_protocol.R_NOTIFY_CHUNK_ACK
+                and self._transfer_remaining == self._drop_at_remaining):
+            self._drop_at_remaining = None
+            self.chunk_acks_dropped += 1
+            return
+        super().send_response(packet_id, response_id, payload)
+
+
+def stream_melody(arduino: VirtualArduino) -> Optional[BaseException]:
+    service = ArduinoService(arduino.start(), timeout=0.1)
+    try:
+        assert service.connect()
+        future = service.send_stream(MELODY.get_command_id(), MELODY.get_payload(), timeout=10)
+        return future.exception(timeout=10)
+    finally:
+        service.disconnect()
+        arduino.stop()
+
+
+def test_streams_a_melody():
+    assert stream_melody(VirtualArduino(LinkConditions(time_scale=TIME_SCALE))) is None
+
+@pytest.mark.parametrize("transfer_remaining",
+                         [len(MELODY.get_payload()) - arduino_protocol.MAX_CHUNK_DATA_SIZE, 0],
+                         ids=["first chunk", "last chunk"])
+def test_a_lost_chunk_ack_is_answered_by_acking_the_duplicate(transfer_remaining):
+    arduino = AckDroppingArduino(transfer_remaining)
+
+    assert stream_melody(arduino) is None
+    assert arduino.chunk_acks_dropped == 1
+    assert arduino.stats.responses.get(arduino_protocol.R_ERROR_INVALID_PAYLOAD, 0) == 0